@@ -27,10 +27,91 @@ class Settings(BaseSettings):
     AZURE_OPENAI_API_KEY: str = ""
     AZURE_OPENAI_CHAT_DEPLOYMENT: str = "gpt-4o-mini"
     AZURE_OPENAI_EMBEDDING_DEPLOYMENT: str = "text-embedding-3-large"
+    AZURE_OPENAI_API_VERSION: str = "2024-12-01-preview"
+
+    # LLM gateway (shared async client)
+    LLM_MAX_CONNECTIONS: int = 50
+    LLM_MAX_CONCURRENCY: int = 8          # in-flight calls per deployment
+    LLM_TIMEOUT_SECONDS: float = 60.0
+    LLM_MAX_RETRIES: int = 3
+
+    # Embedding cache (in-process LRU + Mongo `embedding_cache` with TTL)
+    EMBED_CACHE_MAX_ITEMS: int = 2000
+    EMBED_CACHE_TTL_DAYS: int = 90
+
+    # Vector search backend: "cosmos" (cosmosSearch) or "local" (in-process NumPy index)
+    VECTOR_SEARCH_BACKEND: str = "cosmos"
+    VECTOR_INDEX_DIR: str = ".vector_index"
+
+    # Retrieval: "vector" or "hybrid" (BM25 + vector fused by reciprocal rank; opt in)
+    RETRIEVAL_MODE: str = "vector"
+    RETRIEVAL_FUSION_DEPTH: int = 20       # candidates taken from each ranker before fusion
+    BM25_FAST_PATH: bool = True            # answer confident keyword queries from BM25 alone
+    BM25_FAST_PATH_MAX_TERMS: int = 4
+
+    # Semantic answer cache for /ai/rag/answer
+    SEMANTIC_CACHE_THRESHOLD: float = 0.95   # cosine similarity
+    SEMANTIC_CACHE_TTL_SECONDS: int = 6 * 3600
+    SEMANTIC_CACHE_MAX_PER_SLICE: int = 500
+    SEMANTIC_CACHE_VERSION_CHECK_SECONDS: int = 30
 
     # Azure Speech
     AZURE_SPEECH_KEY: str =""
     AZURE_SPEECH_REGION: str = "eastus"
     AZURE_BLOB_CONN_STR: str = ""
 
+    # Transcription jobs
+    TRANSCRIBE_WORKERS: int = 2
+    TRANSCRIBE_SPOOL_DIR: str = ".transcribe_spool"
+    TRANSCRIBE_POLL_SECONDS: float = 5.0
+    TRANSCRIBE_LEASE_SECONDS: int = 120
+    TRANSCRIBE_MAX_ATTEMPTS: int = 3            # claims before a repeatedly orphaned job is failed
+    TRANSCRIBE_STOP_GRACE_SECONDS: float = 20.0 # shutdown wait for running jobs before requeueing them
+    BLOB_DOWNLOAD_CONCURRENCY: int = 4
+    FFMPEG_BIN: str = "ffmpeg"
+    FFMPEG_TIMEOUT_SECONDS: int = 1800
+
+    # "single" = one recognizer session; "segmented" = split at silences, recognize in parallel
+    TRANSCRIBE_MODE: str = "single"
+    TRANSCRIBE_SEGMENT_WORKERS: int = 4
+    TRANSCRIBE_SEGMENT_TARGET_SECONDS: float = 60.0
+    TRANSCRIBE_SEGMENT_MAX_SECONDS: float = 120.0
+    TRANSCRIBE_MIN_SILENCE_MS: int = 300
+    TRANSCRIBE_SILENCE_DBFS: float = -40.0
+
+    # Reference-data cache (daily classes, quizzes, students, school prefs)
+    REFCACHE_BACKEND: str = "local"        # "local" (per process) or "redis" (shared)
+    REFCACHE_REDIS_URL: str = "redis://localhost:6379/0"
+    REFCACHE_MAX_ITEMS: int = 5000
+    REFCACHE_TTL_SECONDS: int = 300
+
+    # Quiz grading: "exact", "any" or "partial" (a quiz's scoring_policy overrides)
+    QUIZ_SCORING_POLICY: str = "exact"
+    GRADING_CACHE_MAX_QUIZZES: int = 1024
+
+    # Streaming chat: coalesce deltas into SSE frames of at least this many chars,
+    # or whatever has arrived once this much time has passed since the last frame
+    CHAT_STREAM_MIN_CHARS: int = 32
+    CHAT_STREAM_MAX_DELAY_MS: int = 80
+
+    # Concurrent identical model calls share one upstream request, cancelled after this long
+    # (class summaries get this once more per wave of map calls)
+    SINGLEFLIGHT_TIMEOUT_SECONDS: float = 120.0
+
+    # Story cache / pre-warm
+    STORY_CACHE_TTL_DAYS: int = 30
+    STORY_PREWARM_ON_CREATE: bool = True
+    STORY_PREWARM_CONCURRENCY: int = 4
+
+    # Prompt context budgets (tokens; counted with tiktoken when installed)
+    PROMPT_MAX_TOKENS: int = 6000          # hard cap per model request
+    RAG_CONTEXT_TOKENS: int = 1500         # retrieved passages in a RAG answer
+    SUMMARY_CONTEXT_TOKENS: int = 1200     # reference passages in a class summary
+    SUMMARY_CHUNK_TOKENS: int = 2000       # transcript piece per map call; longer transcripts are map-reduced
+    SUMMARY_MAP_CONCURRENCY: int = 4
+
+    # Streaming exports
+    EXPORT_BATCH_SIZE: int = 1000          # Motor cursor batch size
+    EXPORT_FLUSH_BYTES: int = 64 * 1024    # emit a chunk once this much NDJSON is buffered
+
 settings = Settings()
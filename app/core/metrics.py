@@ -0,0 +1,24 @@
+"""
+Process-local counters for caches and background work.
+
+Counters are plain in-memory integers per worker; `/admin/metrics` returns a
+snapshot. Names are dotted, e.g. "embed_cache.lru_hits".
+"""
+from collections import defaultdict
+from typing import Dict
+
+_counters: Dict[str, float] = defaultdict(float)
+
+def incr(name: str, n: float = 1) -> None:
+    _counters[name] += n
+
+def get(name: str) -> float:
+    return _counters.get(name, 0)
+
+def hit_ratio(prefix: str, hits: tuple[str, ...] = ("hits",), misses: tuple[str, ...] = ("misses",)) -> float | None:
+    h = sum(get(f"{prefix}.{k}") for k in hits)
+    m = sum(get(f"{prefix}.{k}") for k in misses)
+    return round(h / (h + m), 4) if h + m else None
+
+def snapshot() -> Dict[str, float]:
+    return dict(sorted(_counters.items()))
@@ -0,0 +1,83 @@
+"""
+Fail if any hot query in indexes.HOT_QUERIES would do a collection scan.
+
+Seeds a throwaway database on a local MongoDB with a few hundred documents per
+collection, applies the index manifest, and runs explain() on every hot query.
+Exits non-zero when a winning plan contains COLLSCAN.
+
+Run with: python -m app.db.explain_check --uri mongodb://localhost:27017
+"""
+import argparse
+import asyncio
+import sys
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+
+from . import indexes
+
+SEED_ROWS = 300
+
+
+def _seed_docs(coll: str, i: int) -> Dict[str, Any]:
+    day = (datetime(2025, 1, 1) + timedelta(days=i % 60)).date().isoformat()
+    base = {
+        "tenant": f"t{i % 3}", "student_id": f"s{i}", "daily_id": f"d{i % 50}",
+        "class_no": 6 + i % 3, "section": "AB"[i % 2], "subject": ["Science", "Maths"][i % 2],
+        "date": day, "topic": f"topic{i % 10}", "created_at": datetime(2025, 1, 1) + timedelta(minutes=i),
+    }
+    extra = {
+        "teachers": {"email": f"t{i}@x.test"},
+        "parents": {"email": f"p{i}@x.test"},
+        "quiz_responses": {"attempt_number": 1 + i % 3, "student_id": f"s{i % 40}"},
+        "student_progress": {"daily_id": f"d{i}"},
+        "transcribe_jobs": {"status": ["queued", "running", "done"][i % 3]},
+        "cbse_docs": {"chapter": f"ch{i % 5}"},
+    }
+    return {**base, **extra.get(coll, {})}
+
+def _stages(plan: Dict[str, Any]) -> List[str]:
+    found = [plan.get("stage", "")]
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            found += _stages(plan[key])
+    for child in plan.get("inputStages", []):
+        found += _stages(child)
+    return found
+
+async def _seed(db: AsyncIOMotorDatabase) -> None:
+    for coll in {c for _, c, _, _ in indexes.HOT_QUERIES} | set(indexes.MANIFEST):
+        await db[coll].drop()
+        await db[coll].insert_many([_seed_docs(coll, i) for i in range(SEED_ROWS)])
+
+async def main(uri: str, db_name: str) -> int:
+    client = AsyncIOMotorClient(uri)
+    db = client[db_name]
+    try:
+        await _seed(db)
+        await db.schema_meta.drop()
+        await indexes.ensure(db, force=True)
+
+        failures = 0
+        for label, coll, filt, sort in indexes.HOT_QUERIES:
+            cmd: Dict[str, Any] = {"find": coll, "filter": filt}
+            if sort:
+                cmd["sort"] = dict(sort)
+            explained = await db.command({"explain": cmd, "verbosity": "queryPlanner"})
+            stages = _stages(explained["queryPlanner"]["winningPlan"])
+            scan = "COLLSCAN" in stages
+            failures += scan
+            print(f"{'FAIL' if scan else 'ok  '}  {label:<40} {' <- '.join(s for s in stages if s)}")
+        print(f"\n{len(indexes.HOT_QUERIES) - failures}/{len(indexes.HOT_QUERIES)} hot queries use an index")
+        return 1 if failures else 0
+    finally:
+        await client.drop_database(db_name)
+        client.close()
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--uri", default="mongodb://localhost:27017")
+    ap.add_argument("--db", default="aibuddy-explain-check")
+    a = ap.parse_args()
+    sys.exit(asyncio.run(main(a.uri, a.db)))
@@ -1,33 +1,196 @@
+"""
+Declarative index manifest.
+
+MANIFEST lists every index the app relies on, derived from the query shapes in
+the routers/services (see HOT_QUERIES, which `python -m app.db.explain_check`
+runs through explain() to prove none of them COLLSCANs). Bump
+INDEX_MANIFEST_VERSION whenever MANIFEST or RETIRED changes; `ensure` only does
+work when the version recorded in `schema_meta` is older, or when a TTL setting
+(STORY_CACHE_TTL_DAYS, EMBED_CACHE_TTL_DAYS) differs from the one recorded there.
+Existing TTL indexes are then updated in place with collMod.
+"""
+from typing import Any, Dict, List, NamedTuple, Tuple
+
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import OperationFailure
+from ..core.config import settings
+
+INDEX_MANIFEST_VERSION = 9
+INDEX_OPTIONS_CONFLICT = 85  # server error code: same index name/keys, different options
+
+
+class IndexSpec(NamedTuple):
+    keys: List[Tuple[str, int]]
+    name: str
+    options: Dict[str, Any] = {}
+
+
+MANIFEST: Dict[str, List[IndexSpec]] = {
+    "students": [
+        IndexSpec([("student_id", 1)], "ux_student_id", {"unique": True}),
+        IndexSpec([("class_no", 1), ("section", 1)], "ix_students_class_section"),
+    ],
+    "teachers": [IndexSpec([("email", 1)], "ux_teacher_email", {"unique": True})],
+    "parents": [
+        IndexSpec([("email", 1)], "ux_parent_email", {"unique": True}),
+        IndexSpec([("student_id", 1)], "ix_parent_student"),
+    ],
+    "schools": [IndexSpec([("tenant", 1)], "ix_schools_tenant")],
+    "classes_daily": [
+        IndexSpec([("date", -1), ("class_no", 1), ("section", 1), ("subject", 1)], "ix_daily_composite"),
+        # list_daily_classes (keyset on date, _id) and _get_or_create_daily
+        IndexSpec([("tenant", 1), ("class_no", 1), ("section", 1), ("date", -1), ("_id", -1)],
+                  "ix_daily_tenant_class_date_id"),
+    ],
+    "quizzes": [
+        # get_quiz / refcache read the latest quiz of a daily class
+        IndexSpec([("daily_id", 1), ("tenant", 1), ("_id", -1)], "ix_quiz_daily_tenant_id"),
+        # create_quiz_from_daily: one quiz per content hash (legacy quizzes have none)
+        IndexSpec([("daily_id", 1), ("content_hash", 1)], "ux_quiz_daily_hash",
+                  {"unique": True, "partialFilterExpression": {"content_hash": {"$exists": True}}}),
+        IndexSpec([("class_no", 1)], "ix_quiz_class"),
+        IndexSpec([("topic", 1)], "ix_quiz_topic"),
+    ],
+    "quiz_responses": [
+        # attempt history per student, sorted by attempt_number; non-unique so retakes are allowed
+        IndexSpec([("daily_id", 1), ("student_id", 1), ("attempt_number", 1), ("_id", 1)],
+                  "ix_responses_daily_student_attempt_id"),
+        # exports: tenant-wide, ordered by attempt time
+        IndexSpec([("tenant", 1), ("attempted_at", 1)], "ix_responses_tenant_attempted"),
+    ],
+    "student_progress": [
+        IndexSpec([("student_id", 1), ("daily_id", 1)], "ux_progress_student_daily", {"unique": True}),
+        # get_progress keyset on (date, _id)
+        IndexSpec([("student_id", 1), ("tenant", 1), ("date", -1), ("_id", -1)], "ix_progress_student_tenant_date_id"),
+        # exports: tenant-wide, ordered by class date
+        IndexSpec([("tenant", 1), ("date", 1)], "ix_progress_tenant_date"),
+    ],
+    # rollups are written by _id; these serve the dashboard range reads
+    "student_daily_rollups": [
+        IndexSpec([("tenant", 1), ("student_id", 1), ("date", 1)], "ix_student_rollups_tenant_student_date"),
+    ],
+    "class_daily_rollups": [
+        IndexSpec([("tenant", 1), ("class_no", 1), ("section", 1), ("subject", 1), ("date", 1)],
+                  "ix_class_rollups_tenant_class_date"),
+    ],
+    # summarize_daily / create_quiz_from_daily read the latest transcript of a class
+    "transcripts": [IndexSpec([("daily_id", 1), ("_id", -1)], "ix_transcript_daily_id")],
+    "transcribe_jobs": [IndexSpec([("status", 1), ("created_at", 1)], "ix_transcribe_jobs_status")],
+    # summarize_daily: one summary per content hash (legacy summaries have none)
+    "summaries": [
+        IndexSpec([("daily_id", 1), ("content_hash", 1)], "ux_summary_daily_hash",
+                  {"unique": True, "partialFilterExpression": {"content_hash": {"$exists": True}}}),
+    ],
+    "stories": [IndexSpec([("daily_id", 1)], "ix_story_daily")],
+    # shared stories keyed by canonical (topics, persona, prefs) hash
+    "story_cache": [
+        IndexSpec([("created_at", 1)], "ttl_story_cache",
+                  {"expireAfterSeconds": settings.STORY_CACHE_TTL_DAYS * 86400}),
+    ],
+    # CBSE RAG docs. The cosmosSearch vector index is created lazily by services/rag.py.
+    "cbse_docs": [
+        IndexSpec([("chapter", 1)], "ix_docs_chapter"),
+        IndexSpec([("class_no", 1), ("subject", 1)], "ix_docs_class_subject"),
+    ],
+    "embedding_cache": [
+        IndexSpec([("created_at", 1)], "ttl_embedding_cache",
+                  {"expireAfterSeconds": settings.EMBED_CACHE_TTL_DAYS * 86400}),
+    ],
+}
+
+# Indexes from earlier manifests that must be dropped.
+RETIRED: Dict[str, List[str]] = {
+    # (quiz_id, student_id) unique blocked a second attempt at the same quiz
+    "quiz_responses": ["ux_quiz_student", "ix_responses_daily_student_attempt"],
+    # superseded by ix_quiz_daily_tenant(_id) (same prefix); ix_*_daily_hash by the unique ux_*_daily_hash
+    "quizzes": ["ix_quiz_daily", "ix_quiz_daily_tenant", "ix_quiz_daily_hash"],
+    "summaries": ["ix_summary_daily", "ix_summary_daily_hash"],
+    # extended with an _id tie-breaker for keyset pagination
+    "classes_daily": ["ix_daily_tenant_class_date"],
+    "student_progress": ["ix_progress_student_tenant_date"],
+    # extended with _id so the latest transcript of a class is an index seek
+    "transcripts": ["ix_transcript_daily"],
+}
 
-async def ensure(db: AsyncIOMotorDatabase):
-    # Students
-    await db.students.create_index("student_id", unique=True, name="ux_student_id")
-    await db.students.create_index([("class_no", 1), ("section", 1)], name="ix_students_class_section")
+# Query shapes of the hot endpoints: (label, collection, filter, sort).
+HOT_QUERIES: List[Tuple[str, str, Dict[str, Any], List[Tuple[str, int]] | None]] = [
+    ("students.get_student", "students", {"student_id": "s1"}, None),
+    ("classes.list_daily_classes", "classes_daily",
+     {"tenant": "t1", "class_no": 7, "section": "A"}, [("date", -1), ("_id", -1)]),
+    ("classes._get_or_create_daily", "classes_daily",
+     {"tenant": "t1", "date": "2025-01-01", "class_no": 7, "section": "A", "subject": "Science"}, None),
+    ("quiz.get_quiz", "quizzes", {"daily_id": "d1", "tenant": "t1"}, [("_id", -1)]),
+    ("quizzes.create_quiz_from_daily.existing", "quizzes", {"daily_id": "d1", "content_hash": "h1"}, None),
+    ("quizzes.by_topic", "quizzes", {"topic": "Heat"}, None),
+    ("quiz.get_quiz_responses", "quiz_responses",
+     {"daily_id": "d1", "student_id": "s1", "tenant": "t1"}, [("attempt_number", 1), ("_id", 1)]),
+    ("progress.update_progress", "student_progress", {"student_id": "s1", "daily_id": "d1"}, None),
+    ("progress.get_progress", "student_progress",
+     {"student_id": "s1", "tenant": "t1", "date": {"$gte": "2025-01-01", "$lte": "2025-01-31"}},
+     [("date", -1), ("_id", -1)]),
+    ("students.list_students", "students", {}, [("_id", 1)]),
+    ("progress.weekly", "student_daily_rollups",
+     {"tenant": "t1", "student_id": "s1", "date": {"$gte": "2025-01-01"}}, [("date", 1)]),
+    ("admin.teacher_performance.teacher", "teachers", {"email": "t1@x.test"}, None),
+    ("admin.teacher_performance.sections", "classes_daily",
+     {"tenant": "t1", "subject": {"$in": ["Science"]}, "date": {"$gte": "2025-01-01", "$lte": "2025-12-31"}}, None),
+    ("admin.teacher_performance.class_days", "class_daily_rollups",
+     {"tenant": "t1", "class_no": 7, "section": "A", "subject": "Science",
+      "date": {"$gte": "2025-01-01", "$lte": "2025-12-31"}}, [("date", 1)]),
+    ("admin.teacher_performance.quizzes", "quizzes", {"daily_id": {"$in": ["d1", "d2"]}}, None),
+    ("ai.story_for_student.school", "schools", {"tenant": "t1"}, None),
+    ("stories.prewarm_section.students", "students", {"class_no": 7, "section": "A", "school_tenant": "t1"}, None),
+    ("classes.summarize_daily.transcript", "transcripts", {"daily_id": "d1"}, [("_id", -1)]),
+    ("classes.summarize_daily.existing", "summaries", {"daily_id": "d1", "content_hash": "h1"}, None),
+    ("exports.quiz_responses", "quiz_responses",
+     {"tenant": "t1", "attempted_at": {"$gte": "2025-01-01", "$lt": "2025-02-01"}}, [("attempted_at", 1)]),
+    ("exports.student_progress", "student_progress",
+     {"tenant": "t1", "date": {"$gte": "2025-01-01", "$lt": "2025-02-01"}}, [("date", 1)]),
+    ("bm25.build", "cbse_docs", {"class_no": 7, "subject": "Science"}, None),
+    ("transcribe_jobs.claim", "transcribe_jobs", {"status": "queued"}, [("created_at", 1)]),
+]
 
-    # Teachers
-    await db.teachers.create_index("email", unique=True, name="ux_teacher_email")
 
-    # Parents
-    await db.parents.create_index("email", unique=True, name="ux_parent_email")
-    await db.parents.create_index("student_id", name="ix_parent_student")
+async def _drop_retired(db: AsyncIOMotorDatabase) -> None:
+    for coll, names in RETIRED.items():
+        existing = await db[coll].index_information()
+        for name in names:
+            if name in existing:
+                await db[coll].drop_index(name)
 
-    # Schools
-   # await db.schools.create_index([("tenant", 1), ("branch", 1)], unique=True, name="ux_school_tenant_branch")
+def _ttls() -> Dict[str, int]:
+    return {f"{coll}.{spec.name}": spec.options["expireAfterSeconds"]
+            for coll, specs in MANIFEST.items() for spec in specs if "expireAfterSeconds" in spec.options}
 
-    # Daily Classes
-    await db.classes_daily.create_index([("date", -1), ("class_no", 1), ("section", 1), ("subject", 1)], name="ix_daily_composite")
+async def _create(db: AsyncIOMotorDatabase, coll: str, spec: IndexSpec) -> None:
+    try:
+        await db[coll].create_index(spec.keys, name=spec.name, **spec.options)
+    except OperationFailure as e:
+        if e.code != INDEX_OPTIONS_CONFLICT or "expireAfterSeconds" not in spec.options:
+            raise
+        # the TTL setting changed: collMod updates it in place, without rebuilding the index
+        seconds = spec.options["expireAfterSeconds"]
+        await db.command("collMod", coll, index={"name": spec.name, "expireAfterSeconds": seconds})
+        print(f"[indexes] {coll}.{spec.name} expireAfterSeconds -> {seconds}")
 
-    # Quizzes
-    await db.quizzes.create_index("daily_id", name="ix_quiz_daily")
-    await db.quizzes.create_index("class_no", name="ix_quiz_class")
-    await db.quiz_responses.create_index([("quiz_id", 1), ("student_id", 1)], unique=True, name="ux_quiz_student")
+async def ensure(db: AsyncIOMotorDatabase, force: bool = False):
+    meta = await db.schema_meta.find_one({"_id": "indexes"})
+    if (not force and meta and meta.get("version", 0) >= INDEX_MANIFEST_VERSION
+            and meta.get("ttls") == _ttls()):
+        return
 
-    # Transcripts & Summaries
-    await db.transcripts.create_index("daily_id", name="ix_transcript_daily")
-    await db.summaries.create_index("daily_id", name="ix_summary_daily")
-    await db.stories.create_index("daily_id", name="ix_story_daily")
+    await _drop_retired(db)
+    complete = True
+    for coll, specs in MANIFEST.items():
+        for spec in specs:
+            try:
+                await _create(db, coll, spec)
+            except OperationFailure as e:
+                # e.g. legacy duplicates blocking a unique index; keep starting up and retry next time
+                print(f"[indexes] {coll}.{spec.name} not created: {e}")
+                complete = False
 
-    # CBSE RAG docs
-    # NOTE: For MongoDB Atlas Vector Search, create a Search Index in Atlas UI named "vector_index" on cbse_docs.embedding
-    await db.cbse_docs.create_index("chapter", name="ix_docs_chapter")
+    if complete:
+        await db.schema_meta.update_one(
+            {"_id": "indexes"}, {"$set": {"version": INDEX_MANIFEST_VERSION, "ttls": _ttls()}}, upsert=True
+        )
@@ -1,8 +1,9 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from .core.config import settings
-from .db.mongo import init_indexes
-from .routers import students, classes, quizzes, ai, admin, question,quiz,chat, progress
+from .db.mongo import get_db, init_indexes
+from .services import llm, prompts, vector_index, transcribe_jobs
+from .routers import students, classes, quizzes, ai, admin, question,quiz,chat, progress, exports
 
 
 app = FastAPI(title=settings.PROJECT_NAME, version="1.0.0")
@@ -14,6 +15,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Routers
@@ -26,10 +28,19 @@ app.include_router(question.router, prefix=settings.API_PREFIX)
 app.include_router(quiz.router, prefix=settings.API_PREFIX)
 app.include_router(chat.router, prefix=settings.API_PREFIX)
 app.include_router(progress.router, prefix=settings.API_PREFIX)
+app.include_router(exports.router, prefix=settings.API_PREFIX)
 
 @app.on_event("startup")
 async def on_startup():
     await init_indexes()
+    await prompts.sync(await get_db())
+    await transcribe_jobs.start()
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await transcribe_jobs.stop()
+    await llm.aclose()
+    await vector_index.flush()
 
 @app.get("/")
 async def health():
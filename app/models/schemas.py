@@ -13,6 +13,11 @@ class School(BaseModel):
     email: Optional[EmailStr] = None
     phone: Optional[str] = None
   
+class TeacherClass(BaseModel):
+    class_no: int
+    section: str
+    subject: str
+
 class Teacher(BaseModel):
     id: Optional[str] = Field(default=None, alias="_id")
     teacher_id: Optional[str] = None
@@ -21,6 +26,7 @@ class Teacher(BaseModel):
     phone: Optional[str] = None
     school_tenant: Optional[str] = None
     subjects: List[str] = []
+    classes: List[TeacherClass] = []  # sections this teacher teaches
 
 class Parent(BaseModel):
     id: Optional[str] = Field(default=None, alias="_id")
@@ -92,6 +98,13 @@ class Transcript(BaseModel):
     student_id: Optional[str] = None
     text: str
 
+class TranscribeJob(BaseModel):
+    id: str
+    daily_id: str
+    status: Literal["queued", "running", "done", "failed"]
+    transcript_id: Optional[str] = None
+    error: Optional[str] = None
+
 class Summary(BaseModel):
     id: Optional[str] = Field(default=None, alias="_id")
     daily_id: str
@@ -1,18 +1,99 @@
-from fastapi import APIRouter, Depends
-from ..core.security import api_key_guard
+import asyncio
+from datetime import date, timedelta
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException
+from ..core.security import api_key_guard, get_tenant
 from ..db.mongo import get_db
+from ..core import metrics
+from ..models.schemas import TeacherClass
+from ..services import analytics, bm25, context, embedding_cache, refcache, rollups, semantic_cache, singleflight
 
 router = APIRouter(prefix="/admin", tags=["admin"], dependencies=[Depends(api_key_guard)])
 
+MAX_WINDOW_DAYS = 366
+
+
+async def _teacher(db, teacher_email: str, tenant: str) -> dict:
+    teacher = await db.teachers.find_one({"email": teacher_email})
+    if not teacher or teacher.get("school_tenant") not in (None, tenant):
+        raise HTTPException(status_code=404, detail="Teacher not found")
+    return teacher
+
+async def _subject_sections(db, tenant: str, subjects: List[str], start: str, end: str) -> List[TeacherClass]:
+    """Every section of the tenant that held a class in one of `subjects` during the window."""
+    if not subjects:
+        return []
+    groups = await db.classes_daily.aggregate([
+        {"$match": {"tenant": tenant, "subject": {"$in": subjects}, "date": {"$gte": start, "$lte": end}}},
+        {"$group": {"_id": {"class_no": "$class_no", "section": "$section", "subject": "$subject"}}},
+    ]).to_list(None)
+    classes = [TeacherClass(**g["_id"]) for g in groups]
+    return sorted(classes, key=lambda c: (c.class_no, c.section, c.subject))
+
+@router.put("/teachers/{teacher_email}/classes", response_model=List[TeacherClass])
+async def assign_teacher_classes(teacher_email: str, classes: List[TeacherClass], tenant: str = Depends(get_tenant)):
+    """Replace the sections a teacher is assigned to (used by teacher-performance)."""
+    db = await get_db()
+    await _teacher(db, teacher_email, tenant)
+    unique = list({(c.class_no, c.section, c.subject): c for c in classes}.values())
+    await db.teachers.update_one({"email": teacher_email}, {"$set": {"classes": [c.model_dump() for c in unique]}})
+    return unique
+
 @router.get("/teacher-performance")
-async def teacher_performance(teacher_email: str):
+async def teacher_performance(teacher_email: str, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                              tenant: str = Depends(get_tenant)):
+    """
+    Per-class performance for a teacher's assigned classes over a date window
+    (default: the last 30 days, at most MAX_WINDOW_DAYS), read from class rollups.
+    A teacher without assigned classes falls back to every section of the
+    tenant that held a class in one of the teacher's subjects during the window.
+    """
     db = await get_db()
-    # Placeholder metrics: average quiz score per class taught
-    pipeline = [
-        {"$lookup": {"from": "quizzes", "localField": "daily_id", "foreignField": "_id", "as": "quiz"}},
-    ]
-    # For demo, return counts by class
-    # In a real system we'd join teacher->class sessions; here we stub
-    counts = await db.quizzes.count_documents({})
-    avg_score = await db.quiz_responses.aggregate([{"$group":{"_id":None,"avg":{"$avg":"$score"}}}]).to_list(1)
-    return {"teacher_email": teacher_email, "quizzes_created": counts, "avg_quiz_score": (avg_score[0]["avg"] if avg_score else None)}
+    try:
+        end = date.fromisoformat(end_date) if end_date else date.today()
+        start = date.fromisoformat(start_date) if start_date else end - timedelta(days=30)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be YYYY-MM-DD")
+    if start > end or (end - start).days > MAX_WINDOW_DAYS:
+        raise HTTPException(status_code=400, detail=f"Date window must be 0-{MAX_WINDOW_DAYS} days")
+
+    teacher = await _teacher(db, teacher_email, tenant)
+    assigned = [TeacherClass(**c) for c in teacher.get("classes") or []]
+    source = "assigned"
+    if not assigned:
+        assigned = await _subject_sections(db, tenant, teacher.get("subjects") or [], start.isoformat(), end.isoformat())
+        source = "subjects"
+    per_class = await asyncio.gather(*(
+        rollups.class_days(db, tenant, c.class_no, c.section, c.subject, start.isoformat(), end.isoformat())
+        for c in assigned
+    ))
+    daily_ids = [d for days in per_class for doc in days for d in (doc.get("dailies") or {})]
+    quizzes = await db.quizzes.count_documents({"daily_id": {"$in": daily_ids}}) if daily_ids else 0
+
+    all_days = [doc for days in per_class for doc in days]
+    totals = analytics.overall(all_days)
+    return {
+        "teacher_email": teacher_email,
+        "tenant": tenant,
+        "start_date": start.isoformat(),
+        "end_date": end.isoformat(),
+        "classes_from": source,
+        "quizzes_created": quizzes,
+        "avg_quiz_score": totals["avg_best_score"],
+        "overall": totals,
+        "classes": [
+            {**c.model_dump(), **analytics.class_performance(days)} for c, days in zip(assigned, per_class)
+        ],
+    }
+
+@router.get("/metrics")
+async def cache_metrics():
+    return {
+        "counters": metrics.snapshot(),
+        "embedding_cache": embedding_cache.stats(),
+        "semantic_cache": semantic_cache.stats(),
+        "refcache": refcache.stats(),
+        "singleflight": singleflight.stats(),
+        "context": context.stats(),
+        "bm25": bm25.stats(),
+    }
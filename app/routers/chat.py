@@ -1,9 +1,13 @@
+import asyncio
+import time
 from typing import List, Literal, Optional, AsyncGenerator
+import anyio
 from fastapi import APIRouter, HTTPException
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
+from ..core import metrics
 from ..core.config import settings
-from ..services.ai import get_client  # you already have this in ai.py
+from ..services import llm
 
 router = APIRouter(prefix=f"/ai", tags=["ai.chat"])
 
@@ -55,42 +59,93 @@ def _build_messages(req: ChatRequest) -> List[dict]:
 @router.post("/chat", response_model=ChatResponse)
 async def chat(req: ChatRequest):
     try:
-        client = get_client()
-        resp = client.chat.completions.create(
-            model=settings.AZURE_OPENAI_CHAT_DEPLOYMENT,
+        reply = await llm.chat_text(
             messages=_build_messages(req),
             temperature=req.temperature,
             max_tokens=req.max_tokens,
         )
-        reply = resp.choices[0].message.content or ""
-        return ChatResponse(reply=reply.strip())
+        return ChatResponse(reply=reply)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Chat error: {e}")
 
-# ----- Streaming (SSE) – optional upgrade -----
-@router.post("/chat/ ")
-async def chat_stream(req: ChatRequest):
-    client = get_client()
-
-    def sse_format(data: str) -> str:
-        return f"data: {data}\n\n"
+# ----- Streaming (SSE) -----
+def _sse(data: str) -> bytes:
+    # multi-line deltas become several data: lines, which SSE clients join with "\n"
+    return ("".join(f"data: {line}\n" for line in data.split("\n")) + "\n").encode("utf-8")
 
+@router.post("/chat/stream")
+@router.post("/chat/ ", include_in_schema=False)  # legacy path (had a trailing space)
+async def chat_stream(req: ChatRequest):
     async def gen() -> AsyncGenerator[bytes, None]:
+        usage: dict = {}
+        deltas = llm.chat_stream(
+            _build_messages(req), usage=usage, temperature=req.temperature, max_tokens=req.max_tokens,
+        )
+        max_delay = settings.CHAT_STREAM_MAX_DELAY_MS / 1000
+        started = time.perf_counter()
+        first_at = None
+        last_flush = started
+        buf: List[str] = []
+        buffered = frames = chars = 0
+        # the next delta is awaited in its own task so a flush timer can fire while it is pending
+        pending: Optional[asyncio.Future] = None
         try:
-            stream = client.chat.completions.create(
-                model=settings.AZURE_OPENAI_CHAT_DEPLOYMENT,
-                messages=_build_messages(req),
-                temperature=req.temperature,
-                max_tokens=req.max_tokens,
-                stream=True,
-            )
-            for chunk in stream:
-                delta = getattr(chunk.choices[0].delta, "content", None)
-                if delta:
-                    yield sse_format(delta).encode("utf-8")
-            # end of stream marker (optional)
-            yield sse_format("[DONE]").encode("utf-8")
+            while True:
+                if pending is None:
+                    pending = asyncio.ensure_future(deltas.__anext__())
+                timeout = max(0.0, last_flush + max_delay - time.perf_counter()) if buf else None
+                done, _ = await asyncio.wait({pending}, timeout=timeout)
+                now = time.perf_counter()
+                if not done:  # no new delta within CHAT_STREAM_MAX_DELAY_MS: send what we have
+                    yield _sse("".join(buf))
+                    buf.clear()
+                    buffered, frames, last_flush = 0, frames + 1, now
+                    continue
+                try:
+                    delta = pending.result()
+                except StopAsyncIteration:
+                    break
+                finally:
+                    pending = None
+                if first_at is None:
+                    first_at = now
+                buf.append(delta)
+                buffered += len(delta)
+                chars += len(delta)
+                # first token goes out at once; after that, coalesce tiny deltas
+                if frames == 0 or buffered >= settings.CHAT_STREAM_MIN_CHARS or now - last_flush >= max_delay:
+                    yield _sse("".join(buf))
+                    buf.clear()
+                    buffered, frames, last_flush = 0, frames + 1, now
+            if buf:
+                yield _sse("".join(buf))
+            yield _sse("[DONE]")
+        except asyncio.CancelledError:
+            # Starlette cancels the response task when the client disconnects
+            metrics.incr("chat.stream.disconnects")
+            raise
         except Exception as e:
-            yield sse_format(f"[ERROR] {e}").encode("utf-8")
+            yield _sse(f"[ERROR] {e}")
+        finally:
+            _record_stream_stats(started, first_at, usage, chars)
+            # shielded: on disconnect the cancelled scope would otherwise abort these awaits
+            with anyio.CancelScope(shield=True):
+                if pending is not None:
+                    pending.cancel()  # unwinds llm.chat_stream, closing the upstream stream
+                    await asyncio.gather(pending, return_exceptions=True)
+                await deltas.aclose()
+
+    return StreamingResponse(gen(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
 
-    return StreamingResponse(gen(), media_type="text/event-stream")
+def _record_stream_stats(started: float, first_at: Optional[float], usage: dict, chars: int) -> None:
+    end = time.perf_counter()
+    metrics.incr("chat.stream.requests")
+    if first_at is None:
+        return
+    ttft_ms = (first_at - started) * 1000
+    tokens = usage.get("completion_tokens") or max(1, chars // 4)  # ~4 chars/token if usage is missing
+    gen_s = max(end - first_at, 1e-6)
+    metrics.incr("chat.stream.ttft_ms_total", ttft_ms)
+    metrics.incr("chat.stream.completion_tokens", tokens)
+    metrics.incr("chat.stream.generation_seconds", gen_s)
+    print(f"[chat.stream] ttft={ttft_ms:.0f}ms tokens={tokens} rate={tokens / gen_s:.1f} tok/s")
@@ -1,21 +1,26 @@
 # app/routers/classes.py
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Body
-from datetime import date as dt_date
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, UploadFile, File, Body
+from fastapi.responses import StreamingResponse
+from datetime import date as dt_date, datetime, timezone
+from pymongo import ReturnDocument
 from bson import ObjectId
-import os, tempfile, urllib.request
+import asyncio, json, os
 from app.core.config import settings
+from ..core import metrics
 from ..core.security import api_key_guard, get_tenant
 from ..db.mongo import get_db
-from ..models.schemas import DailyClass, Transcript, Summary
-from ..services.transcribe import transcribe_wav
+from ..models.schemas import DailyClass, Summary, TranscribeJob
+from ..services import prompts, refcache, stories, transcribe_jobs
 from ..services.ai import summarize as ai_summarize
+from ..utils.pagination import next_cursor_headers, page_params, paginate
+from ..utils.serialization import ReadShape
 
-# Azure Blob (private download)
-from azure.storage.blob import BlobClient
 from urllib.parse import urlsplit, unquote
 
 router = APIRouter(prefix="/classes", tags=["classes"], dependencies=[Depends(api_key_guard)])
 
+_daily_shape = ReadShape(DailyClass)
+
 # ---------- helpers ----------
 def _today_iso() -> str:
     return dt_date.today().isoformat()
@@ -40,7 +45,7 @@ async def _get_or_create_daily(db, *, tenant: str, class_no: int, section: str,
 
 # ---------- existing endpoints (fixed) ----------
 @router.post("/daily", response_model=DailyClass, status_code=201)
-async def create_daily(payload: DailyClass, tenant: str = Depends(get_tenant)):
+async def create_daily(payload: DailyClass, background: BackgroundTasks, tenant: str = Depends(get_tenant)):
     db = await get_db()
     # Ensure tenant from header overrides or is set if missing in payload (though payload has it mandatory now)
     # Actually, DailyClass has tenant mandatory. The client should send it in body OR we override it.
@@ -50,42 +55,62 @@ async def create_daily(payload: DailyClass, tenant: str = Depends(get_tenant)):
     res = await db.classes_daily.insert_one(data)
     payload.id = str(res.inserted_id)
     payload.tenant = tenant
+    await refcache.invalidate_daily(payload.id)
+    if settings.STORY_PREWARM_ON_CREATE and payload.topics:
+        background.add_task(stories.prewarm_section, tenant, payload.id)
     return payload
 
-@router.post("/daily/{daily_id}/transcribe", response_model=Transcript)
-async def upload_and_transcribe(daily_id: str, audio: UploadFile = File(...)):
+@router.post("/daily/{daily_id}/transcribe", response_model=TranscribeJob, status_code=202)
+async def upload_and_transcribe(daily_id: str, audio: UploadFile = File(...), tenant: str = Depends(get_tenant)):
+    """Spool the upload and queue a transcription job; poll /classes/transcribe-jobs/{job_id}."""
     db = await get_db()
     if not ObjectId.is_valid(daily_id) or not await db.classes_daily.find_one({"_id": ObjectId(daily_id)}):
         raise HTTPException(status_code=404, detail="Daily class not found")
 
     suffix = os.path.splitext(audio.filename or "")[1] or ".mp3"
-    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-        tmp.write(await audio.read())
-        tmp_path = tmp.name
-
+    path = transcribe_jobs.spool_path(suffix)
     try:
-        text = await transcribe_wav(tmp_path)
-    finally:
-        try: os.remove(tmp_path)
-        except OSError: pass
+        with open(path, "wb") as f:
+            while chunk := await audio.read(1024 * 1024):  # stream to disk, never the whole file in RAM
+                await asyncio.to_thread(f.write, chunk)  # keep disk writes off the event loop
+    except BaseException:
+        transcribe_jobs.remove_spool(path)
+        raise
 
-    res = await db.transcripts.insert_one({"daily_id": daily_id, "text": text})
-    return Transcript(id=str(res.inserted_id), daily_id=daily_id, text=text)
+    job_id = await transcribe_jobs.submit(daily_id=daily_id, tenant=tenant, source_path=path, suffix=suffix)
+    return TranscribeJob(id=job_id, daily_id=daily_id, status="queued")
 
 @router.post("/daily/{daily_id}/summarize", response_model=Summary)
-async def summarize_daily(daily_id: str):
+async def summarize_daily(daily_id: str, force: bool = False):
+    """Summary for the class's current transcript; reused until an input or the prompt changes (or force=true)."""
     db = await get_db()
-    if not ObjectId.is_valid(daily_id) or not await db.classes_daily.find_one({"_id": ObjectId(daily_id)}):
+    d = await db.classes_daily.find_one({"_id": ObjectId(daily_id)}) if ObjectId.is_valid(daily_id) else None
+    if not d:
         raise HTTPException(status_code=404, detail="Daily class not found")
 
-    t = await db.transcripts.find_one({"daily_id": daily_id})
-    base = t["text"] if t else ""
-    d = await db.classes_daily.find_one({"_id": ObjectId(daily_id)})
-    if d and d.get("summary"):
-        base = d["summary"] + "\n" + base
-    text = await ai_summarize(base) if base else ""
-    res = await db.summaries.insert_one({"daily_id": daily_id, "text": text})
-    return Summary(id=str(res.inserted_id), daily_id=daily_id, text=text)
+    t = await db.transcripts.find_one({"daily_id": daily_id}, {"text": 1}, sort=[("_id", -1)])  # latest upload
+    transcript = t["text"] if t else ""
+    class_summary = d.get("summary") or ""
+    stamp = await prompts.stamp(db, "summarize", transcript, class_summary, d["class_no"], d["subject"],
+                                await prompts.version(db, "summarize_part"))
+    if not force:
+        existing = await db.summaries.find_one({"daily_id": daily_id, "content_hash": stamp.content_hash})
+        if existing:
+            metrics.incr("artifacts.summary.reused")
+            return Summary(_id=str(existing["_id"]), daily_id=daily_id, text=existing["text"])
+
+    base = (class_summary + "\n" + transcript) if class_summary else transcript
+    text = await ai_summarize(base, d["class_no"], d["subject"]) if base else ""
+    metrics.incr("artifacts.summary.generated")
+    # (daily_id, content_hash) is unique: a concurrent request for the same content may have stored
+    # its summary first, and that one is kept and returned; force=true replaces it
+    fields = {"text": text, **stamp.fields(), "created_at": datetime.now(timezone.utc)}
+    doc = await db.summaries.find_one_and_update(
+        {"daily_id": daily_id, "content_hash": stamp.content_hash},
+        {"$set" if force else "$setOnInsert": fields},
+        upsert=True, projection={"text": 1}, return_document=ReturnDocument.AFTER,
+    )
+    return Summary(_id=str(doc["_id"]), daily_id=daily_id, text=doc["text"])
 
 # ---------- NEW: private blob download + auto-create daily ----------
 @router.post("/transcribe-blob-or-create")
@@ -128,57 +153,56 @@ async def transcribe_blob_or_create(payload: dict = Body(...), tenant: str = Dep
 
     # Prefer private SDK download (works without public read/SAS)
     conn_str = settings.AZURE_BLOB_CONN_STR
-   
-    print("conn_str", conn_str)
     if not conn_str and "sig=" not in blob_url:
         raise HTTPException(400, "Private blob: set AZURE_BLOB_CONN_STR in environment or provide a SAS URL")
 
-    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-        if conn_str:
-            bc = BlobClient.from_connection_string(conn_str, container_name=container_name, blob_name=blob_name)
-            data = bc.download_blob()
-            tmp.write(data.readall())
-        else:
-            # has SAS in the URL; public download is OK
-            with urllib.request.urlopen(blob_url) as resp:
-                tmp.write(resp.read())
-        tmp_path = tmp.name
-
-    try:
-        text = await transcribe_wav(tmp_path)
-        if not text:
-            raise HTTPException(
-                status_code=502,
-                detail="Speech recognition returned empty. Key/region OK; audio parsed. Try clearer audio or verify ffmpeg/pydub installed."
-            )
-    finally:
-        try: os.remove(tmp_path)
-        except OSError: pass
-
-    res = await db.transcripts.insert_one({
-        "daily_id": daily_id,
-        "text": text,
-        "source": "blob",
-        "blob_url": blob_url
-    })
-
+    # Download + transcription happen on the job workers
+    job_id = await transcribe_jobs.submit(daily_id=daily_id, tenant=str(tenant), blob_url=blob_url, suffix=suffix)
     return {
         "daily_id": daily_id,
-        "transcript_id": str(res.inserted_id),
-        "text_len": len(text or "")
+        "job_id": job_id,
+        "status": "queued"
     }
 
+@router.get("/transcribe-jobs/{job_id}")
+async def get_transcribe_job(job_id: str):
+    job = await transcribe_jobs.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.get("/transcribe-jobs/{job_id}/events")
+async def transcribe_job_events(job_id: str):
+    """SSE stream of job status changes; closes once the job is done or failed."""
+    if not await transcribe_jobs.get_job(job_id):
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def gen():
+        last = None
+        while True:
+            job = await transcribe_jobs.get_job(job_id)
+            if job is None:  # deleted or expired while we were watching
+                yield f"data: {json.dumps({'id': job_id, 'status': 'gone'})}\n\n".encode("utf-8")
+                return
+            state = (job["status"], job.get("updated_at"))
+            if state != last:
+                last = state
+                yield f"data: {json.dumps(job, default=str)}\n\n".encode("utf-8")
+            if job["status"] in transcribe_jobs.TERMINAL:
+                return
+            await asyncio.sleep(2)
+
+    return StreamingResponse(gen(), media_type="text/event-stream")
+
 @router.get("/daily", response_model=list[DailyClass])
-async def list_daily_classes(class_no: int, section: str, date: str | None = None, tenant: str = Depends(get_tenant)):
+async def list_daily_classes(class_no: int, section: str, date: str | None = None,
+                             page: dict = Depends(page_params(50)), tenant: str = Depends(get_tenant)):
     db = await get_db()
     query = {"tenant": tenant, "class_no": class_no, "section": section}
     if date:
         query["date"] = date
     
-    cursor = db.classes_daily.find(query).sort("date", -1).limit(50)
-    results = []
-    async for doc in cursor:
-        if "_id" in doc:
-            doc["_id"] = str(doc["_id"])
-        results.append(DailyClass(**doc))
-    return results
+    docs, next_cursor = await paginate(db.classes_daily, query, scope="classes_daily",
+                                       sort_field="date", direction=-1,
+                                       projection=_daily_shape.projection, **page)
+    return _daily_shape.response(docs, next_cursor_headers(next_cursor))
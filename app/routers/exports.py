@@ -0,0 +1,86 @@
+"""
+Streaming NDJSON exports for bulk consumers (analytics jobs, parent reports).
+
+Rows are read from a Motor cursor in EXPORT_BATCH_SIZE batches and written to
+the response as they arrive, optionally gzip-compressed on the fly, so memory
+stays flat regardless of how many rows match.
+"""
+import zlib
+from datetime import date, timedelta
+from typing import Any, AsyncIterator, Dict, Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+
+from ..core import metrics
+from ..core.config import settings
+from ..core.security import api_key_guard, get_tenant
+from ..db.mongo import get_db
+from ..utils.serialization import ndjson_line
+
+router = APIRouter(prefix="/exports", tags=["exports"], dependencies=[Depends(api_key_guard)])
+
+
+def _date_range(field: str, start_date: Optional[str], end_date: Optional[str]) -> Dict[str, Any]:
+    """Inclusive YYYY-MM-DD range; also matches ISO timestamps stored as strings."""
+    rng: Dict[str, str] = {}
+    try:
+        if start_date:
+            rng["$gte"] = date.fromisoformat(start_date).isoformat()
+        if end_date:
+            rng["$lt"] = (date.fromisoformat(end_date) + timedelta(days=1)).isoformat()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be YYYY-MM-DD")
+    return {field: rng} if rng else {}
+
+async def _ndjson(cursor, name: str, gzip: bool) -> AsyncIterator[bytes]:
+    z = zlib.compressobj(6, zlib.DEFLATED, 31) if gzip else None  # wbits=31 -> gzip container
+    buf = bytearray()
+    rows = 0
+    try:
+        async for doc in cursor:
+            doc["_id"] = str(doc["_id"])
+            buf += ndjson_line(doc)
+            rows += 1
+            if len(buf) >= settings.EXPORT_FLUSH_BYTES:
+                out = z.compress(bytes(buf)) if z else bytes(buf)
+                buf.clear()
+                if out:
+                    yield out
+        tail = z.compress(bytes(buf)) + z.flush() if z else bytes(buf)
+        if tail:
+            yield tail
+    finally:
+        await cursor.close()
+        metrics.incr(f"exports.{name}.rows", rows)
+
+def _stream(cursor, name: str, gzip: bool) -> StreamingResponse:
+    headers = {"Content-Disposition": f'attachment; filename="{name}.ndjson"'}
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(_ndjson(cursor, name, gzip), media_type="application/x-ndjson", headers=headers)
+
+
+@router.get("/quiz-responses")
+async def export_quiz_responses(start_date: Optional[str] = None, end_date: Optional[str] = None,
+                                student_id: Optional[str] = None, gzip: bool = False,
+                                tenant: str = Depends(get_tenant)):
+    """All quiz attempts for the tenant, filtered by attempted_at date, as NDJSON."""
+    db = await get_db()
+    query = {"tenant": tenant, **_date_range("attempted_at", start_date, end_date)}
+    if student_id:
+        query["student_id"] = student_id
+    cursor = db.quiz_responses.find(query).sort("attempted_at", 1).batch_size(settings.EXPORT_BATCH_SIZE)
+    return _stream(cursor, "quiz_responses", gzip)
+
+@router.get("/student-progress")
+async def export_student_progress(start_date: Optional[str] = None, end_date: Optional[str] = None,
+                                  class_no: Optional[int] = None, gzip: bool = False,
+                                  tenant: str = Depends(get_tenant)):
+    """Progress documents for the tenant, filtered by class date, as NDJSON."""
+    db = await get_db()
+    query = {"tenant": tenant, **_date_range("date", start_date, end_date)}
+    if class_no is not None:
+        query["class_no"] = class_no
+    cursor = db.student_progress.find(query).sort("date", 1).batch_size(settings.EXPORT_BATCH_SIZE)
+    return _stream(cursor, "student_progress", gzip)
@@ -1,11 +1,12 @@
 
 
-from fastapi import APIRouter,Depends,HTTPException
+from fastapi import APIRouter,Depends,HTTPException,Response
 from ..db.mongo import get_db
 from app.services.question import QuestionService
 from motor.motor_asyncio import AsyncIOMotorDatabase
 
 from app.models.question import Question
+from app.utils.pagination import page_params, set_next_cursor
 
 
 router = APIRouter(prefix="/questions", tags=["Question"])
@@ -23,5 +24,8 @@ async def create_question(question: Question, service: QuestionService = Depends
     return created_question
 
 @router.get("/")
-async def list_questions(service: QuestionService = Depends(get_question_service)):
-       return await service.get_all_questions()
\ No newline at end of file
+async def list_questions(response: Response, page: dict = Depends(page_params(100)),
+                         service: QuestionService = Depends(get_question_service)):
+       questions, next_cursor = await service.get_all_questions(**page)
+       set_next_cursor(response, next_cursor)
+       return questions
@@ -2,26 +2,44 @@ from fastapi import APIRouter, Depends, HTTPException
 from datetime import datetime
 from typing import Dict, List
 from bson import ObjectId
+from pymongo import InsertOne
 from ..core.security import api_key_guard, get_tenant
 from ..db.mongo import get_db
 from ..models.schemas import Quiz, QuizResponse
-from pydantic import BaseModel
+from ..services import grading, refcache, rollups
+from ..services.progress import apply_quiz_batch, now_iso, update_progress
+from ..utils.pagination import next_cursor_headers, page_params, paginate
+from ..utils.serialization import ReadShape
+from pydantic import BaseModel, Field
 
 router = APIRouter(prefix="/quiz", tags=["quiz"], dependencies=[Depends(api_key_guard)])
 
+_response_shape = ReadShape(QuizResponse)
+
 class SubmitQuizRequest(BaseModel):
     student_id: str
     daily_id: str
     responses: Dict[str, List[str]]  # {qid: [selected_option]}
     time_taken_seconds: int = 0
 
+QUIZ_BATCH_MAX = 500
+
+class BatchSubmission(BaseModel):
+    student_id: str
+    responses: Dict[str, List[str]]  # {qid: [selected_option]}
+    time_taken_seconds: int = 0
+
+class SubmitQuizBatchRequest(BaseModel):
+    daily_id: str
+    submissions: List[BatchSubmission] = Field(..., min_length=1, max_length=QUIZ_BATCH_MAX)
+
 @router.get("/{daily_id}", response_model=Quiz)
 async def get_quiz(daily_id: str, tenant: str = Depends(get_tenant)):
     """Get quiz for a daily class."""
     db = await get_db()
     
-    # Find quiz for this daily class
-    quiz = await db.quizzes.find_one({"daily_id": daily_id, "tenant": tenant})
+    # Find the latest quiz for this daily class
+    quiz = await db.quizzes.find_one({"daily_id": daily_id, "tenant": tenant}, sort=[("_id", -1)])
     
     if not quiz:
         raise HTTPException(status_code=404, detail="Quiz not found for this class")
@@ -37,46 +55,40 @@ async def submit_quiz(request: SubmitQuizRequest, tenant: str = Depends(get_tena
     db = await get_db()
     
     # Get the quiz
-    quiz = await db.quizzes.find_one({"daily_id": request.daily_id, "tenant": tenant})
+    quiz = await refcache.get_quiz_for_daily(tenant, request.daily_id)
     if not quiz:
         raise HTTPException(status_code=404, detail="Quiz not found")
     
     # Get daily class info
-    daily_class = await db.classes_daily.find_one({"_id": ObjectId(request.daily_id)})
+    daily_class = await refcache.get_daily(tenant, request.daily_id)
     if not daily_class:
         raise HTTPException(status_code=404, detail="Daily class not found")
     
-    # Build correct answers map
-    correct_answers = {}
-    for q in quiz["questions"]:
-        correct_answers[q["qid"]] = q["correct"]
-    
-    # Calculate score
-    correct_count = 0
-    total_questions = len(quiz["questions"])
-    
-    for qid, student_answer in request.responses.items():
-        if qid in correct_answers and student_answer == correct_answers[qid]:
-            correct_count += 1
-    
-    score = (correct_count / total_questions) * 100 if total_questions > 0 else 0
-    
-    # Get existing responses to determine attempt number
-    existing_responses = await db.quiz_responses.find({
-        "daily_id": request.daily_id,
-        "student_id": request.student_id
-    }).sort("attempt_number", -1).limit(1).to_list(1)
-    
-    attempt_number = 1
-    if existing_responses:
-        attempt_number = existing_responses[0]["attempt_number"] + 1
-    
+    # Grade against the compiled answer key
+    key = grading.answer_key(quiz)
+    correct_answers = key.correct_answers
+    total_questions = len(key.qids)
+    correct_count, _, score = grading.grade(quiz, request.responses)
+    
+    # Update student progress atomically; the incremented attempt count is this attempt's number
+    now = now_iso()
+    quiz_id = str(quiz["_id"])
+    progress = await update_progress(
+        db,
+        student_id=request.student_id,
+        daily_id=request.daily_id,
+        daily_class=daily_class,
+        tenant=tenant,
+        quiz_score=score,
+        quiz_id=quiz_id,
+    )
+    attempt_number = progress["quiz_attempts"]
+
     # Create quiz response document
-    now = datetime.utcnow().isoformat() + "Z"
     quiz_response = {
         "daily_id": request.daily_id,
         "student_id": request.student_id,
-        "quiz_id": str(quiz["_id"]),
+        "quiz_id": quiz_id,
         "tenant": tenant,
         "attempt_number": attempt_number,
         "attempted_at": now,
@@ -92,65 +104,6 @@ async def submit_quiz(request: SubmitQuizRequest, tenant: str = Depends(get_tena
     result = await db.quiz_responses.insert_one(quiz_response)
     quiz_response["_id"] = str(result.inserted_id)
     
-    # Update student progress
-    progress = await db.student_progress.find_one({
-        "student_id": request.student_id,
-        "daily_id": request.daily_id
-    })
-    
-    if not progress:
-        # Create new progress document
-        progress = {
-            "student_id": request.student_id,
-            "daily_id": request.daily_id,
-            "tenant": tenant,
-            "date": daily_class["date"],
-            "class_no": daily_class["class_no"],
-            "section": daily_class["section"],
-            "subject": daily_class["subject"],
-            "summary_viewed": False,
-            "story_generated": False,
-            "quiz_taken": False,
-            "quiz_attempts": 0,
-            "completion_percentage": 0.0,
-            "is_completed": False,
-            "created_at": now,
-            "updated_at": now
-        }
-    
-    # Update quiz fields
-    progress["quiz_taken"] = True
-    progress["quiz_id"] = str(quiz["_id"])
-    progress["quiz_attempts"] = attempt_number
-    progress["quiz_latest_score"] = score
-    progress["quiz_last_attempt_at"] = now
-    
-    if attempt_number == 1:
-        progress["quiz_first_attempt_at"] = now
-        progress["quiz_best_score"] = score
-    else:
-        # Update best score if this attempt is better
-        if score > progress.get("quiz_best_score", 0):
-            progress["quiz_best_score"] = score
-    
-    progress["updated_at"] = now
-    
-    # Recalculate completion
-    from .progress import calculate_completion
-    completion, is_completed = calculate_completion(progress)
-    progress["completion_percentage"] = completion
-    progress["is_completed"] = is_completed
-    
-    if is_completed and not progress.get("completed_at"):
-        progress["completed_at"] = now
-    
-    # Upsert progress
-    await db.student_progress.update_one(
-        {"student_id": request.student_id, "daily_id": request.daily_id},
-        {"$set": progress},
-        upsert=True
-    )
-    
     return {
         "quiz_response_id": quiz_response["_id"],
         "score": score,
@@ -158,29 +111,99 @@ async def submit_quiz(request: SubmitQuizRequest, tenant: str = Depends(get_tena
         "total_questions": total_questions,
         "attempt_number": attempt_number,
         "best_score": progress["quiz_best_score"],
-        "completion_percentage": completion,
-        "is_completed": is_completed
+        "completion_percentage": progress["completion_percentage"],
+        "is_completed": progress["is_completed"]
     }
 
-@router.get("/responses/{daily_id}")
+@router.post("/submit/batch")
+async def submit_quiz_batch(request: SubmitQuizBatchRequest, tenant: str = Depends(get_tenant)):
+    """
+    Submit many students' responses for one daily class.
+
+    The quiz and class are loaded once and all submissions are graded together
+    with the compiled answer key. Each student's attempts are one atomic
+    pipeline update, all students in one bulk_write (see apply_quiz_batch);
+    attempt numbers come from the batch marker the update leaves, best score
+    and completion from the progress read back right after. Responses then go
+    out in one bulk_write. Results are in submission order;
+    a student listed more than once gets consecutive attempt numbers and the
+    progress after all of their attempts.
+    """
+    db = await get_db()
+    quiz = await refcache.get_quiz_for_daily(tenant, request.daily_id)
+    if not quiz:
+        raise HTTPException(status_code=404, detail="Quiz not found")
+    daily_class = await refcache.get_daily(tenant, request.daily_id)
+    if not daily_class:
+        raise HTTPException(status_code=404, detail="Daily class not found")
+
+    subs = request.submissions
+    key = grading.answer_key(quiz)
+    correct_answers = key.correct_answers
+    total_questions = len(key.qids)
+    grades = grading.grade_many(quiz, [s.responses for s in subs])
+
+    now = now_iso()
+    quiz_id = str(quiz["_id"])
+    scores_by_student: Dict[str, List[float]] = {}
+    for sub, (_, _, score) in zip(subs, grades):
+        scores_by_student.setdefault(sub.student_id, []).append(score)
+    applied = await apply_quiz_batch(db, daily_id=request.daily_id, daily_class=daily_class, tenant=tenant,
+                                     quiz_id=quiz_id, scores_by_student=scores_by_student, now=now)
+    after = {sid: p for sid, (p, _) in applied.items()}
+    next_attempt = {sid: first for sid, (_, first) in applied.items()}
+
+    response_ops, results = [], []
+    for sub, (correct_count, _, score) in zip(subs, grades):
+        p = after[sub.student_id]
+        attempt_number = next_attempt[sub.student_id]
+        next_attempt[sub.student_id] += 1
+        doc = {
+            "_id": ObjectId(),
+            "daily_id": request.daily_id,
+            "student_id": sub.student_id,
+            "quiz_id": quiz_id,
+            "tenant": tenant,
+            "attempt_number": attempt_number,
+            "attempted_at": now,
+            "responses": sub.responses,
+            "correct_answers": correct_answers,
+            "score": score,
+            "correct_count": correct_count,
+            "total_questions": total_questions,
+            "time_taken_seconds": sub.time_taken_seconds,
+        }
+        response_ops.append(InsertOne(doc))
+        results.append({
+            "student_id": sub.student_id,
+            "quiz_response_id": str(doc["_id"]),
+            "score": score,
+            "correct_count": correct_count,
+            "total_questions": total_questions,
+            "attempt_number": attempt_number,
+            "best_score": p["quiz_best_score"],
+            "completion_percentage": p["completion_percentage"],
+            "is_completed": p["is_completed"],
+        })
+
+    await db.quiz_responses.bulk_write(response_ops, ordered=False)
+    await rollups.record_many(db, list(after.values()))
+
+    return {"daily_id": request.daily_id, "count": len(results), "results": results}
+
+@router.get("/responses/{daily_id}", response_model=List[QuizResponse])
 async def get_quiz_responses(
     daily_id: str,
     student_id: str,
+    page: dict = Depends(page_params(50)),
     tenant: str = Depends(get_tenant)
 ):
-    """Get all quiz attempts for a student on a daily class."""
+    """Get quiz attempts for a student on a daily class, oldest first."""
     db = await get_db()
     
-    cursor = db.quiz_responses.find({
+    docs, next_cursor = await paginate(db.quiz_responses, {
         "daily_id": daily_id,
         "student_id": student_id,
         "tenant": tenant
-    }).sort("attempt_number", 1)
-    
-    results = []
-    async for doc in cursor:
-        if "_id" in doc:
-            doc["_id"] = str(doc["_id"])
-        results.append(QuizResponse(**doc))
-    
-    return results
\ No newline at end of file
+    }, scope="quiz_responses", sort_field="attempt_number", projection=_response_shape.projection, **page)
+    return _response_shape.response(docs, next_cursor_headers(next_cursor))
\ No newline at end of file
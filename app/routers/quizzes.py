@@ -1,55 +1,76 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from typing import List, Dict
-from datetime import date
+from datetime import date, datetime, timezone
+from bson import ObjectId
+from ..core import metrics
 from ..core.security import api_key_guard
 from ..db.mongo import get_db
 from ..models.schemas import Quiz, QuizQuestion, QuizOption, QuizResponse
+from ..services import grading, prompts
 from ..services.ai import generate_quiz
 
+QUIZ_QUESTIONS = 5
+
 router = APIRouter(prefix="/quizzes", tags=["quizzes"], dependencies=[Depends(api_key_guard)])
 
 @router.post("/from-daily/{daily_id}", response_model=Quiz, status_code=201)
-async def create_quiz_from_daily(daily_id: str):
+async def create_quiz_from_daily(daily_id: str, response: Response, force: bool = False):
+    """Quiz for the class's current content; an unchanged class returns its existing quiz (200) unless force=true."""
     db = await get_db()
-    d = await db.classes_daily.find_one({"_id":{"$oid": daily_id}})
+    d = await db.classes_daily.find_one({"_id": ObjectId(daily_id)}) if ObjectId.is_valid(daily_id) else None
     if not d:
         raise HTTPException(status_code=404, detail="Daily class not found")
-    base = d.get("summary") or ""
-    if not base:
-        t = await db.transcripts.find_one({"daily_id": daily_id})
-        base = t.get("text","") if t else ""
-    qs = await generate_quiz(base, n_questions=5)
+    tenant = d.get("tenant", "demo-school")
+    t = await db.transcripts.find_one({"daily_id": daily_id}, {"text": 1}, sort=[("_id", -1)])  # latest upload
+    transcript = t.get("text", "") if t else ""
+    class_summary = d.get("summary") or ""
+    stamp = await prompts.stamp(db, "quiz", transcript, class_summary, QUIZ_QUESTIONS)
+    current = {"daily_id": daily_id, "content_hash": stamp.content_hash}
+    if not force:
+        existing = await db.quizzes.find_one(current)
+        if existing:
+            metrics.incr("artifacts.quiz.reused")
+            response.status_code = 200
+            return Quiz(**{**existing, "_id": str(existing["_id"])})
+
+    qs = await generate_quiz(class_summary or transcript, n_questions=QUIZ_QUESTIONS)
+    metrics.incr("artifacts.quiz.generated")
     questions = [QuizQuestion(qid=q["qid"], question=q["question"], options=[QuizOption(**o) for o in q["options"]], correct=q.get("correct",[])) for q in qs]
     quiz = Quiz(
         daily_id=daily_id,
+        subject=d["subject"],
+        topic=", ".join(d.get("topics", [])) or d["subject"],
         class_no=d["class_no"],
         section=d["section"],
-        subject=d["subject"],
-        topic_tags=d.get("topics", []),
-        questions=questions
+        tenant=tenant,
+        questions=questions,
+        created_at=datetime.now(timezone.utc).isoformat(),
     )
-    res = await db.quizzes.insert_one(quiz.model_dump(by_alias=True, exclude_none=True))
-    quiz.id = str(res.inserted_id)
+    doc = {**quiz.model_dump(by_alias=True, exclude_none=True), "topic_tags": d.get("topics", []), **stamp.fields()}
+    if force:
+        # keep the old quiz (responses point at its id) but take it out of the unique (daily_id, content_hash)
+        await db.quizzes.update_many(current, {"$rename": {"content_hash": "superseded_content_hash"}})
+    # a concurrent request for the same content may have stored its quiz first; keep and return that one
+    res = await db.quizzes.update_one(current, {"$setOnInsert": doc}, upsert=True)
+    if res.upserted_id is None:
+        stored = await db.quizzes.find_one(current)
+        response.status_code = 200
+        return Quiz(**{**stored, "_id": str(stored["_id"])})
+    doc["_id"] = res.upserted_id
+    quiz.id = str(res.upserted_id)
+    grading.answer_key(doc)  # compile the key now
     return quiz
 
 @router.post("/{quiz_id}/responses", response_model=QuizResponse, status_code=201)
 async def submit_response(quiz_id: str, payload: Dict[str, List[str]], student_id: str):
     # payload = {"q1":["a"], "q2":["b"], ...}
     db = await get_db()
-    quiz = await db.quizzes.find_one({"_id":{"$oid": quiz_id}})
+    quiz = await db.quizzes.find_one({"_id": ObjectId(quiz_id)}) if ObjectId.is_valid(quiz_id) else None
     if not quiz:
         raise HTTPException(status_code=404, detail="Quiz not found")
-    # grade
-    corr = {q["qid"]: set(q.get("correct", [])) for q in quiz["questions"]}
-    total = len(corr) or 1
-    score = 0
-    for qid, gold in corr.items():
-        pred = set(payload.get(qid, []))
-        if pred == gold:
-            score += 1
-    pct = score / total
+    # grade with the same compiled key and policy as /quiz/submit; this endpoint reports a 0..1 fraction
+    pct = grading.grade(quiz, payload).score / 100.0
     # insert
-    d = await db.classes_daily.find_one({"_id":{"$oid": quiz["daily_id"]}}) if quiz.get("daily_id") else None
     resp_doc = {
         "quiz_id": quiz_id,
         "daily_id": quiz.get("daily_id"),
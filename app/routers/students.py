@@ -1,13 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from ..core.security import api_key_guard
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from ..core.security import api_key_guard, get_tenant
 from ..db.mongo import get_db
 from ..models.schemas import Student
 from typing import List
 from ..models.schemas import Student, UpdatePersonaRequest
 from bson import ObjectId
+from ..services import refcache
+from ..utils.pagination import next_cursor_headers, page_params, paginate
+from ..utils.serialization import ReadShape
 
 router = APIRouter(prefix="/students", tags=["students"], dependencies=[Depends(api_key_guard)])
 
+_student_shape = ReadShape(Student)
+
 @router.post("", response_model=Student, status_code=201)
 async def create_student(student: Student):
     print("I am here")
@@ -31,13 +36,15 @@ async def get_student(student_id: str):
     return Student(**doc)
 
 @router.get("", response_model=List[Student])
-async def list_students(skip: int = 0, limit: int = 50):
+async def list_students(page: dict = Depends(page_params(50)),
+                        skip: int = Query(0, ge=0, deprecated=True, description="Offset; prefer the cursor")):
     db = await get_db()
-    cursor = db.students.find().skip(skip).limit(limit)
-    return [Student(**d) async for d in cursor]
+    docs, next_cursor = await paginate(db.students, {}, scope="students",
+                                       projection=_student_shape.projection, skip=skip, **page)
+    return _student_shape.response(docs, next_cursor_headers(next_cursor))
 
 @router.patch("/{student_id}/persona", response_model=Student)
-async def update_student_persona(student_id: str, payload: UpdatePersonaRequest):
+async def update_student_persona(student_id: str, payload: UpdatePersonaRequest, tenant: str = Depends(get_tenant)):
     """
     Upsert 5-attribute story persona for a student.
     """
@@ -49,6 +56,7 @@ async def update_student_persona(student_id: str, payload: UpdatePersonaRequest)
     # set the new structured persona
     update = {"$set": {"story_persona": payload.story_persona.model_dump()}}
     await db.students.update_one({"student_id": student_id}, update)
+    await refcache.invalidate_student(student_id)
     updated = await db.students.find_one({"student_id": student_id})
     if "_id" in updated and isinstance(updated["_id"], ObjectId):
         updated["_id"] = str(updated["_id"])
@@ -1,76 +1,74 @@
-from openai import AzureOpenAI
-
+import asyncio
+import math
 from app.services.rag import search_cbse
+from . import context, llm, prompts, singleflight
+from ..core import metrics
 from ..core.config import settings
 from typing import List, Dict, Any
 
-_client: AzureOpenAI | None = None
-
-def get_client() -> AzureOpenAI:
-    global _client
-    if _client is None:
-          _client = AzureOpenAI(
-            api_key=settings.AZURE_OPENAI_API_KEY,
-            azure_endpoint=settings.AZURE_OPENAI_ENDPOINT,
-            api_version="2024-12-01-preview"
-        )
-    return _client
+SUMMARY_TOP_K = 8            # reference chunks retrieved before dedupe/packing
+SUMMARY_QUERY_TOKENS = 512   # retrieval query taken from the start of the (condensed) transcript
+MAP_MAX_ROUNDS = 3
+QUIZ_PROMPT_RESERVE = 500    # instructions + schema around the summary
 
-async def summarize(text: str, chunks:str,class_no:int,subject:str) -> str:
-    client = get_client()
-    first_500_words = ' '.join(text.split()[:500])
-    class_no = class_no
-    subject = subject
-    query = first_500_words
-    chunks = search_cbse(query, class_no, subject, k=4)
-    print(f"Found {len(chunks)} relevant chunks for summary.")
-    if not chunks:
-        return "No relevant chunks found for summary."
-    resp = client.chat.completions.create(
-        model=settings.AZURE_OPENAI_CHAT_DEPLOYMENT,
-        messages=[
-            {
-                "role": "system",
-                "content": (
-                    "You are a concise teaching assistant for kids aged 7–14. "
-                    "Summarize the class discussion into 7–10 bullet points, "
-                    "Without losing any important information. Use both the transcript and the reference chunks to make the summary accurate and complete.Give more preference to what is taught in the transcript"
-                    "Your summary should take most of the important and concrete points from the transcript and the reference chunks which are part of the standard textbook, "
-                )
-            },
-            {
-                "role": "user",
-                "content": f"Transcript:\n{first_500_words}\n\nRelevant Chunk:\n{chunks}"
-            },
-        ],
+async def summarize(text: str, class_no: int, subject: str) -> str:
+    return await singleflight.do(
+        singleflight.key("summarize", text, class_no, subject),
+        lambda: _summarize(text, class_no, subject),
+        timeout=_summarize_timeout(text),
     )
-    return resp.choices[0].message.content.strip()
 
-async def generate_story(topic: str, persona: str | None) -> str:
-    client = get_client()
-    prompt = f"Create a short motivational story (<=200 words) that teaches the concept: {topic}. "
-    if persona:
-        prompt += f"Style for a child who likes: {persona}."
-    resp = client.chat.completions.create(
-        model=settings.AZURE_OPENAI_CHAT_DEPLOYMENT,
-        messages=[
-            {"role":"system","content":"You create engaging, child-friendly educational stories."},
-            {"role":"user","content":prompt},
-        ],
-        temperature=0.7,
+def _summarize_timeout(text: str) -> float:
+    """One SINGLEFLIGHT_TIMEOUT_SECONDS for the reduce call plus one per wave of map calls."""
+    pieces = math.ceil(context.count(text) / settings.SUMMARY_CHUNK_TOKENS)
+    waves = math.ceil(pieces / max(1, settings.SUMMARY_MAP_CONCURRENCY)) if pieces > 1 else 0
+    return settings.SINGLEFLIGHT_TIMEOUT_SECONDS * (1 + waves)
+
+async def _summarize(text: str, class_no: int, subject: str) -> str:
+    notes = await _condense(text)
+    query = context.truncate(notes, SUMMARY_QUERY_TOKENS)
+    chunks = await search_cbse(query, class_no, subject, k=SUMMARY_TOP_K)
+    refs, cited = context.passages(chunks, query, settings.SUMMARY_CONTEXT_TOKENS)
+    metrics.incr("summarize.chunks_retrieved", len(chunks))
+    metrics.incr("summarize.chunks_cited", len(cited))
+    return await llm.chat_text(
+        messages=context.fit("summarize", prompts.SUMMARIZE.messages(transcript=notes, passages=refs or "(none)")),
     )
-    return resp.choices[0].message.content.strip()
+
+async def _condense(text: str) -> str:
+    """
+    Map step: while the transcript is over SUMMARY_CHUNK_TOKENS, split it and
+    turn every piece into ordered notes in parallel, so the final (reduce)
+    prompt sees the whole lecture instead of its first few minutes.
+    """
+    budget = settings.SUMMARY_CHUNK_TOKENS
+    sem = asyncio.Semaphore(settings.SUMMARY_MAP_CONCURRENCY)
+
+    async def note(i: int, n: int, piece: str) -> str:
+        async with sem:
+            return await llm.chat_text(
+                messages=context.fit("summarize_part", prompts.SUMMARIZE_PART.messages(part=i + 1, parts=n, transcript=piece)),
+                temperature=0.2,
+            )
+
+    for _ in range(MAP_MAX_ROUNDS):
+        if context.count(text) <= budget:
+            return text
+        pieces = context.split(text, budget)
+        metrics.incr("summarize.map_calls", len(pieces))
+        text = "\n\n".join(await asyncio.gather(*(note(i, len(pieces), p) for i, p in enumerate(pieces))))
+    return context.truncate(text, budget)
 
 async def generate_quiz(summary: str, n_questions: int = 5) -> List[Dict[str, Any]]:
-    client = get_client()
-    schema = """Return JSON with a 'questions' array of objects:
-    { "qid": "q1", "question": "...", "options":[{"key":"a","description":"..."},...], "correct":["a"] }"""
-    resp = client.chat.completions.create(
-        model=settings.AZURE_OPENAI_CHAT_DEPLOYMENT,
-        messages=[
-            {"role":"system","content":"Generate objective MCQs for grade-school learners. 1 correct answer only unless topic needs multiple."},
-            {"role":"user","content":f"Create {n_questions} MCQs from this summary:\n{summary}\n{schema}"},
-        ],
+    return await singleflight.do(
+        singleflight.key("quiz", summary, n_questions),
+        lambda: _generate_quiz(summary, n_questions),
+    )
+
+async def _generate_quiz(summary: str, n_questions: int) -> List[Dict[str, Any]]:
+    summary = context.truncate(summary, settings.PROMPT_MAX_TOKENS - QUIZ_PROMPT_RESERVE)
+    resp = await llm.chat_completion(
+        messages=context.fit("quiz", prompts.QUIZ.messages(n_questions=n_questions, summary=summary)),
         temperature=0.2,
         response_format={"type":"json_object"}
     )
@@ -0,0 +1,68 @@
+"""
+Teacher analytics computed from class_daily_rollups.
+
+For each (class_no, section, subject) a teacher is assigned to, the rollup
+documents in the date window (one per class date) are folded into score
+distributions, attempt counts, completion rates and a weekly trend. Cost is
+O(class dates x students) per class, independent of raw event volume.
+"""
+from __future__ import annotations
+
+from datetime import date
+from typing import Any, Dict, Iterable, List
+
+import numpy as np
+
+SCORE_BUCKETS = [0, 20, 40, 60, 80, 100.0001]  # last bucket includes 100
+BUCKET_LABELS = ["0-20", "20-40", "40-60", "60-80", "80-100"]
+
+
+def _entries(days: Iterable[Dict[str, Any]]):
+    for doc in days:
+        for students in (doc.get("dailies") or {}).values():
+            for entry in students.values():
+                yield doc["date"], entry
+
+def _week(day: str) -> str:
+    y, w, _ = date.fromisoformat(day).isocalendar()
+    return f"{y}-W{w:02d}"
+
+def _summary(entries: List[Dict[str, Any]]) -> Dict[str, Any]:
+    scores = np.array([e["quiz_best_score"] for e in entries if e.get("quiz_best_score") is not None], dtype=float)
+    n = len(entries)
+    return {
+        "student_classes": n,
+        "quiz_takers": int(scores.size),
+        "quiz_attempts": int(sum(e.get("quiz_attempts", 0) for e in entries)),
+        "avg_best_score": round(float(scores.mean()), 2) if scores.size else None,
+        "median_best_score": round(float(np.median(scores)), 2) if scores.size else None,
+        "completion_rate": round(sum(1 for e in entries if e.get("is_completed")) / n, 4) if n else None,
+        "avg_completion": round(sum(e.get("completion", 0.0) for e in entries) / n, 2) if n else None,
+    }
+
+def class_performance(days: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Fold one class's rollup documents into totals, a score histogram and a weekly trend."""
+    rows = list(_entries(days))
+    entries = [e for _, e in rows]
+    scores = [e["quiz_best_score"] for e in entries if e.get("quiz_best_score") is not None]
+    hist, _ = np.histogram(scores, bins=SCORE_BUCKETS)
+
+    weeks: Dict[str, List[Dict[str, Any]]] = {}
+    for day, e in rows:
+        weeks.setdefault(_week(day), []).append(e)
+
+    return {
+        "class_dates": len(days),
+        "daily_classes": sum(len(doc.get("dailies") or {}) for doc in days),
+        **_summary(entries),
+        "score_distribution": dict(zip(BUCKET_LABELS, hist.tolist())),
+        "weekly_trend": [
+            {"week": wk, **{k: v for k, v in _summary(es).items()
+                           if k in ("student_classes", "avg_best_score", "completion_rate")}}
+            for wk, es in sorted(weeks.items())
+        ],
+    }
+
+def overall(days: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Totals across every class's rollup documents."""
+    return _summary([e for _, e in _entries(days)])
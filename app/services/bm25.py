@@ -0,0 +1,174 @@
+"""
+Local BM25 index over `cbse_docs` for hybrid retrieval.
+
+One partition per (class_no, subject), built in-process from the chunk texts
+on first use (no embeddings needed) and rebuilt when the slice's version in
+`cbse_slices` changes (see semantic_cache.docs_version). Each term's postings
+hold precomputed BM25 weights (k1=1.2, b=0.75), so a query is a few NumPy
+scatter-adds over the postings of its terms plus an argpartition.
+
+`search_cbse` fuses BM25 and vector results with reciprocal rank fusion
+(`rrf`). A short keyword query whose top-k hits all contain every query term is
+"lexically confident" and is answered from BM25 alone, skipping the vector
+search (and the query embedding for callers that have not embedded the query
+already; /ai/rag/answer embeds every question for the semantic answer cache).
+"""
+from __future__ import annotations
+
+import asyncio
+import math
+import re
+import time
+from collections import Counter
+from typing import Any, Dict, List, NamedTuple, Tuple
+
+import numpy as np
+
+from ..core import metrics
+from ..db.mongo import get_db
+from . import semantic_cache
+
+K1 = 1.2
+B = 0.75
+RRF_K = 60
+
+_META_FIELDS = ("text", "chapter", "subject", "class_no", "page", "source_pdf")
+_TOKEN = re.compile(r"[^\W_]+", re.UNICODE)
+
+# function words plus question words ("define conduction" -> "conduction")
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have how i in is it its of on or so that the their them then there these
+they this to was were what when where which who whom why will with you your do does did can could should would
+define definition explain describe meaning mean tell me give name list state write about
+""".split())
+
+PartitionKey = Tuple[int, str]
+
+
+def _stem(t: str) -> str:
+    for suffix in ("ing", "ed", "es", "s"):
+        if t.endswith(suffix) and len(t) - len(suffix) >= 3:
+            return t[: -len(suffix)]
+    return t
+
+def terms(text: str) -> List[str]:
+    return [_stem(t) for t in _TOKEN.findall(text.lower()) if t not in STOPWORDS]
+
+
+class Hits(NamedTuple):
+    hits: List[Dict[str, Any]]   # best first, each with "score"
+    terms: List[str]             # distinct query terms
+    covered: List[bool]          # per hit: contains every query term
+
+    def confident(self, k: int, max_terms: int) -> bool:
+        """Short keyword query whose top-k hits all contain every query term."""
+        return (0 < len(self.terms) <= max_terms and len(self.hits) >= k
+                and all(self.covered[:k]))
+
+
+class _Partition:
+    def __init__(self, meta: List[Dict[str, Any]], docs_terms: List[List[str]], version: int):
+        self.meta = meta
+        self.version = version
+        n = len(docs_terms)
+        lengths = np.array([len(t) for t in docs_terms], dtype=np.float32)
+        avgdl = float(lengths.mean()) if n else 0.0
+        postings: Dict[str, Tuple[List[int], List[int]]] = {}
+        for i, toks in enumerate(docs_terms):
+            for t, tf in Counter(toks).items():
+                ids, tfs = postings.setdefault(t, ([], []))
+                ids.append(i)
+                tfs.append(tf)
+        # term -> (doc rows, idf * saturated tf)
+        self.index: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        for t, (ids, tfs) in postings.items():
+            rows = np.array(ids, dtype=np.int32)
+            tf = np.array(tfs, dtype=np.float32)
+            idf = math.log(1.0 + (n - len(ids) + 0.5) / (len(ids) + 0.5))
+            norm = K1 * (1.0 - B + B * lengths[rows] / (avgdl or 1.0))
+            self.index[t] = (rows, (idf * tf * (K1 + 1.0) / (tf + norm)).astype(np.float32))
+
+    def search(self, query: str, k: int) -> Hits:
+        q = list(dict.fromkeys(terms(query)))
+        n = len(self.meta)
+        if not q or not n:
+            return Hits([], q, [])
+        scores = np.zeros(n, dtype=np.float32)
+        matched = np.zeros(n, dtype=np.int32)
+        for t in q:
+            posting = self.index.get(t)
+            if posting is None:
+                continue
+            rows, weights = posting
+            scores[rows] += weights
+            matched[rows] += 1
+        hit_rows = np.flatnonzero(scores)
+        if hit_rows.size > k:
+            hit_rows = hit_rows[np.argpartition(-scores[hit_rows], k - 1)[:k]]
+        hit_rows = hit_rows[np.argsort(-scores[hit_rows], kind="stable")]
+        return Hits([{**self.meta[i], "score": float(scores[i])} for i in hit_rows], q,
+                    [bool(matched[i] == len(q)) for i in hit_rows])
+
+
+_partitions: Dict[PartitionKey, _Partition] = {}
+_locks: Dict[PartitionKey, asyncio.Lock] = {}
+
+
+async def _build(key: PartitionKey, version: int) -> _Partition:
+    class_no, subject = key
+    db = await get_db()
+    meta = [
+        {f: doc.get(f) for f in _META_FIELDS}
+        async for doc in db.cbse_docs.find({"class_no": class_no, "subject": subject}, {f: 1 for f in _META_FIELDS})
+        if doc.get("text")
+    ]
+    t0 = time.perf_counter()
+    part = await asyncio.to_thread(lambda: _Partition(meta, [terms(m["text"]) for m in meta], version))
+    metrics.incr("bm25.builds")
+    print(f"[bm25] built {class_no}/{subject}: {len(meta)} chunks, {len(part.index)} terms "
+          f"in {(time.perf_counter() - t0) * 1000:.0f} ms")
+    return part
+
+async def get_partition(class_no: int, subject: str) -> _Partition:
+    """Current partition for the slice, (re)built when its cbse_docs version moved."""
+    key = (class_no, subject)
+    version = await semantic_cache.docs_version(class_no, subject)
+    part = _partitions.get(key)
+    if part is not None and part.version == version:
+        return part
+    async with _locks.setdefault(key, asyncio.Lock()):
+        part = _partitions.get(key)
+        if part is None or part.version != version:
+            part = _partitions[key] = await _build(key, version)
+        return part
+
+async def search(query: str, class_no: int, subject: str, k: int = 4) -> Hits:
+    part = await get_partition(class_no, subject)
+    return part.search(query, k)
+
+
+# ----------------------------
+# Fusion
+# ----------------------------
+
+def _doc_key(d: Dict[str, Any]) -> Tuple[Any, ...]:
+    return (d.get("chapter"), d.get("page"), d.get("text"))
+
+def rrf(rankings: List[List[Dict[str, Any]]], k: int) -> List[Dict[str, Any]]:
+    """Reciprocal rank fusion: score = sum over rankings of 1 / (RRF_K + rank)."""
+    fused: Dict[Tuple[Any, ...], float] = {}
+    docs: Dict[Tuple[Any, ...], Dict[str, Any]] = {}
+    for ranking in rankings:
+        for rank, d in enumerate(ranking, start=1):
+            key = _doc_key(d)
+            fused[key] = fused.get(key, 0.0) + 1.0 / (RRF_K + rank)
+            docs.setdefault(key, d)
+    best = sorted(fused, key=fused.get, reverse=True)[:k]
+    return [{**docs[key], "score": fused[key]} for key in best]
+
+def stats() -> Dict[str, Any]:
+    return {
+        "partitions": len(_partitions),
+        "chunks": sum(len(p.meta) for p in _partitions.values()),
+        "fast_path_ratio": metrics.hit_ratio("retrieval", hits=("fast_path",), misses=("hybrid",)),
+    }
@@ -1,8 +1,12 @@
 # run this as a one-off script in your repo
 # pip install pymupdf  (if not installed)
 
-import re, fitz, asyncio
-from app.services.rag import upsert_cbse_doc  # uses cosmosSearch + Azure/OpenAI
+import re, fitz, asyncio, hashlib, time
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from app.db.mongo import get_db
+from app.services import semantic_cache
+from app.services.rag import upsert_cbse_docs  # uses cosmosSearch + Azure/OpenAI
 PDF_PATH   = "app/services/gecu107-chapter7heat.pdf"  # if PDF is in app/services
 SUBJECT    = "Physics"
 CLASS_NO   = 7
@@ -11,6 +15,12 @@ CHAPTER    = "Heat"
 MAX_CHARS  = 2000   # ~800–1200 tokens depending on text
 OVERLAP    = 180    # ~150–200 tokens overlap
 
+# Embedding batches: bounded by an approximate token budget and an item cap,
+# with a few batches in flight at once.
+BATCH_TOKENS      = 8000
+BATCH_MAX_ITEMS   = 64
+EMBED_CONCURRENCY = 4
+
 def normalize(text: str) -> str:
     return re.sub(r"\s+", " ", text).strip()
 
@@ -48,20 +58,147 @@ def extract_pages(pdf_path: str, start=1, end=None):
         text = doc[pno].get_text("text")
         yield pno+1, normalize(text)
 
-async def ingest_pdf(pdf_path: str, subject: str, class_no: int, chapter: str, start=1, end=None):
-    inserted = 0
+def estimate_tokens(text: str) -> int:
+    # ~4 chars per token for English prose; good enough for batch sizing
+    return max(1, len(text) // 4)
+
+def iter_chunks(pdf_path: str, start=1, end=None, skip_pages: Iterable[int] = (),
+                on_empty: Optional[Callable[[int], None]] = None) -> Iterator[Tuple[int, str]]:
+    """
+    Stream (page_no, chunk) pairs page by page, skipping already-ingested pages.
+    Pages that produce no chunks are reported to `on_empty` so they can be checkpointed.
+    """
+    skip = set(skip_pages)
     for page_no, page_text in extract_pages(pdf_path, start, end):
-        for ch in chunk_text(page_text):
-            _id = await upsert_cbse_doc(
-                chapter=chapter,
-                subject=subject,
-                class_no=class_no,
-                text=ch,
-                source_pdf=pdf_path,
-                page=page_no
+        if page_no in skip:
+            continue
+        chunks = chunk_text(page_text)
+        if not chunks and on_empty is not None:
+            on_empty(page_no)
+        for ch in chunks:
+            yield page_no, ch
+
+def batch_chunks(chunks: Iterable[Tuple[int, str]], max_tokens=BATCH_TOKENS,
+                 max_items=BATCH_MAX_ITEMS) -> Iterator[List[Tuple[int, str]]]:
+    """Group chunks into embedding batches under a token budget and item cap."""
+    batch, tokens = [], 0
+    for page_no, ch in chunks:
+        t = estimate_tokens(ch)
+        if batch and (tokens + t > max_tokens or len(batch) >= max_items):
+            yield batch
+            batch, tokens = [], 0
+        batch.append((page_no, ch)); tokens += t
+    if batch:
+        yield batch
+
+# ----------------------------
+# Resumable checkpoints
+# ----------------------------
+
+def _checkpoint_id(pdf_path: str, subject: str, class_no: int, chapter: str) -> str:
+    key = f"{subject}|{class_no}|{chapter}|{pdf_path.split('/')[-1]}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+class _PageTracker:
+    """
+    Counts outstanding chunks per page. A page is complete once it has been
+    sealed (the stream moved past it) and all of its chunks have been written.
+    """
+    def __init__(self):
+        self.pending: Dict[int, int] = {}
+        self.sealed: set[int] = set()
+
+    def add(self, page_no: int):
+        self.pending[page_no] = self.pending.get(page_no, 0) + 1
+
+    def seal(self, page_no: int) -> bool:
+        self.sealed.add(page_no)
+        return self.pending.get(page_no, 0) == 0
+
+    def done(self, page_no: int) -> bool:
+        self.pending[page_no] -= 1
+        return self.pending[page_no] == 0 and page_no in self.sealed
+
+async def ingest_pdf(pdf_path: str, subject: str, class_no: int, chapter: str, start=1, end=None,
+                     *, resume: bool = True, concurrency: int = EMBED_CONCURRENCY,
+                     max_tokens: int = BATCH_TOKENS, max_items: int = BATCH_MAX_ITEMS) -> Dict[str, float]:
+    """
+    Stream pages, embed chunks in token-budgeted batches with up to `concurrency`
+    batches in flight, and bulk-upsert each batch. Completed pages are recorded in
+    `ingest_checkpoints` so an interrupted run resumes where it stopped. The
+    slice's cbse_docs version is bumped once, when the run ends.
+    """
+    db = await get_db()
+    ckpt_id = _checkpoint_id(pdf_path, subject, class_no, chapter)
+    done_pages: List[int] = []
+    if resume:
+        ckpt = await db.ingest_checkpoints.find_one({"_id": ckpt_id})
+        done_pages = ckpt.get("done_pages", []) if ckpt else []
+        if done_pages:
+            print(f"Resuming: {len(done_pages)} pages already ingested.")
+    else:
+        await db.ingest_checkpoints.delete_one({"_id": ckpt_id})
+
+    async def mark_done(pages: List[int]):
+        if pages:
+            await db.ingest_checkpoints.update_one(
+                {"_id": ckpt_id},
+                {"$addToSet": {"done_pages": {"$each": pages}},
+                 "$set": {"source_pdf": pdf_path, "subject": subject, "class_no": class_no,
+                          "chapter": chapter, "updated_at": datetime.now(timezone.utc)}},
+                upsert=True,
             )
-            inserted += 1
-    print(f"Ingested {inserted} chunks.")
+
+    tracker = _PageTracker()
+    sem = asyncio.Semaphore(concurrency)
+    tasks: List[asyncio.Task] = []
+    inserted = 0
+
+    async def run_batch(batch: List[Tuple[int, str]]):
+        nonlocal inserted
+        try:
+            await upsert_cbse_docs([
+                {"chapter": chapter, "subject": subject, "class_no": class_no,
+                 "text": ch, "source_pdf": pdf_path, "page": page_no}
+                for page_no, ch in batch
+            ], bump=False)
+            inserted += len(batch)
+            await mark_done([p for p, _ in batch if tracker.done(p)])
+        finally:
+            sem.release()
+
+    def tracked(chunks: Iterator[Tuple[int, str]]) -> Iterator[Tuple[int, str]]:
+        last = None
+        for page_no, ch in chunks:
+            if last is not None and page_no != last and tracker.seal(last):
+                sealed.append(last)
+            last = page_no
+            tracker.add(page_no)
+            yield page_no, ch
+        if last is not None and tracker.seal(last):
+            sealed.append(last)
+
+    sealed: List[int] = []  # pages complete without waiting on a batch (incl. pages with no chunks)
+    t0 = time.perf_counter()
+    chunks = iter_chunks(pdf_path, start, end, done_pages, on_empty=sealed.append)
+    try:
+        for batch in batch_chunks(tracked(chunks), max_tokens, max_items):
+            await sem.acquire()  # backpressure: never more than `concurrency` batches queued
+            tasks.append(asyncio.create_task(run_batch(batch)))
+            if sealed:
+                pages = sealed[:]; sealed.clear()  # on_empty holds this list; don't rebind it
+                await mark_done(pages)
+        await asyncio.gather(*tasks)
+        await mark_done(sealed)
+    finally:
+        if tasks:
+            # one version bump per run, not per batch: readers rebuild BM25 / drop cached answers once
+            await semantic_cache.bump_version(class_no, subject)
+
+    elapsed = time.perf_counter() - t0
+    rate = inserted / elapsed if elapsed > 0 else 0.0
+    print(f"Ingested {inserted} chunks in {elapsed:.1f}s ({rate:.1f} chunks/sec).")
+    return {"chunks": inserted, "seconds": elapsed, "chunks_per_sec": rate}
 
 if __name__ == "__main__":
     asyncio.run(ingest_pdf(PDF_PATH, SUBJECT, CLASS_NO, CHAPTER, start=1, end=16))
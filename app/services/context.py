@@ -0,0 +1,198 @@
+"""
+Token-budgeted prompt context.
+
+Token counts come from `tiktoken` when it is installed (the encoding of the
+chat deployment, o200k_base/cl100k_base as fallbacks) and otherwise from a
+conservative bytes/4 estimate, so budgets hold without the package.
+
+- split / truncate: cut text into pieces under a token budget, on sentence
+  boundaries where possible (used for map-reduce summaries of long transcripts).
+- passages: dedupe retrieved chunks (exact and near-duplicate), rank them by
+  query-term coverage with retrieval order as the tie-break, and pack as many
+  as fit into a budget as compact numbered citations "[n] chapter, p.N: text".
+- fit: measure a prompt, record prompt.<name>.tokens / .requests, and trim the
+  last message so the prompt never exceeds PROMPT_MAX_TOKENS.
+"""
+from __future__ import annotations
+
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..core import metrics
+from ..core.config import settings
+
+try:
+    import tiktoken
+except ImportError:  # optional; counts fall back to a byte estimate
+    tiktoken = None
+
+MESSAGE_OVERHEAD = 4   # role/separator tokens per chat message
+NEAR_DUP_JACCARD = 0.8
+_SHINGLE = 5
+
+_SENTENCE = re.compile(r"(?<=[.!?।])\s+")
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+_enc: Any = None
+_enc_loaded = False
+
+
+# ----------------------------
+# Tokenizer
+# ----------------------------
+
+def _encoding():
+    global _enc, _enc_loaded
+    if not _enc_loaded:
+        _enc_loaded = True
+        if tiktoken is not None:
+            for get in (lambda: tiktoken.encoding_for_model(settings.AZURE_OPENAI_CHAT_DEPLOYMENT),
+                        lambda: tiktoken.get_encoding("o200k_base"),
+                        lambda: tiktoken.get_encoding("cl100k_base")):
+                try:
+                    _enc = get()
+                    break
+                except Exception:  # unknown model name, or encoding files unavailable offline
+                    continue
+            if _enc is None:
+                print("[context] tiktoken encodings unavailable; using byte estimate")
+    return _enc
+
+def tokenizer_name() -> str:
+    enc = _encoding()
+    return enc.name if enc is not None else "bytes/4"
+
+def count(text: str) -> int:
+    if not text:
+        return 0
+    enc = _encoding()
+    if enc is not None:
+        return len(enc.encode(text, disallowed_special=()))
+    return (len(text.encode("utf-8")) + 3) // 4
+
+def count_messages(messages: List[Dict[str, Any]]) -> int:
+    return sum(count(m.get("content") or "") + MESSAGE_OVERHEAD for m in messages) + 2
+
+def truncate(text: str, max_tokens: int) -> str:
+    if max_tokens <= 0:
+        return ""
+    if count(text) <= max_tokens:
+        return text
+    enc = _encoding()
+    if enc is not None:
+        return enc.decode(enc.encode(text, disallowed_special=())[:max_tokens])
+    cut = text.encode("utf-8")[:max_tokens * 4].decode("utf-8", "ignore")
+    return cut.rsplit(" ", 1)[0] if " " in cut else cut
+
+
+# ----------------------------
+# Splitting
+# ----------------------------
+
+def split(text: str, max_tokens: int) -> List[str]:
+    """Consecutive pieces of `text`, each within `max_tokens`, broken between sentences."""
+    units: List[str] = []
+    for sentence in _SENTENCE.split(" ".join(text.split())):
+        if count(sentence) + 1 > max_tokens:
+            units.extend(sentence.split())  # a run-on "sentence" (transcripts often lack punctuation)
+        else:
+            units.append(sentence)
+
+    pieces: List[str] = []
+    buf: List[str] = []
+    used = 0
+    for u in units:
+        n = count(u) + 1
+        if used + n > max_tokens and buf:
+            pieces.append(" ".join(buf))
+            buf, used = [], 0
+        buf.append(u)
+        used += n
+    if buf:
+        pieces.append(" ".join(buf))
+    return [p for p in pieces if p]
+
+
+# ----------------------------
+# Retrieved passages
+# ----------------------------
+
+def _words(text: str) -> List[str]:
+    return _WORD.findall(text.lower())
+
+def _shingles(words: List[str]) -> set:
+    if len(words) < _SHINGLE:
+        return {tuple(words)}
+    return {tuple(words[i:i + _SHINGLE]) for i in range(len(words) - _SHINGLE + 1)}
+
+def _label(chunk: Dict[str, Any]) -> str:
+    parts = [str(chunk["chapter"])] if chunk.get("chapter") else []
+    if chunk.get("page") is not None:
+        parts.append(f"p.{chunk['page']}")
+    return ", ".join(parts)
+
+def passages(chunks: List[Dict[str, Any]], query: str, max_tokens: int) -> Tuple[str, List[Dict[str, Any]]]:
+    """
+    Numbered context block for retrieved `chunks` (in retrieval order) and the
+    chunks it cites, in citation order. Duplicates are dropped, the rest ranked
+    by how many query terms they cover and packed until `max_tokens` is used.
+    """
+    kept: List[Tuple[float, int, Dict[str, Any], str]] = []
+    seen: List[set] = []
+    q_terms = set(_words(query))
+    for rank, c in enumerate(chunks):
+        text = " ".join((c.get("text") or "").split())
+        words = _words(text)
+        if not words:
+            continue
+        sh = _shingles(words)
+        if any(len(sh & s) / len(sh | s) >= NEAR_DUP_JACCARD for s in seen):
+            metrics.incr("context.passages_deduped")
+            continue
+        seen.append(sh)
+        coverage = len(q_terms & set(words)) / len(q_terms) if q_terms else 0.0
+        kept.append((coverage, rank, c, text))
+    kept.sort(key=lambda x: (-x[0], x[1]))
+
+    lines: List[str] = []
+    cited: List[Dict[str, Any]] = []
+    used = 0
+    for _, _, c, text in kept:
+        n = len(cited) + 1
+        label = _label(c)
+        head = f"[{n}] {label}: " if label else f"[{n}] "
+        cost = count(head + text) + 1
+        if used + cost > max_tokens:
+            room = max_tokens - used - count(head) - 1
+            if cited or room < 32:
+                continue  # keep passages whole once one is in; a shorter one may still fit
+            text = truncate(text, room)
+            cost = max_tokens - used
+        lines.append(head + text)
+        cited.append(c)
+        used += cost
+    metrics.incr("context.passages_dropped", len(kept) - len(cited))
+    return "\n".join(lines), cited
+
+
+# ----------------------------
+# Prompt budget
+# ----------------------------
+
+def fit(name: str, messages: List[Dict[str, Any]], max_tokens: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Record the prompt size under `name` and trim the last message to keep it within budget."""
+    budget = max_tokens or settings.PROMPT_MAX_TOKENS
+    total = count_messages(messages)
+    if total > budget:
+        last = messages[-1]
+        keep = count(last["content"]) - (total - budget)
+        messages = messages[:-1] + [{**last, "content": truncate(last["content"], keep)}]
+        metrics.incr(f"prompt.{name}.truncated")
+        print(f"[context] {name} prompt trimmed from {total} to {budget} tokens")
+        total = count_messages(messages)
+    metrics.incr(f"prompt.{name}.requests")
+    metrics.incr(f"prompt.{name}.tokens", total)
+    return messages
+
+def stats() -> Dict[str, Any]:
+    return {"tokenizer": tokenizer_name(), "prompt_max_tokens": settings.PROMPT_MAX_TOKENS}
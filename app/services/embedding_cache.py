@@ -0,0 +1,98 @@
+"""
+Content-addressed embedding cache.
+
+Keys are sha256(model + normalized text). Lookups go to an in-process LRU first,
+then to the `embedding_cache` Mongo collection (TTL-evicted on `created_at`);
+only texts missing from both are sent to the embedding endpoint.
+"""
+from __future__ import annotations
+
+import hashlib
+import re
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import numpy as np
+from pymongo import UpdateOne
+
+from ..core import metrics
+from ..core.config import settings
+from ..db.mongo import get_db
+
+EmbedFn = Callable[[List[str]], Awaitable[List[List[float]]]]
+
+_lru: "OrderedDict[str, np.ndarray]" = OrderedDict()
+
+
+def normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+def cache_key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\x00{normalize(text)}".encode("utf-8")).hexdigest()
+
+def _lru_get(key: str) -> Optional[np.ndarray]:
+    vec = _lru.get(key)
+    if vec is not None:
+        _lru.move_to_end(key)
+    return vec
+
+def _lru_put(key: str, vec: np.ndarray) -> None:
+    _lru[key] = vec
+    _lru.move_to_end(key)
+    while len(_lru) > settings.EMBED_CACHE_MAX_ITEMS:
+        _lru.popitem(last=False)
+
+async def embed_cached(texts: List[str], model: str, embed_fn: EmbedFn) -> List[List[float]]:
+    """Return embeddings for `texts` (input order), calling `embed_fn` only for cache misses."""
+    if not texts:
+        return []
+    keys = [cache_key(model, t) for t in texts]
+    found: Dict[str, np.ndarray] = {}
+
+    for k in set(keys):
+        vec = _lru_get(k)
+        if vec is not None:
+            found[k] = vec
+    lru_hits = sum(1 for k in keys if k in found)
+    metrics.incr("embed_cache.lru_hits", lru_hits)
+
+    db = await get_db()
+    pending = list({k for k in keys if k not in found})
+    if pending:
+        async for doc in db.embedding_cache.find({"_id": {"$in": pending}}, {"embedding": 1}):
+            vec = np.asarray(doc["embedding"], dtype=np.float32)
+            found[doc["_id"]] = vec
+            _lru_put(doc["_id"], vec)
+        metrics.incr("embed_cache.store_hits", sum(1 for k in keys if k in found) - lru_hits)
+
+    # Unique misses, keeping the first text seen for each key
+    missing: Dict[str, str] = {}
+    for k, t in zip(keys, texts):
+        if k not in found and k not in missing:
+            missing[k] = t
+    metrics.incr("embed_cache.misses", sum(1 for k in keys if k not in found))
+
+    if missing:
+        vecs = await embed_fn(list(missing.values()))
+        now = datetime.now(timezone.utc)
+        ops = []
+        for k, vec in zip(missing.keys(), vecs):
+            arr = np.asarray(vec, dtype=np.float32)
+            found[k] = arr
+            _lru_put(k, arr)
+            ops.append(UpdateOne(
+                {"_id": k},
+                {"$setOnInsert": {"model": model, "embedding": vec, "created_at": now}},
+                upsert=True,
+            ))
+        await db.embedding_cache.bulk_write(ops, ordered=False)
+
+    return [found[k].tolist() for k in keys]
+
+def stats() -> Dict[str, float | None]:
+    return {
+        "lru_size": len(_lru),
+        "hit_ratio": metrics.hit_ratio("embed_cache", hits=("lru_hits", "store_hits")),
+    }
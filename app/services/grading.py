@@ -0,0 +1,134 @@
+"""
+Compiled quiz answer keys.
+
+A quiz is compiled once into per-question bitmasks over its option keys (bit i
+= the question's i-th option) and kept in an LRU keyed by quiz id. Grading a
+submission is then one dict lookup and a few integer ops per question, and a
+whole class can be graded as numpy arrays. Selections are compared as sets, so
+option order and duplicates don't matter. Keys a question doesn't offer count
+as wrong options.
+
+Policies (quiz "scoring_policy" field, else QUIZ_SCORING_POLICY):
+  exact   - a question scores 1 only if the selected set equals the correct set
+  any     - 1 if at least one correct option and no wrong option is selected
+  partial - (correct selected - wrong selected) / number correct, floored at 0
+"""
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, NamedTuple
+
+import numpy as np
+
+from ..core.config import settings
+
+POLICIES = ("exact", "any", "partial")
+_UNKNOWN = 1 << 62  # a selected key the question doesn't offer
+
+
+class Grade(NamedTuple):
+    correct_count: int   # questions with full credit
+    points: float        # sum of per-question credit
+    score: float         # percentage 0..100
+
+
+class AnswerKey:
+    __slots__ = ("quiz_id", "qids", "bits", "masks", "n_correct", "correct_answers")
+
+    def __init__(self, quiz: Dict[str, Any]):
+        questions = quiz.get("questions", [])
+        self.quiz_id = str(quiz.get("_id", ""))
+        self.qids: List[str] = [q["qid"] for q in questions]
+        self.bits: List[Dict[str, int]] = [
+            {o["key"]: 1 << i for i, o in enumerate(q.get("options", []))} for q in questions
+        ]
+        self.masks = np.array([self.mask(i, q.get("correct", [])) for i, q in enumerate(questions)], dtype=np.int64)
+        self.n_correct = _popcount(self.masks)
+        self.correct_answers: Dict[str, List[str]] = {q["qid"]: list(q.get("correct", [])) for q in questions}
+
+    def mask(self, col: int, chosen: Iterable[str]) -> int:
+        bits = self.bits[col]
+        m = 0
+        for k in chosen:
+            m |= bits.get(k, _UNKNOWN)
+        return m
+
+    def selections(self, responses: Dict[str, List[str]]) -> np.ndarray:
+        return np.array([self.mask(i, responses.get(qid, ())) for i, qid in enumerate(self.qids)], dtype=np.int64)
+
+
+def _popcount(x: np.ndarray) -> np.ndarray:
+    """Vectorized popcount for non-negative int64 (numpy<2 has no bitwise_count)."""
+    x = x.astype(np.uint64)
+    x = x - ((x >> np.uint64(1)) & np.uint64(0x5555555555555555))
+    x = (x & np.uint64(0x3333333333333333)) + ((x >> np.uint64(2)) & np.uint64(0x3333333333333333))
+    x = (x + (x >> np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    return ((x * np.uint64(0x0101010101010101)) >> np.uint64(56)).astype(np.int64)
+
+def _credit(key: AnswerKey, picked: np.ndarray, policy: str) -> np.ndarray:
+    """Per-question credit in [0, 1]; `picked` is (..., n_questions)."""
+    hit = _popcount(picked & key.masks)
+    wrong = _popcount(picked & ~key.masks)
+    valid = key.n_correct > 0  # a question without a key never scores
+    if policy == "exact":
+        return ((picked == key.masks) & valid).astype(np.float64)
+    if policy == "any":
+        return ((hit > 0) & (wrong == 0) & valid).astype(np.float64)
+    if policy == "partial":
+        return np.where(valid, np.clip((hit - wrong) / np.maximum(key.n_correct, 1), 0.0, 1.0), 0.0)
+    raise ValueError(f"Unknown scoring policy: {policy}")
+
+
+# ----------------------------
+# Compiled key cache
+# ----------------------------
+
+_keys: "OrderedDict[str, AnswerKey]" = OrderedDict()
+
+def answer_key(quiz: Dict[str, Any]) -> AnswerKey:
+    """Compiled key for a quiz document, built on first use and cached by quiz id."""
+    quiz_id = str(quiz.get("_id", ""))
+    key = _keys.get(quiz_id) if quiz_id else None
+    if key is None:
+        key = AnswerKey(quiz)
+        if quiz_id:
+            _keys[quiz_id] = key
+            while len(_keys) > settings.GRADING_CACHE_MAX_QUIZZES:
+                _keys.popitem(last=False)
+    else:
+        _keys.move_to_end(quiz_id)
+    return key
+
+def invalidate(quiz_id: str) -> None:
+    _keys.pop(str(quiz_id), None)
+
+def policy_for(quiz: Dict[str, Any]) -> str:
+    policy = quiz.get("scoring_policy") or settings.QUIZ_SCORING_POLICY
+    return policy if policy in POLICIES else "exact"
+
+
+# ----------------------------
+# Grading
+# ----------------------------
+
+def grade(quiz: Dict[str, Any], responses: Dict[str, List[str]], policy: str | None = None) -> Grade:
+    key = answer_key(quiz)
+    n = len(key.qids)
+    if not n:
+        return Grade(0, 0.0, 0.0)
+    credit = _credit(key, key.selections(responses), policy or policy_for(quiz))
+    points = float(credit.sum())
+    return Grade(int((credit == 1.0).sum()), points, points * 100.0 / n)
+
+def grade_many(quiz: Dict[str, Any], all_responses: List[Dict[str, List[str]]],
+               policy: str | None = None) -> List[Grade]:
+    """Grade many submissions of the same quiz in one vectorized pass."""
+    key = answer_key(quiz)
+    n = len(key.qids)
+    if not n:
+        return [Grade(0, 0.0, 0.0) for _ in all_responses]
+    picked = np.array([key.selections(r) for r in all_responses], dtype=np.int64).reshape(len(all_responses), n)
+    credit = _credit(key, picked, policy or policy_for(quiz))
+    points = credit.sum(axis=1)
+    full = (credit == 1.0).sum(axis=1)
+    return [Grade(int(c), float(p), float(p) * 100.0 / n) for c, p in zip(full, points)]
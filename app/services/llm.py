@@ -0,0 +1,152 @@
+"""
+Shared async gateway for Azure OpenAI.
+
+Every model call from an async handler goes through here so the event loop is
+never blocked on a model round-trip. One pooled httpx.AsyncClient backs a single
+AsyncAzureOpenAI client; each deployment gets its own concurrency limit, and
+transient failures (timeouts, 429s, 5xx) are retried with exponential backoff.
+"""
+from __future__ import annotations
+
+import asyncio
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import httpx
+from openai import (
+    AsyncAzureOpenAI,
+    APIConnectionError,
+    APITimeoutError,
+    InternalServerError,
+    RateLimitError,
+)
+from tenacity import (
+    AsyncRetrying,
+    retry_if_exception_type,
+    stop_after_attempt,
+    wait_exponential_jitter,
+)
+
+from ..core.config import settings
+
+_RETRYABLE = (APIConnectionError, APITimeoutError, RateLimitError, InternalServerError)
+
+_http: httpx.AsyncClient | None = None
+_client: AsyncAzureOpenAI | None = None
+_limits: Dict[str, asyncio.Semaphore] = {}
+
+
+# ----------------------------
+# Client / pool
+# ----------------------------
+
+def get_async_client() -> AsyncAzureOpenAI:
+    global _http, _client
+    if _client is None:
+        _http = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.LLM_MAX_CONNECTIONS,
+            ),
+            timeout=httpx.Timeout(settings.LLM_TIMEOUT_SECONDS, connect=10.0),
+        )
+        _client = AsyncAzureOpenAI(
+            api_key=settings.AZURE_OPENAI_API_KEY,
+            azure_endpoint=settings.AZURE_OPENAI_ENDPOINT,
+            api_version=settings.AZURE_OPENAI_API_VERSION,
+            http_client=_http,
+            max_retries=0,  # retries are handled below, outside the semaphore
+        )
+    return _client
+
+async def aclose() -> None:
+    """Release pooled connections (called on app shutdown)."""
+    global _http, _client
+    if _client is not None:
+        await _client.close()
+    _http = None
+    _client = None
+
+def _limit(deployment: str) -> asyncio.Semaphore:
+    sem = _limits.get(deployment)
+    if sem is None:
+        sem = _limits[deployment] = asyncio.Semaphore(settings.LLM_MAX_CONCURRENCY)
+    return sem
+
+async def _call(deployment: str, fn, **kwargs):
+    """Run one SDK call under the deployment's limit, retrying transient errors."""
+    async for attempt in AsyncRetrying(
+        retry=retry_if_exception_type(_RETRYABLE),
+        stop=stop_after_attempt(settings.LLM_MAX_RETRIES + 1),
+        wait=wait_exponential_jitter(initial=0.5, max=8.0),
+        reraise=True,
+    ):
+        with attempt:
+            async with _limit(deployment):
+                return await fn(model=deployment, **kwargs)
+
+
+# ----------------------------
+# Public helpers
+# ----------------------------
+
+async def chat_completion(messages: List[Dict[str, Any]], deployment: str | None = None, **kwargs):
+    """Return the raw ChatCompletion for `messages`."""
+    deployment = deployment or settings.AZURE_OPENAI_CHAT_DEPLOYMENT
+    client = get_async_client()
+    return await _call(deployment, client.chat.completions.create, messages=messages, **kwargs)
+
+async def chat_text(messages: List[Dict[str, Any]], deployment: str | None = None, **kwargs) -> str:
+    """Convenience wrapper returning the stripped text of the first choice."""
+    resp = await chat_completion(messages, deployment=deployment, **kwargs)
+    return (resp.choices[0].message.content or "").strip()
+
+async def chat_stream(messages: List[Dict[str, Any]], deployment: str | None = None,
+                      usage: Optional[Dict[str, Any]] = None, **kwargs) -> AsyncIterator[str]:
+    """
+    Yield content deltas as they arrive. Only opening the stream is retried. The
+    deployment's concurrency slot is held until the stream ends, and the upstream
+    request is closed as soon as the consumer stops iterating (e.g. on client
+    disconnect). Token usage, when the service reports it, is copied into `usage`.
+    """
+    deployment = deployment or settings.AZURE_OPENAI_CHAT_DEPLOYMENT
+    client = get_async_client()
+    sem = _limit(deployment)
+    async for attempt in AsyncRetrying(
+        retry=retry_if_exception_type(_RETRYABLE),
+        stop=stop_after_attempt(settings.LLM_MAX_RETRIES + 1),
+        wait=wait_exponential_jitter(initial=0.5, max=8.0),
+        reraise=True,
+    ):
+        with attempt:
+            # the slot is taken per attempt, so backoff sleeps don't hold it
+            await sem.acquire()
+            try:
+                stream = await client.chat.completions.create(
+                    model=deployment, messages=messages, stream=True,
+                    stream_options={"include_usage": True}, **kwargs,
+                )
+            except BaseException:
+                sem.release()
+                raise
+    try:
+        async for chunk in stream:
+            if chunk.usage is not None and usage is not None:
+                usage.update(chunk.usage.model_dump())
+            if chunk.choices:
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    yield delta
+    finally:
+        try:
+            await stream.close()
+        finally:
+            sem.release()
+
+async def embeddings(texts: List[str], deployment: str | None = None) -> List[List[float]]:
+    """Embed `texts`, preserving input order."""
+    if not texts:
+        return []
+    deployment = deployment or settings.AZURE_OPENAI_EMBEDDING_DEPLOYMENT
+    client = get_async_client()
+    resp = await _call(deployment, client.embeddings.create, input=texts)
+    return [d.embedding for d in sorted(resp.data, key=lambda d: d.index)]
@@ -0,0 +1,170 @@
+"""
+Atomic student progress updates.
+
+Every change to a `student_progress` document goes through `update_progress`:
+one find_one_and_update with an aggregation-pipeline update that seeds a new
+document, applies the activity, recomputes completion on the server and returns
+the result. Concurrent requests for the same (student_id, daily_id) therefore
+can't overwrite each other's flags or scores.
+
+Quiz batches use the same pipeline for every student in one bulk_write (see
+`apply_quiz_batch`); each update leaves a marker with the batch's first attempt
+number, so the batch can read its results back without racing later submits.
+
+Completion: summary 25% + story 25% + quiz best score scaled to 50%;
+completed at >= 75%. Each update also refreshes the daily rollups (see rollups.py).
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+
+from ..core import metrics
+
+from . import rollups
+
+SUMMARY_WEIGHT = 25.0
+STORY_WEIGHT = 25.0
+QUIZ_WEIGHT = 50.0
+COMPLETION_THRESHOLD = 75.0
+QUIZ_BATCH_MARKERS = 8  # recent batches remembered per progress document
+
+
+def now_iso() -> str:
+    return datetime.utcnow().isoformat() + "Z"
+
+def calculate_completion(progress_doc: dict) -> tuple[float, bool]:
+    """Calculate completion percentage and status based on activities (client-side mirror of the pipeline)."""
+    completion = 0.0
+    if progress_doc.get("summary_viewed"):
+        completion += SUMMARY_WEIGHT
+    if progress_doc.get("story_generated"):
+        completion += STORY_WEIGHT
+    if progress_doc.get("quiz_best_score") is not None:
+        completion += (progress_doc["quiz_best_score"] / 100.0) * QUIZ_WEIGHT
+    return completion, completion >= COMPLETION_THRESHOLD
+
+def _seed(daily_class: dict, tenant: str, now: str) -> Dict[str, Any]:
+    """Defaults for a brand-new progress document; existing values win."""
+    seed = {
+        "tenant": tenant,
+        "date": daily_class["date"],
+        "class_no": daily_class["class_no"],
+        "section": daily_class["section"],
+        "subject": daily_class["subject"],
+        "summary_viewed": False,
+        "story_generated": False,
+        "quiz_taken": False,
+        "quiz_attempts": 0,
+        "created_at": now,
+    }
+    return {k: {"$ifNull": [f"${k}", {"$literal": v}]} for k, v in seed.items()}
+
+def _quiz_fields(scores: List[float], quiz_id: str, now: str) -> Dict[str, Any]:
+    # Inside one $set stage, "$field" refers to the value before this update.
+    best = max(scores)
+    return {
+        "quiz_taken": True,
+        "quiz_id": {"$literal": quiz_id},
+        "quiz_attempts": {"$add": [{"$ifNull": ["$quiz_attempts", 0]}, len(scores)]},
+        "quiz_latest_score": {"$literal": scores[-1]},
+        "quiz_best_score": {"$max": [{"$ifNull": ["$quiz_best_score", best]}, best]},
+        "quiz_first_attempt_at": {"$ifNull": ["$quiz_first_attempt_at", {"$literal": now}]},
+        "quiz_last_attempt_at": {"$literal": now},
+    }
+
+def _batch_marker(batch_id: str) -> Dict[str, Any]:
+    # (batch id, first attempt number of the batch), newest last, capped at QUIZ_BATCH_MARKERS
+    marker = {"id": {"$literal": batch_id}, "first_attempt": {"$add": [{"$ifNull": ["$quiz_attempts", 0]}, 1]}}
+    return {"$slice": [{"$concatArrays": [{"$ifNull": ["$quiz_batches", []]}, [marker]]}, -QUIZ_BATCH_MARKERS]}
+
+def _completion_stages(now: str) -> List[Dict[str, Any]]:
+    return [
+        {"$set": {"completion_percentage": {"$add": [
+            {"$cond": [{"$eq": ["$summary_viewed", True]}, SUMMARY_WEIGHT, 0.0]},
+            {"$cond": [{"$eq": ["$story_generated", True]}, STORY_WEIGHT, 0.0]},
+            {"$multiply": [{"$divide": [{"$ifNull": ["$quiz_best_score", 0]}, 100.0]}, QUIZ_WEIGHT]},
+        ]}}},
+        {"$set": {
+            "is_completed": {"$gte": ["$completion_percentage", COMPLETION_THRESHOLD]},
+            "completed_at": {"$cond": [
+                {"$and": [
+                    {"$gte": ["$completion_percentage", COMPLETION_THRESHOLD]},
+                    {"$eq": [{"$ifNull": ["$completed_at", None]}, None]},
+                ]},
+                {"$literal": now},
+                "$completed_at",  # missing stays missing
+            ]},
+        }},
+    ]
+
+def progress_pipeline(*, daily_class: dict, tenant: str, set_fields: Optional[Dict[str, Any]] = None,
+                      quiz_score: Optional[float] = None, quiz_id: Optional[str] = None,
+                      now: Optional[str] = None, quiz_scores: Optional[List[float]] = None,
+                      batch_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """The update pipeline for one activity, or for several quiz attempts (`quiz_scores`, in order)."""
+    now = now or now_iso()
+    fields = _seed(daily_class, tenant, now)
+    fields.update({k: {"$literal": v} for k, v in (set_fields or {}).items()})
+    if quiz_score is not None:
+        quiz_scores = [*(quiz_scores or []), quiz_score]
+    if quiz_scores:
+        fields.update(_quiz_fields(quiz_scores, quiz_id, now))
+        if batch_id:
+            fields["quiz_batches"] = _batch_marker(batch_id)
+    fields["updated_at"] = {"$literal": now}
+    fields["rev"] = {"$add": [{"$ifNull": ["$rev", 0]}, 1]}  # orders snapshots for the rollups
+    return [{"$set": fields}, *_completion_stages(now)]
+
+async def apply_progress(db, *, student_id: str, daily_id: str, daily_class: dict, tenant: str,
+                         set_fields: Optional[Dict[str, Any]] = None, quiz_score: Optional[float] = None,
+                         quiz_id: Optional[str] = None, quiz_scores: Optional[List[float]] = None,
+                         now: Optional[str] = None) -> dict:
+    """Apply an activity to (student_id, daily_id) in one round-trip and return the updated document."""
+    return await db.student_progress.find_one_and_update(
+        {"student_id": student_id, "daily_id": daily_id},
+        progress_pipeline(daily_class=daily_class, tenant=tenant, set_fields=set_fields,
+                          quiz_score=quiz_score, quiz_id=quiz_id, quiz_scores=quiz_scores, now=now),
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+
+async def apply_quiz_batch(db, *, daily_id: str, daily_class: dict, tenant: str, quiz_id: str,
+                           scores_by_student: Dict[str, List[float]],
+                           now: Optional[str] = None) -> Dict[str, Tuple[dict, int]]:
+    """
+    Apply every student's attempts (in order) with one bulk_write, then read the
+    documents back in one query. Returns student_id -> (progress, first attempt
+    number of this batch); the progress may already include later updates.
+    """
+    batch_id = str(ObjectId())
+    ops = [
+        UpdateOne({"student_id": sid, "daily_id": daily_id},
+                  progress_pipeline(daily_class=daily_class, tenant=tenant, quiz_id=quiz_id,
+                                    quiz_scores=scores, now=now, batch_id=batch_id),
+                  upsert=True)
+        for sid, scores in scores_by_student.items()
+    ]
+    await db.student_progress.bulk_write(ops, ordered=False)
+    docs = await db.student_progress.find(
+        {"student_id": {"$in": list(scores_by_student)}, "daily_id": daily_id}
+    ).to_list(length=len(ops))
+
+    result = {}
+    for p in docs:
+        first = next((m["first_attempt"] for m in p.get("quiz_batches", []) if m["id"] == batch_id), None)
+        if first is None:  # more than QUIZ_BATCH_MARKERS quiz updates landed since ours
+            metrics.incr("progress.batch_marker_missed")
+            first = p["quiz_attempts"] - len(scores_by_student[p["student_id"]]) + 1
+        result[p["student_id"]] = (p, first)
+    return result
+
+async def update_progress(db, *, student_id: str, daily_id: str, daily_class: dict, tenant: str,
+                          set_fields: Optional[Dict[str, Any]] = None, quiz_score: Optional[float] = None,
+                          quiz_id: Optional[str] = None) -> dict:
+    """`apply_progress` plus the rollup refresh."""
+    progress = await apply_progress(db, student_id=student_id, daily_id=daily_id, daily_class=daily_class,
+                                    tenant=tenant, set_fields=set_fields, quiz_score=quiz_score, quiz_id=quiz_id)
+    await rollups.record(db, progress)
+    return progress
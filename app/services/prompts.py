@@ -0,0 +1,132 @@
+"""
+Prompt registry for stored generation artifacts.
+
+Every prompt whose output is persisted (class summaries, quizzes) is declared
+here by name. `sync` records each prompt in `prompt_versions`
+({_id: name, version, hash, history}) and bumps the version whenever the
+template text changes, so no one has to remember to bump a constant.
+
+Artifacts are stamped with `content_hash` = sha256(prompt name, prompt version,
+model deployment, inputs). Generation endpoints look the hash up first and only
+call the model when an input, the prompt or the deployment changed (or the
+caller forces it). A prompt edit therefore invalidates exactly the artifacts
+made from that prompt.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+from datetime import datetime, timezone
+from typing import Any, Dict, NamedTuple
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from ..core.config import settings
+
+HISTORY_MAX = 20
+
+
+class Prompt(NamedTuple):
+    name: str
+    system: str
+    user: str  # str.format template
+
+    @property
+    def fingerprint(self) -> str:
+        return hashlib.sha256(f"{self.system}\x00{self.user}".encode("utf-8")).hexdigest()
+
+    def messages(self, **kw: Any) -> list:
+        return [
+            {"role": "system", "content": self.system},
+            {"role": "user", "content": self.user.format(**kw)},
+        ]
+
+
+class Stamp(NamedTuple):
+    content_hash: str
+    prompt: str
+    prompt_version: int
+    model: str
+
+    def fields(self) -> Dict[str, Any]:
+        return self._asdict()
+
+
+SUMMARIZE = Prompt(
+    "summarize",
+    system=(
+        "You are a concise teaching assistant for kids aged 7–14. "
+        "Summarize the class discussion into 7–10 bullet points, "
+        "Without losing any important information. Use both the transcript and the reference passages to make the summary accurate and complete.Give more preference to what is taught in the transcript"
+        "Your summary should take most of the important and concrete points from the transcript and the reference passages which are part of the standard textbook, "
+        "and cite a reference passage as [n] where you use it."
+    ),
+    user="Transcript:\n{transcript}\n\nReference passages:\n{passages}",
+)
+
+# map step for transcripts longer than SUMMARY_CHUNK_TOKENS
+SUMMARIZE_PART = Prompt(
+    "summarize_part",
+    system=(
+        "You take notes on one part of a class transcript. List every concept, definition, example, "
+        "formula and instruction the teacher covered, as short bullet points in the order they came up. "
+        "Do not add anything that is not in the transcript."
+    ),
+    user="Part {part} of {parts}:\n{transcript}",
+)
+
+QUIZ = Prompt(
+    "quiz",
+    system="Generate objective MCQs for grade-school learners. 1 correct answer only unless topic needs multiple.",
+    user=(
+        "Create {n_questions} MCQs from this summary:\n{summary}\n"
+        "Return JSON with a 'questions' array of objects:\n"
+        '    {{ "qid": "q1", "question": "...", "options":[{{"key":"a","description":"..."}},...], "correct":["a"] }}'
+    ),
+)
+
+PROMPTS: Dict[str, Prompt] = {p.name: p for p in (SUMMARIZE, SUMMARIZE_PART, QUIZ)}
+
+_versions: Dict[str, int] = {}
+
+
+# ----------------------------
+# Version registry
+# ----------------------------
+
+async def _sync_one(db, p: Prompt) -> int:
+    doc = await db.prompt_versions.find_one({"_id": p.name}, {"version": 1, "hash": 1})
+    if doc and doc.get("hash") == p.fingerprint:
+        return doc["version"]
+    now = datetime.now(timezone.utc)
+    try:
+        # only the first worker to see the new text bumps the version
+        doc = await db.prompt_versions.find_one_and_update(
+            {"_id": p.name, "hash": {"$ne": p.fingerprint}},
+            {"$inc": {"version": 1}, "$set": {"hash": p.fingerprint, "updated_at": now},
+             "$push": {"history": {"$each": [{"hash": p.fingerprint, "at": now}], "$slice": -HISTORY_MAX}}},
+            upsert=True, return_document=ReturnDocument.AFTER,
+        )
+    except DuplicateKeyError:
+        doc = await db.prompt_versions.find_one({"_id": p.name}, {"version": 1})
+    print(f"[prompts] {p.name} is now version {doc['version']}")
+    return doc["version"]
+
+async def sync(db) -> Dict[str, int]:
+    """Record every registered prompt, bumping versions whose text changed."""
+    for p in PROMPTS.values():
+        _versions[p.name] = await _sync_one(db, p)
+    return dict(_versions)
+
+async def version(db, name: str) -> int:
+    if name not in _versions:
+        _versions[name] = await _sync_one(db, PROMPTS[name])
+    return _versions[name]
+
+async def stamp(db, name: str, *inputs: Any) -> Stamp:
+    """Content hash of one generation: prompt, its version, the deployment and the inputs."""
+    v = await version(db, name)
+    model = settings.AZURE_OPENAI_CHAT_DEPLOYMENT
+    blob = json.dumps([name, v, model, inputs], default=str, ensure_ascii=False, separators=(",", ":"))
+    return Stamp(hashlib.sha256(blob.encode("utf-8")).hexdigest(), name, v, model)
@@ -2,7 +2,8 @@
 from datetime import datetime, timezone
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from app.models.question import Question
-from typing import List
+from typing import List, Optional, Tuple
+from app.utils.pagination import paginate
 
 class QuestionService:
      def __init__(self, db: AsyncIOMotorDatabase):
@@ -33,8 +34,8 @@ class QuestionService:
 
 
 
-     async def get_all_questions(self) -> list[Question]:
-       questions = await self.collection.find().to_list(length=None)
-      
-       return [Question(**q) for q in questions]
+     async def get_all_questions(self, cursor: Optional[str] = None, limit: int = 100) -> Tuple[list[Question], Optional[str]]:
+        """One page of questions in _id order, plus the cursor for the next page."""
+        questions, next_cursor = await paginate(self.collection, {}, scope="questions", cursor=cursor, limit=limit)
+        return [Question(**q) for q in questions], next_cursor
          
\ No newline at end of file
@@ -2,6 +2,10 @@
 from datetime import datetime, timezone
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from bson import ObjectId
+from typing import Optional
+from app.utils.pagination import paginate
+
+_ANSWER_KEYS = ("correct_answer", "correct")
 
 class QuizService:
     def __init__(self, db: AsyncIOMotorDatabase):
@@ -33,33 +37,40 @@ class QuizService:
             "questionsCount": len(question_ids)
         }
 
-    async def get_all_quizzes(self):
-     quizzes = await self.db.quizzes.find().to_list(length=None)
-     return [{"id": str(q["_id"]), **q} for q in quizzes]
+    async def get_all_quizzes(self, cursor: Optional[str] = None, limit: int = 100):
+        """One page of quizzes in _id order; returns (quizzes, next_cursor)."""
+        quizzes, next_cursor = await paginate(self.db.quizzes, {}, scope="quizzes", cursor=cursor, limit=limit)
+        return [{"id": str(q["_id"]), **q} for q in quizzes], next_cursor
     
   
  
 
-    async def get_quizzes_by_topic(self, topic: str):
-      
-    
-       # 1. Fetch quizzes by topic
-       quizzes = await self.db.quizzes.find({"topic": topic}).to_list(100)
-       result = []
-
-       for quiz in quizzes:
-        question_ids = quiz.get("questions", [])
-        question_object_ids = [ObjectId(qid) for qid in question_ids]
-
-        # 2. Fetch full question documents
-        questions = await self.db.questions.find({"_id": {"$in": question_object_ids}}).to_list(length=len(question_object_ids))
+    async def get_quizzes_by_topic(self, topic: str, include_answers: bool = True, limit: int = 100):
+        """
+        Quizzes for a topic with their questions hydrated in two queries total:
+        one for the quizzes, one $in over the union of their question ids.
+        Generated quizzes embed their questions as dicts; those are returned as
+        stored. Pass include_answers=False to leave answer keys out.
+        """
+        quizzes = await self.db.quizzes.find({"topic": topic}).to_list(limit)
 
-        # 3. Convert _id of questions to str
-        questions_data = [{**q, "_id": str(q["_id"])} for q in questions]
+        all_ids = {ObjectId(str(qid)) for quiz in quizzes for qid in quiz.get("questions", [])
+                   if not isinstance(qid, dict) and ObjectId.is_valid(str(qid))}
+        projection = None if include_answers else {k: 0 for k in _ANSWER_KEYS}
+        by_id = {}
+        if all_ids:
+            async for q in self.db.questions.find({"_id": {"$in": list(all_ids)}}, projection):
+                q["_id"] = str(q["_id"])
+                by_id[q["_id"]] = q
 
-        # 4. Prepare final quiz data
-        quiz_data = {**quiz, "_id": str(quiz["_id"]), "questions": questions_data}
-        result.append(quiz_data)
+        def hydrate(question):
+            if isinstance(question, dict):  # embedded question
+                return question if include_answers else {k: v for k, v in question.items() if k not in _ANSWER_KEYS}
+            return by_id.get(str(question))
 
-       
-       return result
+        # Join in memory, keeping each quiz's question order
+        return [
+            {**quiz, "_id": str(quiz["_id"]),
+             "questions": [q for q in map(hydrate, quiz.get("questions", [])) if q is not None]}
+            for quiz in quizzes
+        ]
@@ -1,55 +1,29 @@
 from __future__ import annotations
 
+import hashlib
 from typing import List, Dict, Any, Optional
-from openai import AzureOpenAI
+from ..core import metrics
 from ..core.config import settings
+from . import bm25, context, llm, embedding_cache, vector_index, semantic_cache, singleflight
 from ..db.mongo import get_db  # expects Motor (async) DB
+from pymongo import UpdateOne
 from pymongo.errors import PyMongoError
 
-# ----------------------------
-# OpenAI / Azure OpenAI Client
-# ----------------------------
-
-_client: AzureOpenAI | None = None
-
-def _client_fn() -> AzureOpenAI:
-    global _client
-    if _client is None:
-        _client = AzureOpenAI(
-            api_key=settings.AZURE_OPENAI_API_KEY,
-            azure_endpoint=settings.AZURE_OPENAI_ENDPOINT,
-            api_version=getattr(settings, "AZURE_OPENAI_API_VERSION", "2024-08-01-preview"),
-        )
-    return _client
-
+RAG_TOP_K = 6  # retrieved before dedupe; passages() packs what fits RAG_CONTEXT_TOKENS
 
 # ----------------------------
-# Embeddings (sync SDK usage)
+# Embeddings (async gateway + cache)
 # ----------------------------
 
 async def embed(texts: List[str]) -> List[List[float]]:
     """
     Embed a list of texts using your configured Azure OpenAI embedding deployment.
-    Returns list[list[float]] in the same order as inputs.
+    Returns list[list[float]] in the same order as inputs. Texts embedded before
+    (by ingestion or earlier queries) are served from the embedding cache.
     """
-    model_name = "text-embedding-3-large"
-    deployment = "text-embedding-3-large"
-    api_version = "2024-02-01"
-
-    client_embedding = AzureOpenAI(
-        api_version="2024-12-01-preview",
-        azure_endpoint=settings.AZURE_OPENAI_ENDPOINT,
-        api_key=settings.AZURE_OPENAI_API_KEY
+    return await embedding_cache.embed_cached(
+        texts, settings.AZURE_OPENAI_EMBEDDING_DEPLOYMENT, llm.embeddings
     )
-    if not texts:
-        return []
-  
-    resp = client_embedding.embeddings.create(
-        model=model_name,
-        input=texts
-    )
-    # Sort by 'index' to preserve order (SDK should already do so, but be explicit)
-    return [d.embedding for d in sorted(resp.data, key=lambda d: d.index)]
 
 
 # ----------------------------
@@ -112,41 +86,73 @@ async def _ensure_vector_index(dimensions: int,
 
 
 # ----------------------------
-# Upsert a single CBSE doc
+# Upsert CBSE docs
 # ----------------------------
 
-async def upsert_cbse_doc(chapter: str, subject: str, class_no: int, text: str,
-                          source_pdf: Optional[str] = None, page: Optional[int] = None) -> str:
+def _cbse_doc_id(subject: str, class_no: int, chapter: str, text: str,
+                 source_pdf: Optional[str] = None, page: Optional[int] = None) -> str:
+    """Stable _id from natural keys so re-ingesting the same chunk is an idempotent upsert."""
+    base_key = f"{subject}|{class_no}|{chapter}|{page or ''}|{(source_pdf or '').split('/')[-1]}|{text[:64]}"
+    return hashlib.sha1(base_key.encode("utf-8")).hexdigest()
+
+async def upsert_cbse_docs(items: List[Dict[str, Any]], *, bump: bool = True) -> List[str]:
     """
-    Compute embedding, ensure the vector index exists, and upsert the document.
-    Returns the inserted/updated document _id as a hex string.
+    Embed a batch of chunks with one embedding call and upsert them with a single
+    unordered bulk_write. Each item needs chapter, subject, class_no and text;
+    source_pdf and page are optional. Returns the _ids in input order.
+
+    Each batch bumps its slices' cbse_docs version (dropping cached answers and
+    BM25 partitions everywhere); bulk loaders pass bump=False and call
+    semantic_cache.bump_version once when the run ends.
     """
+    if not items:
+        return []
     db = await get_db()
     coll = db.cbse_docs
 
-    vec = (await embed([text]))[0]
-    await _ensure_vector_index(dimensions=len(vec))
-
-    # Generate a stable _id from natural keys to keep upserts idempotent
-    import hashlib
-    base_key = f"{subject}|{class_no}|{chapter}|{page or ''}|{(source_pdf or '').split('/')[-1]}|{text[:64]}"
-    _id = hashlib.sha1(base_key.encode("utf-8")).hexdigest()
+    vecs = await embed([it["text"] for it in items])
+    await _ensure_vector_index(dimensions=len(vecs[0]))
+
+    ids: List[str] = []
+    docs: List[Dict[str, Any]] = []
+    ops: List[UpdateOne] = []
+    for it, vec in zip(items, vecs):
+        _id = _cbse_doc_id(it["subject"], it["class_no"], it["chapter"], it["text"],
+                           it.get("source_pdf"), it.get("page"))
+        doc: Dict[str, Any] = {
+            "_id": _id,
+            "chapter": it["chapter"],
+            "subject": it["subject"],
+            "class_no": it["class_no"],
+            "text": it["text"],
+            "embedding": vec,
+        }
+        if it.get("source_pdf"):
+            doc["source_pdf"] = it["source_pdf"]
+        if it.get("page") is not None:
+            doc["page"] = it["page"]
+        ids.append(_id)
+        docs.append(doc)
+        ops.append(UpdateOne({"_id": _id}, {"$set": doc}, upsert=True))
+
+    await coll.bulk_write(ops, ordered=False)
+    vector_index.upsert(docs)
+    if bump:
+        for class_no, subject in {(d["class_no"], d["subject"]) for d in docs}:
+            await semantic_cache.bump_version(class_no, subject)
+    return ids
 
-    doc: Dict[str, Any] = {
-        "_id": _id,
-        "chapter": chapter,
-        "subject": subject,
-        "class_no": class_no,
-        "text": text,
-        "embedding": vec,
-    }
-    if source_pdf:
-        doc["source_pdf"] = source_pdf
-    if page is not None:
-        doc["page"] = page
-
-    await coll.update_one({"_id": _id}, {"$set": doc}, upsert=True)
-    return _id
+async def upsert_cbse_doc(chapter: str, subject: str, class_no: int, text: str,
+                          source_pdf: Optional[str] = None, page: Optional[int] = None) -> str:
+    """
+    Compute embedding, ensure the vector index exists, and upsert the document.
+    Returns the inserted/updated document _id as a hex string.
+    """
+    ids = await upsert_cbse_docs([{
+        "chapter": chapter, "subject": subject, "class_no": class_no,
+        "text": text, "source_pdf": source_pdf, "page": page,
+    }])
+    return ids[0]
 
 
 # ----------------------------
@@ -155,13 +161,38 @@ async def upsert_cbse_doc(chapter: str, subject: str, class_no: int, text: str,
 
 async def search_cbse(query: str, class_no: int, subject: str, k: int = 4) -> List[Dict[str, Any]]:
     """
-    Embed the query once, then run a $search.cosmosSearch pipeline with pre-filters.
+    Top-k chunks for a query. In "hybrid" mode BM25 and vector results are fused
+    by reciprocal rank; a lexically confident keyword query is answered from
+    BM25 alone, skipping the vector search and, unless the caller already
+    embedded the query, the embedding call. "vector" mode is vector search only.
+    """
+    if settings.RETRIEVAL_MODE != "hybrid":
+        return await _vector_search(query, class_no, subject, k)
+
+    depth = max(k, settings.RETRIEVAL_FUSION_DEPTH)
+    lexical = await bm25.search(query, class_no, subject, k=depth)
+    if settings.BM25_FAST_PATH and lexical.confident(k, settings.BM25_FAST_PATH_MAX_TERMS):
+        metrics.incr("retrieval.fast_path")
+        return lexical.hits[:k]
+    metrics.incr("retrieval.hybrid")
+    vector = await _vector_search(query, class_no, subject, depth)
+    return bm25.rrf([lexical.hits, vector], k)
+
+async def _vector_search(query: str, class_no: int, subject: str, k: int) -> List[Dict[str, Any]]:
     """
+    Embed the query once, then run a $search.cosmosSearch pipeline with pre-filters,
+    or the in-process index when VECTOR_SEARCH_BACKEND is "local".
+    """
+    qvec = (await embed([query]))[0]
+    if settings.VECTOR_SEARCH_BACKEND == "local":
+        return await vector_index.search(qvec, class_no, subject, k=k)
+    return await _cosmos_search(qvec, class_no, subject, k=k)
+
+async def _cosmos_search(qvec: List[float], class_no: int, subject: str, k: int = 4) -> List[Dict[str, Any]]:
     db = await get_db()
     coll = db.cbse_docs
 
-    # Get query vector and make sure index dimension matches (first call only)
-    qvec = (await embed([query]))[0]
+    # Make sure index dimension matches (first call only)
     await _ensure_vector_index(dimensions=len(qvec))
 
     # Build filter
@@ -201,20 +232,36 @@ async def search_cbse(query: str, class_no: int, subject: str, k: int = 4) -> Li
 # RAG: retrieve + generate
 # ----------------------------
 
-async def answer_with_rag(query: str, class_no: int, subject: str) -> str:
+async def answer_with_rag(query: str, class_no: int, subject: str, tenant: str = "demo-school") -> str:
     """
     Retrieve top-k matching chunks and answer strictly from those.
+    Near-duplicate questions in the same (tenant, class_no, subject) are served
+    from the semantic answer cache; identical questions in flight at the same
+    time share one model call.
     """
-    chunks = await search_cbse(query, class_no, subject, k=4)
-    context = "\n\n".join([c["text"] for c in chunks]) if chunks else ""
+    norm = " ".join(query.split())
+    return await singleflight.do(
+        singleflight.key("rag", tenant, class_no, subject, norm),
+        lambda: _answer_with_rag(norm, class_no, subject, tenant),
+    )
+
+async def _answer_with_rag(query: str, class_no: int, subject: str, tenant: str) -> str:
+    # embedded up front for the semantic cache, so the BM25 fast path only saves the vector search here
+    qvec = (await embed([query]))[0]
+    cached = await semantic_cache.lookup(tenant, class_no, subject, query, qvec)
+    if cached is not None:
+        return cached
+
+    chunks = await search_cbse(query, class_no, subject, k=RAG_TOP_K)  # query embedding is now cached
+    block, _ = context.passages(chunks, query, settings.RAG_CONTEXT_TOKENS)
 
-    client = _client_fn()
-    resp = client.chat.completions.create(
-        model=settings.AZURE_OPENAI_CHAT_DEPLOYMENT,
-        messages=[
+    # question first, so a budget trim can only cut context
+    answer = await llm.chat_text(
+        messages=context.fit("rag", [
             {"role": "system", "content": "Answer using ONLY the provided context. If the answer isn't in the context, say you don't know. Cite with [1], [2], etc."},
-            {"role": "user", "content": f"Context:\n{context}\n\nQuestion: {query}"},
-        ],
+            {"role": "user", "content": f"Question: {query}\n\nContext:\n{block}"},
+        ]),
         temperature=0.2,
     )
-    return resp.choices[0].message.content.strip()
+    await semantic_cache.store(tenant, class_no, subject, query, qvec, answer)
+    return answer
@@ -0,0 +1,202 @@
+"""
+Read-through cache for small, rarely changing reference documents.
+
+Daily classes, quizzes, students and school content prefs are read on almost
+every AI/quiz request. Entries are keyed by kind and id, bounded by
+REFCACHE_MAX_ITEMS (local LRU) and expire after REFCACHE_TTL_SECONDS. Daily
+classes and students are cached once per id whatever tenant asked; the
+accessors return them only to their own tenant (or for legacy documents
+without one), so one invalidation clears them for everyone. Write endpoints
+invalidate what they change, but with the local backend that only reaches the
+worker that handled the write: other workers keep serving the old entry until
+its TTL runs out.
+
+Quizzes are never stale: a regenerated quiz is a new document, so
+get_quiz_for_daily looks up the id of the daily class's latest quiz on every
+call (a covered index seek) and caches only the quiz body, keyed by that id.
+
+REFCACHE_BACKEND="local" keeps entries in-process. "redis" shares them between
+workers through any Redis-compatible server at REFCACHE_REDIS_URL (needs the
+optional `redis` package); values are stored as BSON so ObjectIds survive.
+Misses are not cached, so newly created documents are visible immediately.
+"""
+from __future__ import annotations
+
+import copy
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import bson
+from bson import ObjectId
+
+from ..core import metrics
+from ..core.config import settings
+from ..db.mongo import get_db
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # optional; only needed for REFCACHE_BACKEND=redis
+    aioredis = None
+
+KINDS = ("daily", "quiz", "student", "school_prefs")
+
+
+class LocalBackend:
+    """In-process LRU with per-entry expiry."""
+
+    def __init__(self, max_items: int):
+        self.max_items = max_items
+        self._items: "OrderedDict[str, tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        hit = self._items.get(key)
+        if hit is None:
+            return None
+        expires, value = hit
+        if expires < time.monotonic():
+            del self._items[key]
+            return None
+        self._items.move_to_end(key)
+        return copy.deepcopy(value)  # callers may modify what they get
+
+    async def set(self, key: str, value: Dict[str, Any], ttl: int) -> None:
+        self._items[key] = (time.monotonic() + ttl, copy.deepcopy(value))
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_items:
+            self._items.popitem(last=False)
+
+    async def delete(self, key: str) -> None:
+        self._items.pop(key, None)
+
+    def size(self) -> int:
+        return len(self._items)
+
+
+class RedisBackend:
+    """Shared cache on a Redis-compatible server; values are BSON documents."""
+
+    def __init__(self, url: str, prefix: str = "aibuddy:ref:"):
+        if aioredis is None:
+            raise RuntimeError("REFCACHE_BACKEND=redis requires the 'redis' package")
+        self._r = aioredis.from_url(url)
+        self._prefix = prefix
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        raw = await self._r.get(self._prefix + key)
+        return bson.decode(raw) if raw else None
+
+    async def set(self, key: str, value: Dict[str, Any], ttl: int) -> None:
+        await self._r.set(self._prefix + key, bson.encode(value), ex=ttl)
+
+    async def delete(self, key: str) -> None:
+        await self._r.delete(self._prefix + key)
+
+    def size(self) -> Optional[int]:
+        return None  # shared; not tracked per process
+
+
+_backend: LocalBackend | RedisBackend | None = None
+
+def backend() -> LocalBackend | RedisBackend:
+    global _backend
+    if _backend is None:
+        if settings.REFCACHE_BACKEND == "redis":
+            _backend = RedisBackend(settings.REFCACHE_REDIS_URL)
+        else:
+            _backend = LocalBackend(settings.REFCACHE_MAX_ITEMS)
+    return _backend
+
+ANY_TENANT = "*"  # scope of entries shared by every tenant
+
+def _key(tenant: str, kind: str, ident: str) -> str:
+    return f"{tenant}|{kind}|{ident}"
+
+def _owned(doc: Optional[Dict[str, Any]], field: str, tenant: str) -> Optional[Dict[str, Any]]:
+    """`doc` if it belongs to `tenant` (or predates tenants), else None."""
+    if doc is None or doc.get(field) not in (None, tenant):
+        return None
+    return doc
+
+async def _read_through(tenant: str, kind: str, ident: str,
+                        load: Callable[[], Awaitable[Optional[Dict[str, Any]]]]) -> Optional[Dict[str, Any]]:
+    key = _key(tenant, kind, ident)
+    try:
+        cached = await backend().get(key)
+    except Exception as e:  # a cache outage must not fail the request
+        print(f"[refcache] get {key} failed: {e}")
+        cached = None
+    if cached is not None:
+        metrics.incr(f"refcache.{kind}.hits")
+        return cached
+
+    metrics.incr(f"refcache.{kind}.misses")
+    doc = await load()
+    if doc is not None:
+        try:
+            await backend().set(key, doc, settings.REFCACHE_TTL_SECONDS)
+        except Exception as e:
+            print(f"[refcache] set {key} failed: {e}")
+    return doc
+
+async def _invalidate(tenant: str, kind: str, ident: str) -> None:
+    try:
+        await backend().delete(_key(tenant, kind, ident))
+        metrics.incr(f"refcache.{kind}.invalidations")
+    except Exception as e:
+        print(f"[refcache] invalidate {kind} {ident} failed: {e}")
+
+
+# ----------------------------
+# Typed accessors
+# ----------------------------
+
+async def get_daily(tenant: str, daily_id: str) -> Optional[Dict[str, Any]]:
+    if not ObjectId.is_valid(daily_id):
+        return None
+    async def load():
+        db = await get_db()
+        return await db.classes_daily.find_one({"_id": ObjectId(daily_id)})
+    return _owned(await _read_through(ANY_TENANT, "daily", daily_id, load), "tenant", tenant)
+
+async def get_quiz_for_daily(tenant: str, daily_id: str) -> Optional[Dict[str, Any]]:
+    """The daily class's latest quiz; only its body is cached, by quiz id."""
+    db = await get_db()
+    latest = await db.quizzes.find_one({"daily_id": daily_id, "tenant": tenant}, {"_id": 1}, sort=[("_id", -1)])
+    if latest is None:
+        return None
+    async def load():
+        return await db.quizzes.find_one({"_id": latest["_id"]})
+    return await _read_through(tenant, "quiz", str(latest["_id"]), load)
+
+async def get_student(tenant: str, student_id: str) -> Optional[Dict[str, Any]]:
+    async def load():
+        db = await get_db()
+        return await db.students.find_one({"student_id": student_id})
+    return _owned(await _read_through(ANY_TENANT, "student", student_id, load), "school_tenant", tenant)
+
+async def get_school_prefs(school_tenant: str) -> Dict[str, Any]:
+    """The school's content_prefs (empty when unset); cached even when empty."""
+    async def load():
+        db = await get_db()
+        school = await db.schools.find_one({"tenant": school_tenant}, {"content_prefs": 1})
+        return {"content_prefs": (school or {}).get("content_prefs") or {}}
+    doc = await _read_through(school_tenant, "school_prefs", school_tenant, load)
+    return doc["content_prefs"]
+
+async def invalidate_daily(daily_id: str) -> None:
+    await _invalidate(ANY_TENANT, "daily", daily_id)
+
+async def invalidate_quiz(tenant: str, quiz_id: str) -> None:
+    """Only needed when a quiz document is edited in place."""
+    await _invalidate(tenant, "quiz", quiz_id)
+
+async def invalidate_student(student_id: str) -> None:
+    await _invalidate(ANY_TENANT, "student", student_id)
+
+def stats() -> Dict[str, Any]:
+    return {
+        "backend": settings.REFCACHE_BACKEND,
+        "size": backend().size(),
+        "hit_ratio": {kind: metrics.hit_ratio(f"refcache.{kind}") for kind in KINDS},
+    }
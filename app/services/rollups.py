@@ -0,0 +1,175 @@
+"""
+Incremental progress rollups.
+
+Every student_progress write also refreshes two summary documents for the
+class date:
+
+  student_daily_rollups  _id "tenant|student_id|date"
+      {tenant, student_id, date, classes: {daily_id: entry}}
+  class_daily_rollups    _id "tenant|class_no|section|subject|date"
+      {tenant, class_no, section, subject, date, dailies: {daily_id: {student_id: entry}}}
+
+An entry is a snapshot of the progress document (completion, best/latest quiz
+score, attempts), so a repeated activity never double counts. Every progress
+update bumps the document's `rev`, and an entry is only replaced by a snapshot
+with a higher rev, so concurrent writers (and a rebuild) can't put an older
+snapshot over a newer one. Dashboards read O(days) rollup documents instead of
+grouping raw rows.
+
+Backfill or repair with: python -m app.services.rollups [--tenant demo-school]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from ..core import metrics
+
+REBUILD_BATCH = 1000
+
+
+def _day(v: Any) -> str:
+    if isinstance(v, (datetime, date)):
+        return v.isoformat()[:10]
+    return str(v)
+
+def _field(key: str) -> str:
+    """Make an id usable as a field name (no dots, no leading $)."""
+    return key.replace(".", "．").lstrip("$")
+
+def entry(progress: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "completion": float(progress.get("completion_percentage") or 0.0),
+        "is_completed": bool(progress.get("is_completed")),
+        "quiz_best_score": progress.get("quiz_best_score"),
+        "quiz_latest_score": progress.get("quiz_latest_score"),
+        "quiz_attempts": int(progress.get("quiz_attempts") or 0),
+        "updated_at": progress.get("updated_at"),
+        "rev": int(progress.get("rev") or 0),
+    }
+
+def student_rollup_id(tenant: str, student_id: str, day: str) -> str:
+    return f"{tenant}|{student_id}|{day}"
+
+def class_rollup_id(tenant: str, class_no: int, section: str, subject: str, day: str) -> str:
+    return f"{tenant}|{class_no}|{section}|{subject}|{day}"
+
+def _guarded(path: str, e: Dict[str, Any]) -> Dict[str, Any]:
+    """Pipeline expression: `e` unless the entry at `path` already has the same or a newer rev."""
+    return {"$cond": [{"$gte": [{"$ifNull": [f"${path}.rev", -1]}, e["rev"]]}, f"${path}", {"$literal": e}]}
+
+def updates_for(progress: Dict[str, Any]) -> Dict[str, Tuple[dict, list]]:
+    """(filter, update pipeline) per rollup collection for one progress snapshot."""
+    tenant, day = progress["tenant"], _day(progress["date"])
+    e = entry(progress)
+    student_path = f"classes.{_field(progress['daily_id'])}"
+    class_path = f"dailies.{_field(progress['daily_id'])}.{_field(progress['student_id'])}"
+    return {
+        "student_daily_rollups": (
+            {"_id": student_rollup_id(tenant, progress["student_id"], day)},
+            [{"$set": {"tenant": tenant, "student_id": progress["student_id"], "date": day,
+                       student_path: _guarded(student_path, e)}}],
+        ),
+        "class_daily_rollups": (
+            {"_id": class_rollup_id(tenant, progress["class_no"], progress["section"], progress["subject"], day)},
+            [{"$set": {"tenant": tenant, "class_no": progress["class_no"], "section": progress["section"],
+                       "subject": progress["subject"], "date": day,
+                       class_path: _guarded(class_path, e)}}],
+        ),
+    }
+
+async def record(db, progress: Dict[str, Any]) -> None:
+    """Refresh the rollups for one updated progress document."""
+    await asyncio.gather(*(
+        db[coll].update_one(filt, update, upsert=True) for coll, (filt, update) in updates_for(progress).items()
+    ))
+    metrics.incr("rollups.updates")
+
+async def record_many(db, progresses: List[Dict[str, Any]]) -> None:
+    """Refresh rollups for many snapshots with one bulk_write per collection (highest rev wins)."""
+    by_coll: Dict[str, List[UpdateOne]] = {}
+    for p in progresses:
+        for coll, (filt, update) in updates_for(p).items():
+            by_coll.setdefault(coll, []).append(UpdateOne(filt, update, upsert=True))
+    await asyncio.gather(*(db[coll].bulk_write(ops, ordered=True) for coll, ops in by_coll.items()))
+    metrics.incr("rollups.updates", len(progresses))
+
+
+# ----------------------------
+# Readers
+# ----------------------------
+
+def summarize_entries(entries: List[Dict[str, Any]]) -> Dict[str, Any]:
+    total = len(entries)
+    return {
+        "total_classes": total,
+        "completed_classes": sum(1 for e in entries if e.get("is_completed")),
+        "avg_completion": round(sum(e.get("completion", 0.0) for e in entries) / total, 2) if total else 0.0,
+    }
+
+async def student_days(db, tenant: str, student_id: str, start_date: str,
+                       end_date: Optional[str] = None) -> List[Dict[str, Any]]:
+    rng: Dict[str, str] = {"$gte": start_date}
+    if end_date:
+        rng["$lte"] = end_date
+    cursor = db.student_daily_rollups.find(
+        {"tenant": tenant, "student_id": student_id, "date": rng}
+    ).sort("date", 1)
+    return [doc async for doc in cursor]
+
+async def class_days(db, tenant: str, class_no: int, section: str, subject: str,
+                     start_date: str, end_date: str) -> List[Dict[str, Any]]:
+    cursor = db.class_daily_rollups.find({
+        "tenant": tenant, "class_no": class_no, "section": section, "subject": subject,
+        "date": {"$gte": start_date, "$lte": end_date},
+    }).sort("date", 1)
+    return [doc async for doc in cursor]
+
+
+# ----------------------------
+# Rebuild
+# ----------------------------
+
+async def rebuild(db, tenant: Optional[str] = None) -> int:
+    """
+    Recompute rollups from student_progress (all tenants, or one).
+
+    Safe alongside live writes: the scan starts after the deletes, so it reads
+    every progress document at or after the rev whose rollup write the delete
+    may have removed, and any live write landing during the scan has a higher
+    rev than the snapshot the scan read, so the guarded writes keep it.
+    Dashboards show partial data until the scan finishes.
+    """
+    scope = {"tenant": tenant} if tenant else {}
+    await db.student_daily_rollups.delete_many(scope)
+    await db.class_daily_rollups.delete_many(scope)
+    n, batch = 0, []
+    async for p in db.student_progress.find(scope).batch_size(REBUILD_BATCH):
+        if not all(k in p for k in ("tenant", "date", "class_no", "section", "subject")):
+            continue  # legacy rows without class context
+        batch.append(p)
+        if len(batch) >= REBUILD_BATCH:
+            await record_many(db, batch)
+            n += len(batch)
+            batch = []
+    if batch:
+        await record_many(db, batch)
+        n += len(batch)
+    return n
+
+if __name__ == "__main__":
+    from ..db.mongo import get_db
+
+    async def _main(tenant: Optional[str]):
+        db = await get_db()
+        n = await rebuild(db, tenant)
+        print(f"[rollups] rebuilt from {n} progress documents")
+
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--tenant", default=None, help="only rebuild this tenant")
+    a = ap.parse_args()
+    asyncio.run(_main(a.tenant))
@@ -0,0 +1,133 @@
+"""
+Silence-aware splitting and parallel transcription of long 16 kHz mono WAVs.
+
+`plan_segments` scans the file in blocks, measuring per-window RMS level, and
+cuts inside the first long-enough silence after TRANSCRIBE_SEGMENT_TARGET_SECONDS
+(forcing a cut at TRANSCRIBE_SEGMENT_MAX_SECONDS). Segments are written as
+separate WAVs and handed to a Recognizer on a thread pool; results are stitched
+back in order with absolute timestamps. A forced cut can fall inside a word, so
+words repeated on both sides of a boundary are dropped from the later segment.
+
+A Recognizer is any callable taking a WAV path and returning
+[(offset_seconds, text), ...] relative to the start of that file, so a fake can
+stand in for Azure Speech.
+"""
+from __future__ import annotations
+
+import os
+import shutil
+import tempfile
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+from ..core.config import settings
+
+Recognizer = Callable[[str], List[Tuple[float, str]]]
+
+_WINDOW_S = 0.03
+_BLOCK_WINDOWS = 1000  # ~30 s of audio read per block
+_MAX_OVERLAP_WORDS = 5
+
+
+def plan_segments(wav_path: str, target_s: float | None = None, max_s: float | None = None,
+                  min_silence_s: float | None = None, silence_dbfs: float | None = None) -> List[Tuple[float, float]]:
+    """Return [(start_s, end_s), ...] covering the file, cut at silences."""
+    target_s = target_s or settings.TRANSCRIBE_SEGMENT_TARGET_SECONDS
+    max_s = max_s or settings.TRANSCRIBE_SEGMENT_MAX_SECONDS
+    min_silence_s = min_silence_s or settings.TRANSCRIBE_MIN_SILENCE_MS / 1000
+    silence_dbfs = settings.TRANSCRIBE_SILENCE_DBFS if silence_dbfs is None else silence_dbfs
+
+    with wave.open(wav_path, "rb") as w:
+        if w.getsampwidth() != 2 or w.getnchannels() != 1:
+            raise ValueError("expected 16-bit mono PCM WAV")
+        rate = w.getframerate()
+        total_s = w.getnframes() / rate
+        win = max(1, int(rate * _WINDOW_S))
+        threshold = 32768 * 10 ** (silence_dbfs / 20)
+        min_run = max(1, int(round(min_silence_s / _WINDOW_S)))
+
+        cuts: List[float] = []
+        seg_start, run, idx = 0.0, 0, 0
+        while True:
+            raw = w.readframes(win * _BLOCK_WINDOWS)
+            if not raw:
+                break
+            samples = np.frombuffer(raw, dtype=np.int16)
+            n = len(samples) // win
+            if n == 0:
+                break
+            rms = np.sqrt(np.mean(samples[: n * win].reshape(n, win).astype(np.float32) ** 2, axis=1))
+            for silent in rms < threshold:
+                idx += 1
+                t = idx * win / rate
+                run = run + 1 if silent else 0
+                length = t - seg_start
+                if (length >= target_s and run >= min_run) or length >= max_s:
+                    cut = t - (run // 2) * win / rate if run >= min_run else t
+                    cuts.append(cut)
+                    seg_start, run = cut, 0
+
+    bounds = [0.0] + [c for c in cuts if c < total_s] + [total_s]
+    return [(a, b) for a, b in zip(bounds, bounds[1:]) if b > a]
+
+def write_segments(wav_path: str, plan: List[Tuple[float, float]], out_dir: str) -> List[str]:
+    """Copy each planned range into its own WAV file, streaming frames."""
+    paths = []
+    with wave.open(wav_path, "rb") as w:
+        rate = w.getframerate()
+        for i, (start, end) in enumerate(plan):
+            path = os.path.join(out_dir, f"seg_{i:05d}.wav")
+            w.setpos(int(start * rate))
+            remaining = int(end * rate) - int(start * rate)
+            with wave.open(path, "wb") as out:
+                out.setparams(w.getparams())
+                while remaining > 0:
+                    frames = w.readframes(min(remaining, rate * 10))
+                    if not frames:
+                        break
+                    out.writeframes(frames)
+                    remaining -= len(frames) // (w.getsampwidth() * w.getnchannels())
+            paths.append(path)
+    return paths
+
+def _drop_overlap(prev: str, text: str) -> str:
+    """Strip from `text` the leading words that repeat the end of `prev` (case-insensitive)."""
+    a, b = prev.split(), text.split()
+    norm = lambda ws: [w.strip(".,!?;:").lower() for w in ws]
+    for k in range(min(_MAX_OVERLAP_WORDS, len(a), len(b)), 0, -1):
+        if norm(a[-k:]) == norm(b[:k]):
+            return " ".join(b[k:])
+    return text
+
+def transcribe_segmented(wav_path: str, recognizer: Recognizer,
+                         workers: int | None = None) -> Tuple[str, List[Dict[str, object]]]:
+    """
+    Split, recognize segments concurrently, and stitch in order.
+    Returns (text, [{"start", "end", "text"}, ...]) with timestamps in seconds.
+    """
+    workers = workers or settings.TRANSCRIBE_SEGMENT_WORKERS
+    plan = plan_segments(wav_path)
+    tmp_dir = tempfile.mkdtemp(prefix="segments_")
+    try:
+        paths = write_segments(wav_path, plan, tmp_dir)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="segment") as pool:
+            results = list(pool.map(recognizer, paths))  # map keeps segment order
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    segments: List[Dict[str, object]] = []
+    for (start, end), utterances in zip(plan, results):
+        first = True
+        for offset, text in utterances:
+            if text and first and segments:
+                text = _drop_overlap(str(segments[-1]["text"]), text)
+            first = False
+            if text:
+                segments.append({"start": round(start + offset, 2), "end": round(end, 2), "text": text})
+    # an utterance ends where the next one starts (or at its segment boundary)
+    for cur, nxt in zip(segments, segments[1:]):
+        cur["end"] = min(cur["end"], nxt["start"])
+    return " ".join(s["text"] for s in segments).strip(), segments
@@ -0,0 +1,122 @@
+"""
+Semantic answer cache for RAG answers.
+
+Entries are scoped by (tenant, class_no, subject). Given a query embedding, a lookup
+returns a stored answer whose query embedding has cosine similarity at or above
+SEMANTIC_CACHE_THRESHOLD. Each slice is LRU-bounded and entries expire after
+SEMANTIC_CACHE_TTL_SECONDS. Slices are dropped when cbse_docs for the same
+(class_no, subject) change: in-process writes invalidate directly, and writes
+from other processes (e.g. the ingestion script) are picked up through the
+version counter in `cbse_slices`, re-read at most every
+SEMANTIC_CACHE_VERSION_CHECK_SECONDS.
+"""
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ..core import metrics
+from ..core.config import settings
+from ..db.mongo import get_db
+
+SliceKey = Tuple[str, int, str]
+DocsKey = Tuple[int, str]
+
+
+class _Entry:
+    __slots__ = ("vec", "answer", "created_at")
+
+    def __init__(self, vec: np.ndarray, answer: str):
+        self.vec = vec
+        self.answer = answer
+        self.created_at = time.monotonic()
+
+
+# slice -> query text -> entry (LRU order)
+_slices: Dict[SliceKey, "OrderedDict[str, _Entry]"] = {}
+# slice -> cbse_slices version the entries were built against
+_slice_versions: Dict[SliceKey, int] = {}
+# (class_no, subject) -> (current version, monotonic time it was read)
+_doc_versions: Dict[DocsKey, Tuple[int, float]] = {}
+
+
+def _unit(vec: List[float]) -> np.ndarray:
+    v = np.asarray(vec, dtype=np.float32)
+    n = np.linalg.norm(v)
+    return v / n if n else v
+
+def _expire(entries: "OrderedDict[str, _Entry]") -> None:
+    cutoff = time.monotonic() - settings.SEMANTIC_CACHE_TTL_SECONDS
+    for q in [q for q, e in entries.items() if e.created_at < cutoff]:
+        del entries[q]
+
+async def docs_version(class_no: int, subject: str) -> int:
+    """cbse_docs version of a (class_no, subject) slice, re-read at most every SEMANTIC_CACHE_VERSION_CHECK_SECONDS."""
+    key = (class_no, subject)
+    cached = _doc_versions.get(key)
+    if cached and time.monotonic() - cached[1] < settings.SEMANTIC_CACHE_VERSION_CHECK_SECONDS:
+        return cached[0]
+    db = await get_db()
+    doc = await db.cbse_slices.find_one({"_id": f"{class_no}|{subject}"}, {"version": 1})
+    version = doc.get("version", 0) if doc else 0
+    _doc_versions[key] = (version, time.monotonic())
+    return version
+
+async def bump_version(class_no: int, subject: str) -> None:
+    """Record a cbse_docs change for the slice so every process drops its cached answers."""
+    db = await get_db()
+    await db.cbse_slices.update_one({"_id": f"{class_no}|{subject}"}, {"$inc": {"version": 1}}, upsert=True)
+    invalidate(class_no, subject)
+
+async def lookup(tenant: str, class_no: int, subject: str, query: str, qvec: List[float]) -> Optional[str]:
+    key = (tenant, class_no, subject)
+    entries = _slices.get(key)
+    if entries and _slice_versions.get(key) != await docs_version(class_no, subject):
+        _drop(key)
+        entries = None
+    if entries:
+        _expire(entries)
+    if not entries:
+        metrics.incr("semantic_cache.misses")
+        return None
+
+    keys = list(entries.keys())
+    scores = np.stack([entries[q].vec for q in keys]) @ _unit(qvec)
+    best = int(np.argmax(scores))
+    if scores[best] < settings.SEMANTIC_CACHE_THRESHOLD:
+        metrics.incr("semantic_cache.misses")
+        return None
+    entries.move_to_end(keys[best])
+    metrics.incr("semantic_cache.hits")
+    return entries[keys[best]].answer
+
+async def store(tenant: str, class_no: int, subject: str, query: str, qvec: List[float], answer: str) -> None:
+    key = (tenant, class_no, subject)
+    if key not in _slices:
+        _slice_versions[key] = await docs_version(class_no, subject)
+    entries = _slices.setdefault(key, OrderedDict())
+    entries[query] = _Entry(_unit(qvec), answer)
+    entries.move_to_end(query)
+    while len(entries) > settings.SEMANTIC_CACHE_MAX_PER_SLICE:
+        entries.popitem(last=False)
+
+def _drop(key: SliceKey) -> None:
+    _slices.pop(key, None)
+    _slice_versions.pop(key, None)
+    metrics.incr("semantic_cache.invalidations")
+
+def invalidate(class_no: int, subject: str) -> None:
+    """Drop this process's cached answers (every tenant) for a (class_no, subject) slice."""
+    _doc_versions.pop((class_no, subject), None)
+    for key in [k for k in _slices if k[1] == class_no and k[2] == subject]:
+        _drop(key)
+
+def stats() -> Dict[str, float | None]:
+    return {
+        "slices": len(_slices),
+        "entries": sum(len(e) for e in _slices.values()),
+        "hit_ratio": metrics.hit_ratio("semantic_cache"),
+    }
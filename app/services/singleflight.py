@@ -0,0 +1,75 @@
+"""
+Single-flight deduplication for concurrent identical model calls.
+
+`do(key, fn)` runs `fn` once per key at a time: the first caller starts it as
+its own task and every concurrent caller with the same key awaits that task's
+result (or exception). Nothing is cached after completion.
+
+- Per-key timeout: the shared call is cancelled after `timeout` seconds
+  (default SINGLEFLIGHT_TIMEOUT_SECONDS; callers size it for long jobs) and
+  every waiter gets asyncio.TimeoutError.
+- Cancellation safety: a waiter that is cancelled (e.g. its client went away)
+  only stops waiting; the shared call keeps running for the others and is
+  cancelled (and forgotten) only when no waiters remain.
+
+Counters: singleflight.<namespace>.calls (upstream calls started) and
+singleflight.<namespace>.coalesced (callers that joined one in flight).
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+from ..core import metrics
+from ..core.config import settings
+
+T = TypeVar("T")
+
+
+class _Flight:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+_inflight: Dict[str, _Flight] = {}
+
+
+def key(namespace: str, *parts: Any) -> str:
+    """Canonical key for a call: namespace plus a hash of its JSON-encoded inputs."""
+    blob = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False, separators=(",", ":"))
+    return f"{namespace}:{hashlib.sha256(blob.encode('utf-8')).hexdigest()}"
+
+async def _guarded(fn: Callable[[], Awaitable[T]], timeout: Optional[float]) -> T:
+    if timeout:
+        return await asyncio.wait_for(fn(), timeout)
+    return await fn()
+
+async def do(k: str, fn: Callable[[], Awaitable[T]], timeout: Optional[float] = None) -> T:
+    namespace = k.split(":", 1)[0]
+    flight = _inflight.get(k)
+    if flight is None:
+        timeout = settings.SINGLEFLIGHT_TIMEOUT_SECONDS if timeout is None else timeout
+        flight = _inflight[k] = _Flight(asyncio.create_task(_guarded(fn, timeout)))
+        flight.task.add_done_callback(lambda t, k=k, f=flight: _inflight.pop(k, None) if _inflight.get(k) is f else None)
+        metrics.incr(f"singleflight.{namespace}.calls")
+    else:
+        metrics.incr(f"singleflight.{namespace}.coalesced")
+
+    flight.waiters += 1
+    try:
+        return await asyncio.shield(flight.task)
+    finally:
+        flight.waiters -= 1
+        if flight.waiters == 0 and not flight.task.done():
+            flight.task.cancel()  # every waiter gave up
+            if _inflight.get(k) is flight:
+                del _inflight[k]  # a new caller starts fresh instead of joining the dying task
+            metrics.incr(f"singleflight.{namespace}.abandoned")
+
+def stats() -> Dict[str, Any]:
+    return {"in_flight": len(_inflight)}
@@ -0,0 +1,200 @@
+"""
+Story engine with a shared cache.
+
+A story depends only on (topics, persona, merged content prefs). The tuple is
+canonicalized (defaults filled, strings trimmed, unordered lists sorted) and
+hashed into a key; stories are stored once per key in `story_cache` and reused
+for every student whose tuple matches. Stories are always generated from the
+canonical tuple, so a cached story is exactly what a fresh call would produce.
+
+`prewarm_section` runs after a daily class is created: it groups the section's
+students by key and generates one story per distinct key (persona cluster) with
+STORY_PREWARM_CONCURRENCY calls in flight, so a section costs K model calls for
+K distinct personas instead of one per student.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..core import metrics
+from ..core.config import settings
+from ..db.mongo import get_db
+from ..models.schemas import ContentPrefs, StoryPersona
+from . import llm, refcache
+
+# Bump when the story prompt changes so old cache entries stop matching.
+STORY_PROMPT_VERSION = 1
+
+_DEFAULT_PREFS = ContentPrefs().model_dump()
+
+
+def merge_prefs(school_p: dict | None, student_doc) -> ContentPrefs | None:
+    student_p = student_doc.get("content_prefs") if student_doc else None
+    if not school_p and not student_p:
+        return None
+    # defaults <- school <- student, validated once
+    return ContentPrefs(**{**_DEFAULT_PREFS, **(school_p or {}), **(student_p or {})})
+
+
+# ----------------------------
+# Canonical form / key
+# ----------------------------
+
+def _canon(v: Any) -> Any:
+    if isinstance(v, str):
+        return " ".join(v.split())
+    if isinstance(v, dict):
+        return {k: _canon(x) for k, x in sorted(v.items())}
+    if isinstance(v, (list, tuple, set)):
+        items = [_canon(x) for x in v]
+        try:
+            return sorted(items)
+        except TypeError:  # dicts or mixed types: order by serialized form
+            return sorted(items, key=lambda x: json.dumps(x, sort_keys=True, default=str))
+    return v
+
+def canonical(topics: List[str], persona: str | dict | None,
+              prefs: ContentPrefs | None) -> Tuple[List[str], str | dict | None, dict | None]:
+    """Order- and whitespace-insensitive form of a story request; topic order is kept."""
+    topics_c = [" ".join(t.split()) for t in topics if t and t.strip()]
+    if isinstance(persona, dict):
+        try:
+            persona_c = _canon(StoryPersona(**persona).model_dump())
+        except Exception:
+            persona_c = _canon(persona)
+    elif isinstance(persona, str):
+        persona_c = " ".join(persona.split()) or None
+    else:
+        persona_c = None
+    prefs_c = _canon(prefs.model_dump()) if prefs else None
+    return topics_c, persona_c, prefs_c
+
+def cache_key(topics: List[str], persona: str | dict | None, prefs: ContentPrefs | None) -> str:
+    topics_c, persona_c, prefs_c = canonical(topics, persona, prefs)
+    blob = json.dumps({
+        "v": STORY_PROMPT_VERSION, "model": settings.AZURE_OPENAI_CHAT_DEPLOYMENT,
+        "topics": topics_c, "persona": persona_c, "prefs": prefs_c,
+    }, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+# ----------------------------
+# Generation
+# ----------------------------
+
+async def generate_story(topic: str, persona: str | dict | None, prefs: "ContentPrefs | None" = None) -> str:
+    # Build a compact style string from prefs
+    style_parts = []
+    if prefs:
+        style_parts.append(f"Story format: {prefs.story_format}")
+        style_parts.append(f"Length: {prefs.story_length}")
+        style_parts.append(f"Tone: {prefs.tone}, Humor: {prefs.humor_level}")
+        style_parts.append(f"Examples: {', '.join(prefs.examples_type) or 'none'}")
+        if prefs.reference_figures:
+            style_parts.append(f"Reference figures: {', '.join(prefs.reference_figures)}")
+        style_parts.append(f"Language: {prefs.language}")
+        style_parts.append(f"Steps: {'yes' if prefs.include_steps else 'no'}")
+        style_parts.append(f"Summary: {prefs.include_summary}")
+        style_parts.append(f"Diagrams: {prefs.diagram_preference}")
+        style_parts.append(f"Explain as: {prefs.explanation_granularity} in {prefs.explanation_format}")
+    style = " | ".join(style_parts)
+
+    prompt = f"Create a short motivational story (<=200 words) that teaches the concept: {topic}. "
+
+    if persona:
+        if isinstance(persona, dict):
+            # Format structured persona
+            style_desc = (
+                f"Role: {persona.get('character_role', 'Explorer')}, "
+                f"Tone: {persona.get('story_tone', 'Adventurous')}, "
+                f"Themes: {', '.join(persona.get('themes', []))}, "
+                f"Difficulty: {persona.get('difficulty', 'Balanced')}, "
+                f"Format: {persona.get('format', 'Comic-style')}"
+            )
+            prompt += f"Style for a child who likes: {style_desc}. "
+        else:
+            # Legacy string persona
+            prompt += f"Style for a child who likes: {persona}. "
+
+    prompt += (
+        f"Prefer the child's interests if given. Keep it safe for ages 8–12.\n\n"
+        f"Presentation prefs: {style or 'default'}"
+    )
+
+    return await llm.chat_text(
+        messages=[
+            {"role":"system","content":"You create kid-friendly educational stories. Respect the given presentation preferences strictly."},
+            {"role":"user","content":prompt},
+        ],
+        temperature=0.6,
+    )
+
+async def story_for(topics: List[str], persona: str | dict | None,
+                    prefs: ContentPrefs | None) -> Tuple[str, str, bool]:
+    """Return (text, cache_key, cache_hit) for a story request, generating on a miss."""
+    key = cache_key(topics, persona, prefs)
+    db = await get_db()
+    cached = await db.story_cache.find_one({"_id": key}, {"text": 1})
+    if cached:
+        metrics.incr("stories.cache_hits")
+        return cached["text"], key, True
+
+    metrics.incr("stories.cache_misses")
+    topics_c, persona_c, prefs_c = canonical(topics, persona, prefs)
+    text = await generate_story(", ".join(topics_c) or "today's topic", persona_c,
+                                prefs=ContentPrefs(**prefs_c) if prefs_c else None)
+    # a concurrent generator for the same key may have won; keep the first story
+    await db.story_cache.update_one(
+        {"_id": key},
+        {"$setOnInsert": {"text": text, "topics": topics_c, "persona": persona_c,
+                          "prompt_version": STORY_PROMPT_VERSION, "created_at": datetime.now(timezone.utc)}},
+        upsert=True,
+    )
+    return text, key, False
+
+
+# ----------------------------
+# Pre-warm
+# ----------------------------
+
+async def student_request(student: Dict[str, Any]) -> Tuple[str | dict | None, ContentPrefs | None]:
+    school_p = await refcache.get_school_prefs(student["school_tenant"]) if student.get("school_tenant") else None
+    return student.get("story_persona"), merge_prefs(school_p, student)
+
+async def prewarm_section(tenant: str, daily_id: str, concurrency: Optional[int] = None) -> Dict[str, int]:
+    """Generate one cached story per distinct persona cluster in the daily class's section."""
+    daily = await refcache.get_daily(tenant, daily_id)
+    if not daily or not daily.get("topics"):
+        return {"students": 0, "clusters": 0, "generated": 0}
+    db = await get_db()
+    students = await db.students.find(
+        {"class_no": daily["class_no"], "section": daily["section"], "school_tenant": tenant},
+        {"student_id": 1, "school_tenant": 1, "story_persona": 1, "content_prefs": 1},
+    ).to_list(None)
+
+    clusters: Dict[str, Tuple[str | dict | None, ContentPrefs | None]] = {}
+    for s in students:
+        persona, prefs = await student_request(s)
+        clusters.setdefault(cache_key(daily["topics"], persona, prefs), (persona, prefs))
+
+    existing = {d["_id"] async for d in db.story_cache.find({"_id": {"$in": list(clusters)}}, {"_id": 1})}
+    sem = asyncio.Semaphore(concurrency or settings.STORY_PREWARM_CONCURRENCY)
+
+    async def warm(persona, prefs):
+        async with sem:
+            try:
+                await story_for(daily["topics"], persona, prefs)
+                return 1
+            except Exception as e:
+                print(f"[stories] prewarm {daily_id} failed: {e}")
+                return 0
+
+    generated = await asyncio.gather(*(warm(p, pr) for k, (p, pr) in clusters.items() if k not in existing))
+    metrics.incr("stories.prewarm_generated", sum(generated))
+    stats = {"students": len(students), "clusters": len(clusters), "generated": sum(generated)}
+    print(f"[stories] prewarm {daily_id}: {stats}")
+    return stats
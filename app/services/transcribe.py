@@ -1,64 +1,118 @@
+import asyncio
 import os
+import subprocess
 import tempfile
 import threading
-from typing import Optional, List
+from typing import Any, Dict, Optional, List, Tuple
+
+from urllib.parse import urlsplit, unquote
 
 import azure.cognitiveservices.speech as speechsdk
+from azure.storage.blob import BlobClient
 from ..core.config import settings
+from .segmenter import Recognizer, transcribe_segmented
 
 def _mask(s: str, keep=6): return s[:keep] + "…" if s else ""
 
+_CHUNK = 4 * 1024 * 1024
+
+def download_blob(blob_url: str, dest_path: str) -> None:
+    """
+    Download an Azure blob straight to `dest_path` in ranged chunks fetched in
+    parallel, privately via AZURE_BLOB_CONN_STR or through a SAS URL.
+    Memory use is bounded by chunk size x concurrency, not blob size.
+    """
+    conn_str = settings.AZURE_BLOB_CONN_STR
+    opts = {"max_single_get_size": _CHUNK, "max_chunk_get_size": _CHUNK}
+    if conn_str:
+        container_name, blob_name = unquote(urlsplit(blob_url).path.lstrip("/")).split("/", 1)
+        bc = BlobClient.from_connection_string(conn_str, container_name=container_name, blob_name=blob_name, **opts)
+    else:
+        # has SAS in the URL
+        bc = BlobClient.from_blob_url(blob_url, **opts)
+    with open(dest_path, "wb") as f:
+        bc.download_blob(max_concurrency=settings.BLOB_DOWNLOAD_CONCURRENCY).readinto(f)
+
 def _to_wav_pcm_16k_mono(src_path: str) -> Optional[str]:
-    """Transcode to WAV PCM 16k mono via ffmpeg (pydub)."""
-    try:
-        from pydub import AudioSegment
-    except Exception as e:
-        print("[speech] pydub not available:", e)
-        return None
+    """
+    Transcode to WAV PCM 16k mono with an ffmpeg subprocess. ffmpeg streams
+    file-to-file, so nothing is decoded into this process's memory.
+    """
+    fd, out_path = tempfile.mkstemp(suffix=".wav"); os.close(fd)
+    cmd = [settings.FFMPEG_BIN, "-nostdin", "-v", "error", "-y", "-i", src_path,
+           "-ac", "1", "-ar", "16000", "-sample_fmt", "s16", "-f", "wav", out_path]
     try:
-        audio = AudioSegment.from_file(src_path)  # mp3/m4a/ogg/…
-        audio = audio.set_frame_rate(16000).set_channels(1).set_sample_width(2)
-        fd, out_path = tempfile.mkstemp(suffix=".wav"); os.close(fd)
-        audio.export(out_path, format="wav")
+        proc = subprocess.run(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                              stderr=subprocess.PIPE, timeout=settings.FFMPEG_TIMEOUT_SECONDS)
+        if proc.returncode != 0:
+            print(f"[speech] ffmpeg conversion failed: {proc.stderr.decode(errors='replace')[-500:]}")
+            os.remove(out_path)
+            return None
         return out_path
-    except Exception as e:
-        print(f"[speech] ffmpeg/pydub conversion failed: {e}")
+    except (OSError, subprocess.TimeoutExpired) as e:
+        print(f"[speech] ffmpeg not available or timed out: {e}")
+        try: os.remove(out_path)
+        except OSError: pass
         return None
 
-def _continuous_transcribe(wav_path: str, speech_config: "speechsdk.SpeechConfig") -> str:
-    """Consume the full file with continuous recognition and join results."""
+def _recognize_utterances(wav_path: str, speech_config: "speechsdk.SpeechConfig") -> List[Tuple[float, str]]:
+    """Consume the full file with continuous recognition; returns [(offset_seconds, text), ...]."""
     audio_config = speechsdk.audio.AudioConfig(filename=wav_path)
     recognizer = speechsdk.SpeechRecognizer(speech_config=speech_config, audio_config=audio_config)
 
     done = threading.Event()
-    lines: List[str] = []
+    lines: List[Tuple[float, str]] = []
+    errors: List[str] = []
 
     def on_recognized(evt: speechsdk.SpeechRecognitionEventArgs):
         if evt.result.reason == speechsdk.ResultReason.RecognizedSpeech and evt.result.text:
-            lines.append(evt.result.text)
+            lines.append((evt.result.offset / 1e7, evt.result.text))  # offset is in 100 ns ticks
 
     def on_stop(evt): done.set()
 
+    def on_canceled(evt):
+        details = evt.cancellation_details
+        if details.reason == speechsdk.CancellationReason.Error:
+            errors.append(f"{details.error_code}: {details.error_details}")
+        done.set()
+
     recognizer.recognized.connect(on_recognized)
     recognizer.session_stopped.connect(on_stop)
-    recognizer.canceled.connect(on_stop)
+    recognizer.canceled.connect(on_canceled)
 
     recognizer.start_continuous_recognition()
     done.wait()           # wait until end-of-file
     recognizer.stop_continuous_recognition()
-    return " ".join(lines).strip()
+    if errors:
+        raise RuntimeError(f"speech recognition canceled: {errors[0]}")
+    return lines
 
-async def transcribe_wav(file_path: str) -> str:
-    key = (settings.AZURE_SPEECH_KEY or "").strip()
-    region = (settings.AZURE_SPEECH_REGION or "").strip()
-    if not key or not region:
-        print("[speech] Missing AZURE_SPEECH_KEY/REGION"); return ""
+def _continuous_transcribe(wav_path: str, speech_config: "speechsdk.SpeechConfig") -> str:
+    """Consume the full file with continuous recognition and join results."""
+    return " ".join(text for _, text in _recognize_utterances(wav_path, speech_config)).strip()
+
+def azure_recognizer(speech_config: "speechsdk.SpeechConfig") -> Recognizer:
+    return lambda wav_path: _recognize_utterances(wav_path, speech_config)
+
+def transcribe_file_segments(file_path: str, recognizer: Optional[Recognizer] = None) -> Tuple[str, List[Dict[str, Any]]]:
+    """
+    Blocking transcode + recognition; run it off the event loop.
+    Returns (text, segments) where segments carry start/end seconds. With
+    TRANSCRIBE_MODE="segmented" the audio is split at silences and recognized in
+    parallel; otherwise one recognizer session consumes the whole file.
+    Raises RuntimeError with the cause when the file can't be recognized.
+    """
+    if recognizer is None:
+        key = (settings.AZURE_SPEECH_KEY or "").strip()
+        region = (settings.AZURE_SPEECH_REGION or "").strip()
+        if not key or not region:
+            raise RuntimeError("Missing AZURE_SPEECH_KEY/REGION")
     if not os.path.exists(file_path):
-        print(f"[speech] File not found: {file_path}"); return ""
+        raise RuntimeError(f"Audio file not found: {file_path}")
 
     try:
         size = os.path.getsize(file_path)
-        print(f"[speech] using region={region}, key={_mask(key)}, file_size={size} bytes, path={file_path}")
+        print(f"[speech] mode={settings.TRANSCRIBE_MODE}, file_size={size} bytes, path={file_path}")
     except Exception:
         pass
 
@@ -66,19 +120,36 @@ async def transcribe_wav(file_path: str) -> str:
     wav_path = _to_wav_pcm_16k_mono(file_path) or file_path
 
     try:
-        speech_config = speechsdk.SpeechConfig(subscription=key, region=region)
-        # Optional: set language if your content is specific
-        # speech_config.speech_recognition_language = "en-IN"
+        if recognizer is None:
+            speech_config = speechsdk.SpeechConfig(subscription=key, region=region)
+            # Optional: set language if your content is specific
+            # speech_config.speech_recognition_language = "en-IN"
+            recognizer = azure_recognizer(speech_config)
 
-        text = _continuous_transcribe(wav_path, speech_config)
+        if settings.TRANSCRIBE_MODE == "segmented":
+            text, segments = transcribe_segmented(wav_path, recognizer)
+        else:
+            utterances = recognizer(wav_path)
+            segments = [{"start": round(o, 2), "text": t} for o, t in utterances]
+            text = " ".join(t for _, t in utterances).strip()
         if not text:
-            print("[speech] continuous recognition produced empty text")
-        return text
+            print("[speech] recognition produced empty text")
+        return text, segments
     except Exception as e:
         print(f"[speech] Exception during recognition: {e}")
-        return ""
+        raise RuntimeError(f"Speech recognition failed: {e}") from e
     finally:
         # remove temp wav if we created one
         if wav_path != file_path:
             try: os.remove(wav_path)
             except Exception: pass
+
+def transcribe_file(file_path: str) -> str:
+    """Transcript text, or "" when the file can't be recognized."""
+    try:
+        return transcribe_file_segments(file_path)[0]
+    except RuntimeError:
+        return ""
+
+async def transcribe_wav(file_path: str) -> str:
+    return await asyncio.to_thread(transcribe_file, file_path)
@@ -0,0 +1,215 @@
+"""
+Background transcription jobs.
+
+Endpoints enqueue a job in `transcribe_jobs` and return immediately. Each app
+process runs TRANSCRIBE_WORKERS workers that claim queued jobs atomically and run
+download/transcode/recognition on a dedicated thread pool, so the event loop is
+never blocked. Running jobs heartbeat; a job whose heartbeat is older than
+TRANSCRIBE_LEASE_SECONDS (e.g. its process restarted) goes back to the queue,
+at most TRANSCRIBE_MAX_ATTEMPTS times before it is failed as a poison job.
+On shutdown, `stop` lets running jobs finish for TRANSCRIBE_STOP_GRACE_SECONDS
+and puts the rest back on the queue with their spooled audio left in place.
+
+Job states: queued -> running -> done | failed
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+from ..core import metrics
+from ..core.config import settings
+from ..db.mongo import get_db
+from .transcribe import download_blob, transcribe_file_segments
+
+TERMINAL = ("done", "failed")
+
+_pool: ThreadPoolExecutor | None = None
+_workers: List[asyncio.Task] = []
+_wakeup: asyncio.Event | None = None
+_stopping = False
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+def spool_path(suffix: str) -> str:
+    """A path under TRANSCRIBE_SPOOL_DIR that survives restarts (unlike tempfiles)."""
+    os.makedirs(settings.TRANSCRIBE_SPOOL_DIR, exist_ok=True)
+    return os.path.join(settings.TRANSCRIBE_SPOOL_DIR, f"{uuid.uuid4().hex}{suffix}")
+
+def remove_spool(path: Optional[str]) -> None:
+    if path:
+        try: os.remove(path)
+        except OSError: pass
+
+
+# ----------------------------
+# Submit / query
+# ----------------------------
+
+async def submit(*, daily_id: str, tenant: str, source_path: Optional[str] = None,
+                 blob_url: Optional[str] = None, suffix: str = ".mp3") -> str:
+    """Persist a queued job for a spooled upload or a blob URL; returns the job id."""
+    db = await get_db()
+    now = _now()
+    res = await db.transcribe_jobs.insert_one({
+        "daily_id": daily_id,
+        "tenant": tenant,
+        "source": "blob" if blob_url else "upload",
+        "source_path": source_path,
+        "blob_url": blob_url,
+        "suffix": suffix,
+        "status": "queued",
+        "attempts": 0,
+        "created_at": now,
+        "updated_at": now,
+    })
+    metrics.incr("transcribe_jobs.submitted")
+    if _wakeup is not None:
+        _wakeup.set()
+    return str(res.inserted_id)
+
+async def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    if not ObjectId.is_valid(job_id):
+        return None
+    db = await get_db()
+    doc = await db.transcribe_jobs.find_one({"_id": ObjectId(job_id)}, {"source_path": 0})
+    if doc:
+        doc["id"] = str(doc.pop("_id"))
+    return doc
+
+
+# ----------------------------
+# Workers
+# ----------------------------
+
+async def _claim() -> Optional[Dict[str, Any]]:
+    db = await get_db()
+    now = _now()
+    stale = now - timedelta(seconds=settings.TRANSCRIBE_LEASE_SECONDS)
+    max_attempts = settings.TRANSCRIBE_MAX_ATTEMPTS
+    # orphaned too often (e.g. the job keeps killing its worker): give up on it
+    reaped = await db.transcribe_jobs.update_many(
+        {"status": "running", "heartbeat_at": {"$lt": stale}, "attempts": {"$gte": max_attempts}},
+        {"$set": {"status": "failed", "error": f"Abandoned after {max_attempts} attempts (worker lost mid-job)",
+                  "finished_at": now, "updated_at": now}},
+    )
+    if reaped.modified_count:
+        metrics.incr("transcribe_jobs.failed", reaped.modified_count)
+    return await db.transcribe_jobs.find_one_and_update(
+        {"$or": [
+            {"status": "queued"},
+            {"status": "running", "heartbeat_at": {"$lt": stale}, "attempts": {"$lt": max_attempts}},  # orphaned by a restart
+        ]},
+        {"$set": {"status": "running", "started_at": now, "heartbeat_at": now, "updated_at": now},
+         "$inc": {"attempts": 1}},
+        sort=[("created_at", 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+async def _heartbeat(job_id: ObjectId) -> None:
+    db = await get_db()
+    while True:
+        await asyncio.sleep(settings.TRANSCRIBE_LEASE_SECONDS / 4)
+        await db.transcribe_jobs.update_one({"_id": job_id, "status": "running"},
+                                            {"$set": {"heartbeat_at": _now()}})
+
+def _process(job: Dict[str, Any], path: str) -> Tuple[str, List[Dict[str, Any]]]:
+    """Blocking part of a job: fetch the audio if needed, then transcribe it."""
+    if job["source"] == "blob" and not os.path.exists(path):
+        download_blob(job["blob_url"], path)
+    return transcribe_file_segments(path)
+
+async def _run(job: Dict[str, Any]) -> None:
+    db = await get_db()
+    path = job.get("source_path")
+    if job["source"] == "blob" and not (path and os.path.exists(path)):
+        path = spool_path(job.get("suffix") or ".mp3")
+    beat = asyncio.create_task(_heartbeat(job["_id"]))
+    try:
+        text, segments = await asyncio.get_running_loop().run_in_executor(_pool, _process, job, path)
+        if not text:
+            raise RuntimeError("Speech recognition returned empty. Try clearer audio or verify ffmpeg is installed.")
+        transcript = {"daily_id": job["daily_id"], "text": text, "segments": segments}
+        if job["source"] == "blob":
+            transcript.update(source="blob", blob_url=job["blob_url"])
+        res = await db.transcripts.insert_one(transcript)
+        await db.transcribe_jobs.update_one({"_id": job["_id"]}, {"$set": {
+            "status": "done", "transcript_id": str(res.inserted_id), "text_len": len(text),
+            "finished_at": _now(), "updated_at": _now(),
+        }})
+        metrics.incr("transcribe_jobs.done")
+        remove_spool(path)
+    except asyncio.CancelledError:
+        # shutting down mid-job: hand it back without charging an attempt, and keep
+        # the spooled audio for whichever worker claims it next
+        await asyncio.shield(db.transcribe_jobs.update_one(
+            {"_id": job["_id"], "status": "running"},
+            {"$set": {"status": "queued", "updated_at": _now()}, "$inc": {"attempts": -1}},
+        ))
+        metrics.incr("transcribe_jobs.requeued")
+        raise
+    except Exception as e:
+        print(f"[transcribe job {job['_id']}] failed: {e}")
+        await db.transcribe_jobs.update_one({"_id": job["_id"]}, {"$set": {
+            "status": "failed", "error": str(e), "finished_at": _now(), "updated_at": _now(),
+        }})
+        metrics.incr("transcribe_jobs.failed")
+        remove_spool(path)
+    finally:
+        beat.cancel()
+
+async def _worker() -> None:
+    while not _stopping:
+        try:
+            job = await _claim()
+        except Exception as e:
+            print(f"[transcribe worker] claim failed: {e}")
+            job = None
+        if job is None:
+            if _stopping:
+                return
+            _wakeup.clear()
+            try:
+                await asyncio.wait_for(_wakeup.wait(), timeout=settings.TRANSCRIBE_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            continue
+        await _run(job)
+
+async def start() -> None:
+    global _pool, _wakeup, _stopping
+    if _workers:
+        return
+    _stopping = False
+    _pool = ThreadPoolExecutor(max_workers=settings.TRANSCRIBE_WORKERS, thread_name_prefix="transcribe")
+    _wakeup = asyncio.Event()
+    for _ in range(settings.TRANSCRIBE_WORKERS):
+        _workers.append(asyncio.create_task(_worker()))
+
+async def stop() -> None:
+    """
+    Stop claiming work and wait up to TRANSCRIBE_STOP_GRACE_SECONDS for running
+    jobs. Jobs still running after that are requeued; their threads are left to
+    finish on their own and their results are discarded.
+    """
+    global _stopping
+    _stopping = True
+    if _wakeup is not None:
+        _wakeup.set()
+    if _workers:
+        _, pending = await asyncio.wait(_workers, timeout=settings.TRANSCRIBE_STOP_GRACE_SECONDS)
+        for t in pending:
+            t.cancel()
+        await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
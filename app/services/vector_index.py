@@ -0,0 +1,188 @@
+"""
+Local in-process vector index for `cbse_docs`.
+
+One partition per (class_no, subject): a contiguous, L2-normalized float32
+matrix plus row metadata. Partitions are built from Mongo on first use, saved
+under VECTOR_INDEX_DIR and memory-mapped on later loads. A top-k cosine query is
+one matmul plus argpartition. Writes through `upsert_cbse_docs` update loaded
+partitions in place; `flush()` persists them. A partition is rebuilt from Mongo
+whenever the slice's version in `cbse_slices` moves past the one it was built
+against (see semantic_cache.docs_version), in-process edits or not.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import re
+import time
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from ..core.config import settings
+from ..db.mongo import get_db
+from . import semantic_cache
+
+_META_FIELDS = ("text", "chapter", "subject", "class_no", "page", "source_pdf")
+
+PartitionKey = Tuple[int, str]
+
+
+class _Partition:
+    def __init__(self, ids: List[str], meta: List[Dict[str, Any]], matrix: np.ndarray, version: int):
+        self.ids = ids
+        self.meta = meta
+        self.matrix = matrix
+        self.version = version
+        self.pos = {_id: i for i, _id in enumerate(ids)}
+        self.dirty = False
+
+    def upsert_many(self, rows: List[Tuple[str, Dict[str, Any], np.ndarray]]) -> None:
+        """Update existing rows in place and append new ones with a single vstack."""
+        if not self.matrix.flags.writeable:
+            self.matrix = np.array(self.matrix)  # detach from the read-only mmap
+        new_vecs: List[np.ndarray] = []
+        for _id, meta, vec in rows:
+            row = self.pos.get(_id)
+            if row is None:
+                self.pos[_id] = len(self.ids)
+                self.ids.append(_id)
+                self.meta.append(meta)
+                new_vecs.append(vec)
+            elif row >= len(self.matrix):  # added earlier in this same batch
+                self.meta[row] = meta
+                new_vecs[row - len(self.matrix)] = vec
+            else:
+                self.meta[row] = meta
+                self.matrix[row] = vec
+        if new_vecs:
+            added = np.stack(new_vecs).astype(np.float32, copy=False)
+            self.matrix = np.vstack([self.matrix, added]) if self.matrix.size else added
+        self.dirty = True
+
+    def search(self, q: np.ndarray, k: int) -> List[Dict[str, Any]]:
+        n = len(self.ids)
+        if n == 0:
+            return []
+        scores = self.matrix @ q
+        k = min(k, n)
+        top = np.argpartition(-scores, k - 1)[:k] if k < n else np.arange(n)
+        top = top[np.argsort(-scores[top])]
+        return [{**self.meta[i], "score": float(scores[i])} for i in top]
+
+
+_partitions: Dict[PartitionKey, _Partition] = {}
+_locks: Dict[PartitionKey, asyncio.Lock] = {}
+
+
+def _normalize(m: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(m, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (m / norms).astype(np.float32, copy=False)
+
+def _base(key: PartitionKey) -> str:
+    class_no, subject = key
+    slug = re.sub(r"[^a-z0-9]+", "-", subject.lower()).strip("-")
+    return os.path.join(settings.VECTOR_INDEX_DIR, f"{class_no}_{slug}")
+
+def _save(key: PartitionKey, part: _Partition) -> None:
+    """
+    Write a new generation without touching files other workers may have
+    memory-mapped: the matrix goes to a fresh "<base>.<gen>.npy", then the meta
+    file naming it is swapped in with os.replace, so readers always see a
+    matching (meta, matrix) pair. Older generations are unlinked afterwards
+    (mapped pages stay valid for processes that still use them).
+    """
+    base = _base(key)
+    os.makedirs(os.path.dirname(base), exist_ok=True)
+    gen = f"{time.time_ns():x}"
+    npy = f"{base}.{gen}.npy"
+    tmp = f"{npy}.tmp"
+    with open(tmp, "wb") as f:
+        np.save(f, np.ascontiguousarray(part.matrix, dtype=np.float32))
+    os.replace(tmp, npy)
+
+    meta_tmp = f"{base}.meta.json.{gen}.tmp"
+    with open(meta_tmp, "w", encoding="utf-8") as f:
+        json.dump({"matrix": os.path.basename(npy), "version": part.version, "ids": part.ids, "meta": part.meta}, f)
+    os.replace(meta_tmp, base + ".meta.json")
+    part.dirty = False
+
+    prefix = os.path.basename(base) + "."
+    for name in os.listdir(os.path.dirname(base)):
+        if name.startswith(prefix) and name.endswith(".npy") and name != os.path.basename(npy):
+            try:
+                os.unlink(os.path.join(os.path.dirname(base), name))
+            except OSError:
+                pass  # e.g. still mapped on a platform that forbids unlinking it
+
+def _load(key: PartitionKey) -> _Partition | None:
+    base = _base(key)
+    try:
+        with open(base + ".meta.json", encoding="utf-8") as f:
+            m = json.load(f)
+        npy = os.path.join(os.path.dirname(base), m["matrix"]) if m.get("matrix") else base + ".npy"
+        matrix = np.load(npy, mmap_mode="r")
+    except FileNotFoundError:
+        return None
+    if matrix.shape[0] != len(m["ids"]):
+        return None  # torn legacy pair; rebuild
+    return _Partition(m["ids"], m["meta"], matrix, m.get("version", -1))  # legacy files: always stale
+
+async def _build(key: PartitionKey, version: int) -> _Partition:
+    class_no, subject = key
+    db = await get_db()
+    ids, meta, vecs = [], [], []
+    projection = {"embedding": 1, **{f: 1 for f in _META_FIELDS}}
+    async for doc in db.cbse_docs.find({"class_no": class_no, "subject": subject}, projection):
+        if not doc.get("embedding"):
+            continue
+        ids.append(str(doc["_id"]))
+        meta.append({f: doc.get(f) for f in _META_FIELDS})
+        vecs.append(doc["embedding"])
+    matrix = _normalize(np.asarray(vecs, dtype=np.float32)) if vecs else np.zeros((0, 0), dtype=np.float32)
+    part = _Partition(ids, meta, matrix, version)
+    if ids:
+        await asyncio.to_thread(_save, key, part)
+        part = await asyncio.to_thread(_load, key) or part
+    return part
+
+async def get_partition(class_no: int, subject: str) -> _Partition:
+    """Current partition for the slice: loaded from disk or (re)built when its cbse_docs version moved."""
+    key = (class_no, subject)
+    version = await semantic_cache.docs_version(class_no, subject)
+    part = _partitions.get(key)
+    if part is not None and part.version == version:
+        return part
+    async with _locks.setdefault(key, asyncio.Lock()):
+        part = _partitions.get(key)
+        if part is None:
+            part = await asyncio.to_thread(_load, key)
+        if part is None or part.version != version:
+            part = await _build(key, version)
+        _partitions[key] = part
+        return part
+
+async def search(qvec: List[float], class_no: int, subject: str, k: int = 4) -> List[Dict[str, Any]]:
+    part = await get_partition(class_no, subject)
+    q = _normalize(np.asarray(qvec, dtype=np.float32))
+    return part.search(q, k)
+
+def upsert(docs: List[Dict[str, Any]]) -> None:
+    """Apply freshly written cbse_docs to any partitions already loaded in this process."""
+    by_part: Dict[PartitionKey, List[Tuple[str, Dict[str, Any], np.ndarray]]] = {}
+    for doc in docs:
+        key = (doc["class_no"], doc["subject"])
+        if key not in _partitions:
+            continue
+        vec = _normalize(np.asarray(doc["embedding"], dtype=np.float32))
+        by_part.setdefault(key, []).append((str(doc["_id"]), {f: doc.get(f) for f in _META_FIELDS}, vec))
+    for key, rows in by_part.items():
+        _partitions[key].upsert_many(rows)
+
+async def flush() -> None:
+    """Persist partitions changed since they were loaded."""
+    for key, part in list(_partitions.items()):
+        if part.dirty:
+            await asyncio.to_thread(_save, key, part)
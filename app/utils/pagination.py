@@ -1,5 +1,104 @@
-from fastapi import Query
-from typing import Optional
+"""
+Keyset (cursor) pagination.
 
-def pagination_params(skip: int = Query(0, ge=0), limit: int = Query(20, ge=1, le=200)):
-    return {"skip": skip, "limit": limit}
+List endpoints sort on an indexed key plus `_id` as a tie-breaker and continue
+from the last row seen, so every page costs the same index seek regardless of
+depth. The continuation token is opaque: base64url JSON of the last row's sort
+values, HMAC-signed with JWT_SECRET and bound to the endpoint's scope. It is
+returned in the `X-Next-Cursor` response header (absent on the last page).
+"""
+import base64
+import hashlib
+import hmac
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import json_util
+from fastapi import HTTPException, Query, Response
+
+from ..core.config import settings
+
+MAX_PAGE_SIZE = 200
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def page_params(default_limit: int = 20):
+    def _params(cursor: Optional[str] = Query(None, description=f"Opaque token from the {NEXT_CURSOR_HEADER} header"),
+                limit: int = Query(default_limit, ge=1, le=MAX_PAGE_SIZE)):
+        return {"cursor": cursor, "limit": limit}
+    return _params
+
+pagination_params = page_params()
+
+
+def _sign(scope: str, payload: bytes) -> str:
+    mac = hmac.new(settings.JWT_SECRET.encode(), scope.encode() + b"|" + payload, hashlib.sha256)
+    return base64.urlsafe_b64encode(mac.digest()[:16]).decode().rstrip("=")
+
+def encode_cursor(scope: str, values: Dict[str, Any]) -> str:
+    payload = base64.urlsafe_b64encode(json_util.dumps(values).encode()).decode().rstrip("=")
+    return f"{payload}.{_sign(scope, payload.encode())}"
+
+def decode_cursor(scope: str, token: str) -> Dict[str, Any]:
+    try:
+        payload, sig = token.split(".", 1)
+        if not hmac.compare_digest(sig, _sign(scope, payload.encode())):
+            raise ValueError("bad signature")
+        return json_util.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _keyset(sort_field: str, direction: int, last: Dict[str, Any]) -> Dict[str, Any]:
+    """Rows after `last` in (sort_field, _id) order."""
+    op = "$gt" if direction == 1 else "$lt"
+    if sort_field == "_id":
+        return {"_id": {op: last["_id"]}}
+    v = last.get("v")
+    # {field: None} matches null and missing, which sort together before every other value
+    tie = {sort_field: v, "_id": {op: last["_id"]}}
+    if v is None:
+        return {"$or": [{sort_field: {"$ne": None}}, tie]} if direction == 1 else tie
+    after = [{sort_field: {op: v}}, tie]
+    if direction == -1:
+        after.append({sort_field: None})
+    return {"$or": after}
+
+async def paginate(collection, filt: Dict[str, Any], *, scope: str, cursor: Optional[str], limit: int,
+                   sort_field: str = "_id", direction: int = 1,
+                   projection: Optional[Dict[str, Any]] = None, skip: int = 0) -> Tuple[List[dict], Optional[str]]:
+    """
+    Fetch one page ordered by (sort_field, _id). Returns (docs, next_cursor).
+    At most `limit` (capped at MAX_PAGE_SIZE) documents are materialized.
+    Rows with a null or missing sort_field are included (they sort first).
+    `skip` is an offset for callers of the older skip/limit API and is only
+    applied to the first page (without a cursor).
+    """
+    limit = min(limit, MAX_PAGE_SIZE)
+    query = filt
+    if cursor:
+        keyset = _keyset(sort_field, direction, decode_cursor(scope, cursor))
+        query = {"$and": [filt, keyset]} if filt else keyset
+
+    sort = [("_id", direction)] if sort_field == "_id" else [(sort_field, direction), ("_id", direction)]
+    find = collection.find(query, projection).sort(sort)
+    if skip and not cursor:
+        find = find.skip(skip)
+    docs = await find.limit(limit + 1).to_list(limit + 1)
+
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        tail = docs[-1]
+        values = {"_id": tail["_id"]}
+        if sort_field != "_id":
+            values["v"] = tail.get(sort_field)
+        next_cursor = encode_cursor(scope, values)
+    return docs, next_cursor
+
+def set_next_cursor(response: Response, next_cursor: Optional[str]) -> None:
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+
+def next_cursor_headers(next_cursor: Optional[str]) -> Dict[str, str]:
+    """Headers for endpoints that build their own Response."""
+    return {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else {}
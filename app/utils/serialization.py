@@ -0,0 +1,58 @@
+"""
+Read-side serialization.
+
+Hot list endpoints don't build a Pydantic model per document. `ReadShape`
+derives a Mongo projection and the field defaults from the response model once;
+each document is then filled with defaults and encoded straight to JSON bytes
+with orjson (ObjectId -> str, dates -> ISO) and returned as a raw Response.
+The decorator's `response_model` still documents the shape in OpenAPI.
+"""
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Optional, Type
+
+import orjson
+from bson import ObjectId
+from fastapi import Response
+from pydantic import BaseModel
+
+
+def json_default(o: Any) -> Any:
+    """`default=` hook for the encoders, covering the BSON types stored by the app."""
+    if isinstance(o, ObjectId):
+        return str(o)
+    if isinstance(o, (datetime, date)):
+        return o.isoformat()
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+def ndjson_line(doc: dict) -> bytes:
+    """One document as a newline-terminated compact JSON line."""
+    return orjson.dumps(doc, default=json_default, option=orjson.OPT_APPEND_NEWLINE)
+
+
+class ReadShape:
+    """Projection and defaults of a response model, computed once per model."""
+
+    def __init__(self, model: Type[BaseModel]):
+        self.projection: Dict[str, int] = {}
+        self.defaults: Dict[str, Any] = {}
+        self.date_fields: List[str] = []
+        for name, field in model.model_fields.items():
+            key = field.alias or name
+            if key != "_id":
+                self.projection[key] = 1
+            if not field.is_required():
+                self.defaults[key] = field.get_default(call_default_factory=True)
+            if field.annotation is date:
+                self.date_fields.append(key)
+
+    def row(self, doc: Dict[str, Any]) -> Dict[str, Any]:
+        out = {**self.defaults, **doc}
+        for key in self.date_fields:
+            v = out.get(key)
+            if isinstance(v, datetime):  # model would truncate to the date
+                out[key] = v.date()
+        return out
+
+    def response(self, docs: Iterable[Dict[str, Any]], headers: Optional[Dict[str, str]] = None) -> Response:
+        body = orjson.dumps([self.row(d) for d in docs], default=json_default)
+        return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,58 @@
+"""
+Peak memory of the audio path for recordings of increasing length.
+
+Writes a synthetic 44.1 kHz stereo WAV of each length to disk (in chunks),
+transcodes it with the ffmpeg path used by transcription jobs, and prints peak
+RSS of this process and of the ffmpeg child. Both should stay flat as the
+recording gets longer.
+
+Run with: python bench_audio_memory.py --minutes 10 30 60
+"""
+import argparse
+import os
+import resource
+import tempfile
+import time
+import wave
+
+import numpy as np
+
+from app.services.transcribe import _to_wav_pcm_16k_mono
+
+RATE = 44100
+
+
+def _write_wav(path: str, minutes: float) -> None:
+    rng = np.random.default_rng(0)
+    with wave.open(path, "wb") as w:
+        w.setnchannels(2); w.setsampwidth(2); w.setframerate(RATE)
+        remaining = int(minutes * 60 * RATE)
+        while remaining:
+            n = min(remaining, RATE * 10)
+            w.writeframes((rng.normal(0, 3000, size=(n, 2))).astype(np.int16).tobytes())
+            remaining -= n
+
+def _maxrss_mb(who) -> float:
+    return resource.getrusage(who).ru_maxrss / 1024  # Linux reports KiB
+
+def main(lengths):
+    print(f"{'minutes':>8} {'src MB':>8} {'secs':>6} {'self MB':>8} {'ffmpeg MB':>9}")
+    for minutes in lengths:
+        fd, src = tempfile.mkstemp(suffix=".wav"); os.close(fd)
+        try:
+            _write_wav(src, minutes)
+            t = time.perf_counter()
+            out = _to_wav_pcm_16k_mono(src)
+            elapsed = time.perf_counter() - t
+            if out is None:
+                print("ffmpeg failed; is it on PATH (FFMPEG_BIN)?"); return
+            os.remove(out)
+            print(f"{minutes:>8} {os.path.getsize(src) / 2**20:>8.0f} {elapsed:>6.1f} "
+                  f"{_maxrss_mb(resource.RUSAGE_SELF):>8.0f} {_maxrss_mb(resource.RUSAGE_CHILDREN):>9.0f}")
+        finally:
+            os.remove(src)
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--minutes", type=float, nargs="+", default=[10, 30, 60])
+    main(ap.parse_args().minutes)
@@ -0,0 +1,150 @@
+"""
+Load test for the async LLM gateway against an in-process fake Azure OpenAI.
+
+The fake (an httpx.MockTransport behind the real AsyncAzureOpenAI client)
+answers after --latency-ms, tracks how many requests are in flight per
+deployment and fails a --fail-rate share of first attempts with 429. It checks
+that:
+  - in-flight requests never exceed LLM_MAX_CONCURRENCY,
+  - every call succeeds once its 429s have been retried,
+  - streams hold their slot until they finish, but backoff sleeps don't,
+  - a cheap non-AI route on app.main.app (GET /, through httpx.ASGITransport)
+    keeps its p99 latency while the slow AI calls are queued on the gateway.
+
+No Azure credentials, database or network needed.
+
+Run with: python bench_llm_gateway.py [--calls 200] [--concurrency 8] [--fail-rate 0.2] [--probes 200]
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import httpx
+import numpy as np
+from openai import AsyncAzureOpenAI
+
+from app.core.config import settings
+from app.main import app
+from app.services import llm
+
+
+class FakeAzure:
+    def __init__(self, latency: float, fail_rate: float):
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.in_flight = 0
+        self.peak = 0
+        self.requests = 0
+        self.throttled = 0
+        self._seen = set()
+
+    async def handler(self, request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        self.requests += 1
+        tag = body["messages"][-1]["content"]
+        if tag not in self._seen and random.random() < self.fail_rate:
+            self._seen.add(tag)
+            self.throttled += 1
+            return httpx.Response(429, headers={"retry-after-ms": "1"},
+                                  json={"error": {"code": "429", "message": "throttled"}})
+        self._seen.add(tag)
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+        finally:
+            if not body.get("stream"):
+                self.in_flight -= 1
+        if body.get("stream"):
+            return httpx.Response(200, headers={"content-type": "text/event-stream"},
+                                  stream=_Events(self, ["a", "b", "c"], self.latency))
+        return httpx.Response(200, json={
+            "id": "x", "object": "chat.completion", "created": 0, "model": "fake",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": f"echo {tag}"},
+                         "finish_reason": "stop"}],
+        })
+
+
+class _Events(httpx.AsyncByteStream):
+    """SSE body that stays "in flight" on the fake until fully sent."""
+
+    def __init__(self, fake: FakeAzure, deltas, latency: float):
+        self.fake, self.deltas, self.latency = fake, deltas, latency
+
+    async def __aiter__(self):
+        try:
+            for d in self.deltas:
+                await asyncio.sleep(self.latency / len(self.deltas))
+                chunk = {"id": "x", "object": "chat.completion.chunk", "created": 0, "model": "fake",
+                         "choices": [{"index": 0, "delta": {"content": d}, "finish_reason": None}]}
+                yield f"data: {json.dumps(chunk)}\n\n".encode()
+            yield b"data: [DONE]\n\n"
+        finally:
+            self.fake.in_flight -= 1
+
+
+def _install(fake: FakeAzure) -> None:
+    llm._http = httpx.AsyncClient(transport=httpx.MockTransport(fake.handler))
+    llm._client = AsyncAzureOpenAI(api_key="fake", azure_endpoint="https://fake.openai.azure.com",
+                                   api_version=settings.AZURE_OPENAI_API_VERSION,
+                                   http_client=llm._http, max_retries=0)
+    llm._limits.clear()
+
+async def _one(i: int, stream: bool) -> str:
+    messages = [{"role": "user", "content": f"call {i}"}]
+    if stream:
+        return "".join([d async for d in llm.chat_stream(messages)])
+    return await llm.chat_text(messages)
+
+async def _probe(n: int) -> list:
+    """Latencies of n back-to-back GET / on the app, in ms (startup hooks are not run)."""
+    lat = []
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        for _ in range(n):
+            t = time.perf_counter()
+            r = await client.get("/")
+            lat.append((time.perf_counter() - t) * 1000)
+            assert r.status_code == 200, r.status_code
+            await asyncio.sleep(0.001)
+    return lat
+
+async def main(calls: int, concurrency: int, latency_ms: float, fail_rate: float, probes: int):
+    settings.LLM_MAX_CONCURRENCY = concurrency
+    fake = FakeAzure(latency_ms / 1000, fail_rate)
+    _install(fake)
+
+    idle = await _probe(probes)
+    t0 = time.perf_counter()
+    ai = asyncio.gather(*(_one(i, stream=i % 4 == 0) for i in range(calls)), return_exceptions=True)
+    busy = await _probe(probes)
+    overlapped = not ai.done()
+    results = await ai
+    elapsed = time.perf_counter() - t0
+    errors = [r for r in results if isinstance(r, BaseException)]
+
+    print(f"calls={calls} limit={concurrency} latency={latency_ms:.0f} ms fail_rate={fail_rate:.0%}")
+    print(f"requests={fake.requests} throttled={fake.throttled} peak_in_flight={fake.peak} "
+          f"errors={len(errors)} elapsed={elapsed:.2f} s")
+    print(f"lower bound from the limit alone: {calls / concurrency * latency_ms / 1000:.2f} s")
+    p99_idle, p99_busy = float(np.percentile(idle, 99)), float(np.percentile(busy, 99))
+    print(f"GET / p99: idle={p99_idle:.2f} ms  during AI calls={p99_busy:.2f} ms  ({probes} requests each)")
+    await llm.aclose()
+
+    assert fake.peak <= concurrency, f"concurrency limit exceeded: {fake.peak} > {concurrency}"
+    assert not errors, f"{len(errors)} calls failed, first: {errors[0]!r}"
+    assert fake.requests == calls + fake.throttled, "every throttled call should be retried exactly once"
+    assert overlapped, "AI calls finished before the probes did; raise --calls"
+    assert p99_busy < latency_ms, f"GET / queued behind AI calls: p99 {p99_busy:.2f} ms >= {latency_ms:.0f} ms"
+    print("OK")
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--calls", type=int, default=200)
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--latency-ms", type=float, default=50)
+    ap.add_argument("--fail-rate", type=float, default=0.2)
+    ap.add_argument("--probes", type=int, default=200, help="GET / requests per latency run")
+    a = ap.parse_args()
+    asyncio.run(main(a.calls, a.concurrency, a.latency_ms, a.fail_rate, a.probes))
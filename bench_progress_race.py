@@ -0,0 +1,81 @@
+"""
+Race check for atomic progress updates.
+
+Fires --submits concurrent quiz submits for one (student, daily class) through
+progress.update_progress, interleaved with concurrent "summary viewed" and
+"story generated" activities, then re-reads the progress document and checks
+that no update was lost:
+  - quiz_attempts == number of submits,
+  - quiz_best_score == the highest submitted score,
+  - both activity flags are set and completion matches calculate_completion,
+  - the student's rollup entry holds the final snapshot (no older one won).
+
+Writes to student_progress and the rollup collections under a synthetic
+student and daily id (removed afterwards), so point it at a dev database. The
+server version is printed first; run it against a real mongod, since mocks
+don't reproduce its concurrency.
+
+Run with: python bench_progress_race.py [--submits 50] [--rounds 3] [--tenant demo-school]
+"""
+import argparse
+import asyncio
+import random
+import time
+import uuid
+
+from app.db.mongo import get_db
+from app.services import rollups
+from app.services.progress import calculate_completion, now_iso, update_progress
+
+
+async def _round(db, tenant: str, n: int) -> float:
+    student_id, daily_id = f"race-{uuid.uuid4().hex[:8]}", f"race-daily-{uuid.uuid4().hex[:8]}"
+    daily_class = {"date": now_iso()[:10], "class_no": 7, "section": "A", "subject": "Race"}
+    scores = [float(random.randint(0, 100)) for _ in range(n)]
+    common = dict(student_id=student_id, daily_id=daily_id, daily_class=daily_class, tenant=tenant)
+
+    calls = [update_progress(db, **common, quiz_score=s, quiz_id="race-quiz") for s in scores]
+    calls.insert(random.randrange(len(calls) + 1),
+                 update_progress(db, **common, set_fields={"summary_viewed": True, "summary_viewed_at": now_iso()}))
+    calls.insert(random.randrange(len(calls) + 1),
+                 update_progress(db, **common, set_fields={"story_generated": True, "story_generated_at": now_iso()}))
+    day = rollups._day(daily_class["date"])
+    t = time.perf_counter()
+    await asyncio.gather(*calls)
+    elapsed = time.perf_counter() - t
+
+    try:
+        doc = await db.student_progress.find_one({"student_id": student_id, "daily_id": daily_id})
+        count = await db.student_progress.count_documents({"student_id": student_id, "daily_id": daily_id})
+        assert count == 1, f"{count} progress documents for one (student, daily)"
+        assert doc["quiz_attempts"] == n, f"quiz_attempts={doc['quiz_attempts']}, expected {n}"
+        assert doc["quiz_best_score"] == max(scores), f"quiz_best_score={doc['quiz_best_score']}, expected {max(scores)}"
+        assert doc["quiz_latest_score"] in scores
+        assert doc["summary_viewed"] and doc["story_generated"], "an activity flag was lost"
+        completion, completed = calculate_completion(doc)
+        assert abs(doc["completion_percentage"] - completion) < 1e-6 and doc["is_completed"] == completed
+        rollup = await db.student_daily_rollups.find_one({"_id": rollups.student_rollup_id(tenant, student_id, day)})
+        e = rollup["classes"][rollups._field(daily_id)]
+        assert e["rev"] == doc["rev"] and e["quiz_attempts"] == n, f"rollup kept an older snapshot: {e}"
+    finally:
+        await db.student_progress.delete_many({"student_id": student_id, "daily_id": daily_id})
+        await db.student_daily_rollups.delete_one({"_id": rollups.student_rollup_id(tenant, student_id, day)})
+        await db.class_daily_rollups.delete_one({"_id": rollups.class_rollup_id(tenant, 7, "A", "Race", day)})
+    return elapsed
+
+async def main(submits: int, rounds: int, tenant: str):
+    db = await get_db()
+    info = await db.command("buildInfo")
+    print(f"server: mongod {info.get('version', '?')}")
+    for r in range(rounds):
+        elapsed = await _round(db, tenant, submits)
+        print(f"round {r + 1}: {submits} submits + 2 activities in {elapsed * 1000:.1f} ms, nothing lost")
+    print("OK")
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--submits", type=int, default=50)
+    ap.add_argument("--rounds", type=int, default=3)
+    ap.add_argument("--tenant", default="demo-school")
+    a = ap.parse_args()
+    asyncio.run(main(a.submits, a.rounds, a.tenant))
@@ -0,0 +1,62 @@
+"""
+Compare 40 single POST /quiz/submit calls with one POST /quiz/submit/batch.
+
+Needs a running API and a daily class that already has a quiz for the tenant.
+Writes real quiz_responses/progress for synthetic students (bench-s0..), so
+point it at a dev database.
+
+Run with: python bench_quiz_batch.py --daily-id <id> [--students 40]
+"""
+import argparse
+import asyncio
+import random
+import time
+
+import httpx
+
+HEADERS = {"x-api-key": "dev-local-key"}
+
+
+async def _quiz(client: httpx.AsyncClient, daily_id: str) -> dict:
+    r = await client.get(f"/quiz/{daily_id}")
+    r.raise_for_status()
+    return r.json()
+
+def _answers(quiz: dict) -> dict:
+    return {q["qid"]: [random.choice(q["options"])["key"]] for q in quiz["questions"]}
+
+async def main(base_url: str, tenant: str, daily_id: str, n: int):
+    headers = {**HEADERS, "X-Tenant-ID": tenant}
+    async with httpx.AsyncClient(base_url=base_url, headers=headers, timeout=60) as client:
+        quiz = await _quiz(client, daily_id)
+        subs = [{"student_id": f"bench-s{i}", "responses": _answers(quiz)} for i in range(n)]
+
+        t = time.perf_counter()
+        for s in subs:
+            (await client.post("/quiz/submit", json={"daily_id": daily_id, **s})).raise_for_status()
+        sequential = time.perf_counter() - t
+
+        t = time.perf_counter()
+        rs = await asyncio.gather(*[client.post("/quiz/submit", json={"daily_id": daily_id, **s}) for s in subs])
+        for r in rs:
+            r.raise_for_status()
+        concurrent = time.perf_counter() - t
+
+        t = time.perf_counter()
+        r = await client.post("/quiz/submit/batch", json={"daily_id": daily_id, "submissions": subs})
+        r.raise_for_status()
+        batch = time.perf_counter() - t
+
+    print(f"students={n} questions={len(quiz['questions'])}")
+    print(f"{n} single submits, sequential: {sequential * 1000:8.1f} ms")
+    print(f"{n} single submits, concurrent: {concurrent * 1000:8.1f} ms")
+    print(f"1 batch submit               : {batch * 1000:8.1f} ms  ({sequential / batch:.1f}x vs sequential)")
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--base-url", default="http://localhost:8000/api")
+    ap.add_argument("--tenant", default="demo-school")
+    ap.add_argument("--daily-id", required=True)
+    ap.add_argument("--students", type=int, default=40)
+    a = ap.parse_args()
+    asyncio.run(main(a.base_url, a.tenant, a.daily_id, a.students))
@@ -0,0 +1,85 @@
+"""
+Before/after for QuizService.get_quizzes_by_topic.
+
+Seeds --quizzes quizzes of --questions question ids each under a synthetic
+topic (plus a few generated quizzes with embedded questions), then times:
+  before - the old loop, one questions.find per quiz (N + 1 queries)
+  after  - get_quizzes_by_topic, one $in over all question ids (2 queries)
+and checks both return the same questions (after: in stored order). The seeded
+documents are removed afterwards, so point it at a dev database.
+
+Run with: python bench_quiz_topic.py [--quizzes 50] [--questions 10] [--repeat 20]
+"""
+import argparse
+import asyncio
+import time
+import uuid
+
+import numpy as np
+from bson import ObjectId
+
+from app.db.mongo import get_db
+from app.services.quiz import QuizService
+
+
+async def _before(db, topic: str):
+    """The per-quiz implementation this replaced."""
+    result = []
+    for quiz in await db.quizzes.find({"topic": topic}).to_list(100):
+        ids = [ObjectId(qid) for qid in quiz.get("questions", []) if isinstance(qid, str)]
+        questions = await db.questions.find({"_id": {"$in": ids}}).to_list(length=len(ids))
+        result.append({**quiz, "_id": str(quiz["_id"]), "questions": [{**q, "_id": str(q["_id"])} for q in questions]})
+    return result
+
+async def _seed(db, topic: str, n_quizzes: int, n_questions: int) -> None:
+    questions = [{"_id": ObjectId(), "topic": topic, "question": f"Q{i}?", "correct_answer": "a"}
+                 for i in range(n_quizzes * n_questions)]
+    await db.questions.insert_many(questions)
+    ids = [str(q["_id"]) for q in questions]
+    quizzes = [{"topic": topic, "questions": ids[i * n_questions:(i + 1) * n_questions]} for i in range(n_quizzes)]
+    quizzes += [{"topic": topic, "questions": [{"qid": f"q{j}", "question": f"Embedded {j}?", "correct": ["a"]}
+                                               for j in range(n_questions)]} for _ in range(2)]
+    await db.quizzes.insert_many(quizzes)
+
+def _pct(xs, p):
+    return float(np.percentile(np.asarray(xs) * 1000, p))
+
+async def main(n_quizzes: int, n_questions: int, repeat: int):
+    db = await get_db()
+    topic = f"bench-topic-{uuid.uuid4().hex[:8]}"
+    await _seed(db, topic, n_quizzes, n_questions)
+    try:
+        stored = {str(q["_id"]): q["questions"] for q in await db.quizzes.find({"topic": topic}).to_list(None)}
+        after = await QuizService(db).get_quizzes_by_topic(topic)
+        before = {q["_id"]: q for q in await _before(db, topic)}
+        for quiz in after:
+            ids = stored[quiz["_id"]]
+            if ids and isinstance(ids[0], dict):
+                assert quiz["questions"] == ids, "embedded questions changed"
+                continue  # the old loop could not read these
+            assert [q["_id"] for q in quiz["questions"]] == ids, "question order differs"
+            assert {q["_id"] for q in before[quiz["_id"]]["questions"]} == set(ids)
+        stripped = await QuizService(db).get_quizzes_by_topic(topic, include_answers=False)
+        assert not any(k in q for quiz in stripped for q in quiz["questions"] for k in ("correct", "correct_answer"))
+
+        for name, fn in (("before", lambda: _before(db, topic)),
+                         ("after", lambda: QuizService(db).get_quizzes_by_topic(topic))):
+            lat = []
+            for _ in range(repeat):
+                t = time.perf_counter()
+                await fn()
+                lat.append(time.perf_counter() - t)
+            queries = n_quizzes + 3 if name == "before" else 2
+            print(f"{name:6}: queries={queries:4}  p50={_pct(lat, 50):8.2f} ms  p95={_pct(lat, 95):8.2f} ms")
+    finally:
+        await db.quizzes.delete_many({"topic": topic})
+        await db.questions.delete_many({"topic": topic})
+    print(f"quizzes={n_quizzes} (+2 embedded) questions/quiz={n_questions}")
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--quizzes", type=int, default=50)
+    ap.add_argument("--questions", type=int, default=10)
+    ap.add_argument("--repeat", type=int, default=20)
+    a = ap.parse_args()
+    asyncio.run(main(a.quizzes, a.questions, a.repeat))
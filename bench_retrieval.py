@@ -0,0 +1,111 @@
+"""
+Offline retrieval evaluation for search_cbse: recall@k and latency per mode.
+
+Modes: bm25 (lexical only), vector (embedding + vector search), hybrid (RRF
+fusion, no fast path) and fast (hybrid with the BM25 fast path; also reports
+how often it fired).
+
+Queries come from --queries (JSONL lines {"query": ..., "relevant": [cbse_docs
+_id, ...]}) or are synthesized from a sample of chunks of the slice, each
+relevant to its source chunk only:
+  keyword  - the chunk's 2 rarest terms ("conduction metals")
+  sentence - one sentence of the chunk
+
+Vector modes make real embedding calls; queries embedded by an earlier mode
+come from the embedding cache, so compare latencies of one mode at a time.
+
+Run with: python bench_retrieval.py --class-no 7 --subject Physics [-k 4] [-n 100] [--modes bm25,fast]
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+
+import numpy as np
+
+from app.core import metrics
+from app.core.config import settings
+from app.db.mongo import get_db
+from app.services import bm25, rag
+
+MODES = ("bm25", "vector", "hybrid", "fast")
+
+
+def _pct(xs, p):
+    return float(np.percentile(np.asarray(xs) * 1000, p))
+
+def _doc_id(d, class_no, subject):
+    return rag._cbse_doc_id(subject, class_no, d["chapter"], d["text"], d.get("source_pdf"), d.get("page"))
+
+def _synthesize(part, docs, class_no, subject, n):
+    queries = []
+    for d in random.sample(docs, min(n, len(docs))):
+        relevant = [_doc_id(d, class_no, subject)]
+        words = {}
+        for w in re.findall(r"[^\W_]+", d["text"]):
+            t = bm25.terms(w)
+            if t and t[0] in part.index and not w.isdigit():
+                words.setdefault(t[0], w.lower())
+        rare = sorted(words, key=lambda t: len(part.index[t][0]))[:2]
+        if rare:
+            queries.append(("keyword", " ".join(words[t] for t in rare), relevant))
+        sentences = [s for s in re.split(r"(?<=[.!?])\s+", d["text"]) if len(s.split()) >= 6]
+        if sentences:
+            queries.append(("sentence", random.choice(sentences), relevant))
+    return queries
+
+async def _run(mode, query, class_no, subject, k):
+    if mode == "bm25":
+        return (await bm25.search(query, class_no, subject, k=k)).hits
+    if mode == "vector":
+        return await rag._vector_search(query, class_no, subject, k)
+    settings.RETRIEVAL_MODE = "hybrid"
+    settings.BM25_FAST_PATH = mode == "fast"
+    return await rag.search_cbse(query, class_no, subject, k=k)
+
+async def main(class_no, subject, k, n, modes, queries_path):
+    db = await get_db()
+    docs = await db.cbse_docs.find({"class_no": class_no, "subject": subject},
+                                   {"text": 1, "chapter": 1, "page": 1, "source_pdf": 1}).to_list(None)
+    if not docs:
+        print("No cbse_docs for that slice."); return
+
+    t0 = time.perf_counter()
+    part = await bm25.get_partition(class_no, subject)
+    print(f"BM25 partition: {len(part.meta)} chunks, {len(part.index)} terms in {(time.perf_counter() - t0) * 1000:.0f} ms")
+
+    if queries_path:
+        with open(queries_path, encoding="utf-8") as f:
+            queries = [("labeled", q["query"], q["relevant"]) for q in map(json.loads, f) if q.get("query")]
+    else:
+        queries = _synthesize(part, docs, class_no, subject, n)
+
+    print(f"queries={len(queries)} k={k}")
+    for mode in modes:
+        lat, recall = [], {}
+        fast_before = metrics.get("retrieval.fast_path")
+        for kind, query, relevant in queries:
+            t = time.perf_counter()
+            hits = await _run(mode, query, class_no, subject, k)
+            lat.append(time.perf_counter() - t)
+            got = {_doc_id(h, class_no, subject) for h in hits}
+            recall.setdefault(kind, []).append(len(got & set(relevant)) / max(1, len(relevant)))
+        by_kind = "  ".join(f"{kind}={np.mean(r):.3f}" for kind, r in sorted(recall.items()))
+        line = f"{mode:6}: recall@{k} {by_kind}  p50={_pct(lat, 50):.2f} ms  p95={_pct(lat, 95):.2f} ms"
+        if mode == "fast":
+            line += f"  fast_path={(metrics.get('retrieval.fast_path') - fast_before) / len(queries):.0%}"
+        print(line)
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--class-no", type=int, required=True)
+    ap.add_argument("--subject", required=True)
+    ap.add_argument("-k", type=int, default=4)
+    ap.add_argument("-n", type=int, default=100, help="chunks to synthesize queries from")
+    ap.add_argument("--modes", default=",".join(MODES))
+    ap.add_argument("--queries", default=None, help="JSONL of labeled queries")
+    a = ap.parse_args()
+    modes = [m for m in a.modes.split(",") if m in MODES]
+    asyncio.run(main(a.class_no, a.subject, a.k, a.n, modes, a.queries))
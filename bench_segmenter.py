@@ -0,0 +1,137 @@
+"""
+Check segmented transcription against a fake recognizer (no Azure needed).
+
+Synthesizes a 16 kHz mono WAV of 0.4 s tones whose pitch encodes the
+word index, 0.1 s apart within a phrase and 0.6 s apart between phrases. The
+opening stretch has no pause long enough to cut at, so the first cut is forced
+at --max-seconds and lands inside a word. The fake recognizer decodes each
+segment file back into phrases ("w0 w1 w2", offsets relative to the segment)
+after a random delay, so segments finish out of order. It checks that:
+  - the stitched text is every word exactly once, in order (a word split by a
+    forced cut is heard on both sides and must be dropped from the later one),
+  - timestamps are ascending and each utterance ends before the next starts,
+  - segments are recognized concurrently (wall time vs. the sum of delays).
+
+Run with: python bench_segmenter.py [--words 120] [--workers 4] [--target-seconds 5] [--max-seconds 8]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+import wave
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.segmenter import plan_segments, transcribe_segmented
+
+RATE = 16000
+WORD_S, GAP_S, PAUSE_S, LEAD_S = 0.4, 0.1, 0.6, 0.2
+BASE_HZ, STEP_HZ = 300.0, 30.0
+_WIN = int(RATE * 0.01)
+
+
+def _write_wav(path: str, words: int, unbroken: int, phrase: int) -> list:
+    """Write the test audio; return [(start_s, end_s, index)] of every word."""
+    t = np.arange(int(RATE * WORD_S)) / RATE
+    spans, pos, chunks = [], LEAD_S, [np.zeros(int(RATE * LEAD_S))]
+    for i in range(words):
+        hz = BASE_HZ + STEP_HZ * i
+        chunks.append(0.3 * np.sin(2 * np.pi * hz * t))
+        spans.append((pos, pos + WORD_S, i))
+        gap = GAP_S if i < unbroken or (i + 1) % phrase else PAUSE_S
+        chunks.append(np.zeros(int(RATE * gap)))
+        pos += WORD_S + gap
+    audio = (np.concatenate(chunks) * 32767).astype(np.int16)
+    with wave.open(path, "wb") as w:
+        w.setnchannels(1); w.setsampwidth(2); w.setframerate(RATE)
+        w.writeframes(audio.tobytes())
+    return spans
+
+
+class FakeRecognizer:
+    """Decodes tone bursts back into words; a >0.25 s gap ends a phrase."""
+
+    def __init__(self, delay_s: float):
+        self.delay_s = delay_s
+        self.calls = 0
+        self.slept = 0.0
+
+    def __call__(self, wav_path: str):
+        with wave.open(wav_path, "rb") as w:
+            x = np.frombuffer(w.readframes(w.getnframes()), dtype=np.int16).astype(np.float32)
+        n = len(x) // _WIN
+        loud = np.sqrt(np.mean(x[: n * _WIN].reshape(n, _WIN) ** 2, axis=1)) > 300
+        bursts, start = [], None
+        for i, on in enumerate(list(loud) + [False]):
+            if on and start is None:
+                start = i
+            elif not on and start is not None:
+                if i - start >= 3:  # shorter than 30 ms is too little to hear a word in
+                    bursts.append((start * _WIN, i * _WIN))
+                start = None
+
+        utterances, words, last_end = [], [], None
+        for a, b in bursts:
+            crossings = np.flatnonzero(np.diff(np.signbit(x[a:b])))
+            hz = (len(crossings) - 1) / 2 / ((crossings[-1] - crossings[0]) / RATE)
+            word = f"w{round((hz - BASE_HZ) / STEP_HZ)}"
+            if last_end is not None and (a - last_end) / RATE > 0.25:
+                utterances.append(words)
+                words = []
+            words.append((a / RATE, word))
+            last_end = b
+        if words:
+            utterances.append(words)
+
+        delay = random.uniform(0, self.delay_s)
+        time.sleep(delay)
+        self.calls += 1
+        self.slept += delay
+        return [(ws[0][0], " ".join(w for _, w in ws)) for ws in utterances]
+
+
+def main(words: int, workers: int, target_s: float, max_s: float, delay_s: float):
+    assert BASE_HZ + STEP_HZ * words < RATE / 2, "too many words for distinct pitches"
+    settings.TRANSCRIBE_SEGMENT_TARGET_SECONDS = target_s
+    settings.TRANSCRIBE_SEGMENT_MAX_SECONDS = max_s
+    unbroken = int(max_s * 1.5 / (WORD_S + GAP_S))  # run on past the first forced cut
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "class.wav")
+        spans = _write_wav(path, words, unbroken, phrase=6)
+        plan = plan_segments(path)
+        split = [c for c, _ in plan[1:] if any(a < c < b for a, b, _ in spans)]
+        rec = FakeRecognizer(delay_s)
+        t0 = time.perf_counter()
+        text, segments = transcribe_segmented(path, rec, workers=workers)
+        elapsed = time.perf_counter() - t0
+
+    got = text.split()
+    expected = [f"w{i}" for i in range(words)]
+    print(f"audio={spans[-1][1]:.1f} s words={words} segments={len(plan)} cuts_inside_words={len(split)}")
+    print(f"recognizer calls={rec.calls} summed_delay={rec.slept:.2f} s wall={elapsed:.2f} s workers={workers}")
+    print("first segments:", [(s["start"], s["end"], s["text"]) for s in segments[:3]])
+
+    assert split, "expected at least one forced cut inside a word"
+    assert got == expected, f"stitched words differ: missing={sorted(set(expected) - set(got))} " \
+                            f"duplicated={sorted({w for w in got if got.count(w) > 1})}"
+    starts = [s["start"] for s in segments]
+    assert starts == sorted(starts), "utterances out of order"
+    assert all(s["end"] <= n["start"] for s, n in zip(segments, segments[1:])), "utterances overlap"
+    for s in segments:  # each utterance starts where its first word is in the source audio
+        a, _, _ = spans[int(s["text"].split()[0][1:])]
+        assert abs(s["start"] - a) < 0.06 or any(abs(c - s["start"]) < 0.06 for c in split), s
+    if workers > 1 and len(plan) > workers:
+        assert elapsed < rec.slept, "segments were not recognized concurrently"
+    print("OK")
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--words", type=int, default=120)
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--target-seconds", type=float, default=5.0)
+    ap.add_argument("--max-seconds", type=float, default=8.0)
+    ap.add_argument("--delay", type=float, default=0.2, help="max fake recognition delay per segment")
+    a = ap.parse_args()
+    main(a.words, a.workers, a.target_seconds, a.max_seconds, a.delay)
@@ -0,0 +1,65 @@
+"""
+Per-document cost of the list endpoints' response path: building a Pydantic
+model per document and letting FastAPI validate/encode it through
+response_model, versus ReadShape + orjson straight to bytes.
+
+Uses synthetic student_progress documents; no database needed.
+
+Run with: python bench_serialization.py -n 5000
+"""
+import argparse
+import json
+import time
+from typing import List
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from app.models.schemas import StudentProgress
+from app.utils.serialization import ReadShape
+
+
+def _docs(n: int):
+    return [{
+        "_id": ObjectId(), "student_id": f"s{i}", "daily_id": str(ObjectId()), "tenant": "demo-school",
+        "date": "2025-01-15", "class_no": 7, "section": "A", "subject": "Science",
+        "summary_viewed": True, "summary_viewed_at": "2025-01-15T10:00:00Z",
+        "quiz_taken": True, "quiz_attempts": 2, "quiz_best_score": 80.0, "quiz_latest_score": 60.0,
+        "completion_percentage": 65.0, "updated_at": "2025-01-15T10:05:00Z",
+    } for i in range(n)]
+
+def _before(docs) -> bytes:
+    models = []
+    for d in docs:
+        d = dict(d, _id=str(d["_id"]))
+        models.append(StudentProgress(**d))
+    # what FastAPI does with response_model: validate again, then jsonable_encoder + json
+    adapter = TypeAdapter(List[StudentProgress])
+    validated = adapter.validate_python([m.model_dump(by_alias=True) for m in models])
+    return json.dumps(jsonable_encoder(validated, by_alias=True)).encode()
+
+def _after(shape: ReadShape, docs) -> bytes:
+    return shape.response(docs).body
+
+def _time(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t)
+    return best
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-n", type=int, default=5000, help="documents per run")
+    ap.add_argument("-r", "--repeat", type=int, default=5)
+    a = ap.parse_args()
+
+    docs = _docs(a.n)
+    shape = ReadShape(StudentProgress)
+    before = _time(lambda: _before(docs), a.repeat)
+    after = _time(lambda: _after(shape, docs), a.repeat)
+    print(f"docs={a.n}")
+    print(f"pydantic + response_model: {before / a.n * 1e6:7.2f} us/doc")
+    print(f"ReadShape + orjson       : {after / a.n * 1e6:7.2f} us/doc  ({before / after:.1f}x)")
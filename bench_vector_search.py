@@ -0,0 +1,68 @@
+"""
+Compare the local NumPy vector index against Cosmos cosmosSearch on cbse_docs.
+
+Queries are the stored embeddings of a sample of chunks from one
+(class_no, subject) slice, so no embedding calls are made. The local index does
+exact cosine search and serves as ground truth for recall@k.
+
+Run with: python bench_vector_search.py --class-no 7 --subject Physics
+"""
+import argparse
+import asyncio
+import random
+import time
+
+import numpy as np
+
+from app.db.mongo import get_db
+from app.services import vector_index
+from app.services.rag import _cosmos_search
+
+
+def _pct(xs, p):
+    return float(np.percentile(np.asarray(xs) * 1000, p))
+
+async def main(class_no: int, subject: str, k: int, n: int):
+    db = await get_db()
+    sample = await db.cbse_docs.aggregate([
+        {"$match": {"class_no": class_no, "subject": subject}},
+        {"$sample": {"size": n}},
+        {"$project": {"embedding": 1}},
+    ]).to_list(n)
+    if not sample:
+        print("No cbse_docs for that slice."); return
+
+    t0 = time.perf_counter()
+    part = await vector_index.get_partition(class_no, subject)
+    print(f"Loaded partition: {len(part.ids)} vectors in {(time.perf_counter() - t0) * 1000:.0f} ms")
+
+    local_lat, cosmos_lat, recalls = [], [], []
+    random.shuffle(sample)
+    for doc in sample:
+        q = doc["embedding"]
+
+        t = time.perf_counter()
+        exact = await vector_index.search(q, class_no, subject, k=k)
+        local_lat.append(time.perf_counter() - t)
+
+        t = time.perf_counter()
+        approx = await _cosmos_search(q, class_no, subject, k=k)
+        cosmos_lat.append(time.perf_counter() - t)
+
+        truth = {(d["text"], d.get("page")) for d in exact}
+        got = {(d["text"], d.get("page")) for d in approx}
+        recalls.append(len(truth & got) / max(1, len(truth)))
+
+    print(f"queries={len(sample)} k={k}")
+    print(f"local : p50={_pct(local_lat, 50):.2f} ms  p95={_pct(local_lat, 95):.2f} ms")
+    print(f"cosmos: p50={_pct(cosmos_lat, 50):.2f} ms  p95={_pct(cosmos_lat, 95):.2f} ms")
+    print(f"cosmos recall@{k} vs exact: {np.mean(recalls):.3f}")
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--class-no", type=int, required=True)
+    ap.add_argument("--subject", required=True)
+    ap.add_argument("-k", type=int, default=4)
+    ap.add_argument("-n", type=int, default=100, help="number of sample queries")
+    a = ap.parse_args()
+    asyncio.run(main(a.class_no, a.subject, a.k, a.n))